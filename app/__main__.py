@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import uvicorn
 
@@ -6,26 +5,33 @@ import coloredlogs
 
 from app.config import Config, parse_config
 
-from app.dispatcher import dispatcher
-
 from datetime import datetime
 
 
-async def on_startup(disp, config: Config, **kwargs):
+def on_startup(config: Config, **kwargs):
     logging.info(f"Started at: {kwargs['start_time']}")
 
     web_config = config.web.get_config()
 
     logging.error("Started!")
 
-    uvicorn.run(disp, host=web_config["host"], port=web_config["port"])
+    if web_config["workers"] > 1:
+        # imported here, the ledger is loaded by the writer process only
+        from app.workers import serve
+
+        serve(web_config)
+        return
+
+    from app.dispatcher import dispatcher
 
+    uvicorn.run(dispatcher(kwargs), host=web_config["host"], port=web_config["port"])
 
-async def on_shutdown():
+
+def on_shutdown():
     logging.warning("Stopping...")
 
 
-async def main():
+def main():
     coloredlogs.install(level=logging.INFO)
     logging.warning("Starting...")
 
@@ -34,14 +40,12 @@ async def main():
     start_time = datetime.now()
     context_kwargs = {"start_time": start_time}
 
-    disp = dispatcher(context_kwargs)
-
-    await on_startup(disp, config, **context_kwargs)
+    on_startup(config, **context_kwargs)
 
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        main()
     except (KeyboardInterrupt, SystemExit):
-        asyncio.run(on_shutdown())
+        on_shutdown()
         logging.error("Stopped!")
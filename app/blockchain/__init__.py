@@ -1,10 +1,21 @@
 from .architectures.blockchain import Blockchain
 from .architectures.block import Block
+from .architectures.nft import nft_id
 from .architectures.wallet import Wallet
 from .architectures.transaction import Transaction
-from datetime import datetime
+from .committer import Committer, committed
+from .merkle import merkle_proof
+from .miner import Miner, valid_proof
+from .state import LedgerState, WalletSource
+from .storage.chain import BlockHeader, ChainStore
+from . import validation
+from ..metrics import MINING_ATTEMPTS, MINING_SECONDS, SYNC_BYTES, SYNC_SECONDS
+from datetime import datetime, timedelta
+from decimal import Decimal
 from typing import Union
-import os, json, hashlib
+import json
+import threading
+import time
 
 
 class Coin:
@@ -14,7 +25,20 @@ class Coin:
     :param name: str: Name of the blockchain
     :param difficulty: int: Difficulty of the blockchain
     :param minimum_transactions: int: Minimum transactions required to create a block
-    :param restore: bool: Restore the blockchain from the blockchain.json file
+    :param restore: bool: Restore the blockchain from the storage
+    :param storage: BlockLog: Storage to sync to, None keeps the blockchain in memory
+    :param snapshot_interval: int: Blocks between wallet snapshots in the storage
+    :param mining_workers: int: Processes used for proof of work, 0 for one per core
+    :param max_transactions: int: Maximum transactions in a block, 0 for no limit
+    :param max_bytes: int: Maximum serialized transaction bytes in a block, 0 for no limit
+    :param max_wait: float: Seconds a transaction waits before a partial block is sealed
+    :param block_cache_size: int: Blocks read back from the storage kept in memory
+    :param pruning: bool: Prune old block bodies instead of appending each snapshot
+    :param keep_blocks: int: Most recent blocks that keep their body when pruning
+    :param archive: BlockLog: Storage pruned block bodies are moved to, None drops them
+    :param read_only: bool: Only read the storage, another process writes it
+    :param compact_ratio: float: Drop the older snapshots once the storage is this many times its size after the last compaction, 0 never
+    :param state_cache_size: int: Balances, keys and NFTs kept in memory by each lookup of the published state
     """
 
     def __init__(
@@ -23,76 +47,414 @@ class Coin:
         difficulty=4,
         minimum_transactions=1,
         restore=False,
+        storage=None,
+        snapshot_interval=1000,
+        mining_workers=1,
+        max_transactions=0,
+        max_bytes=0,
+        max_wait=0,
+        block_cache_size=1024,
+        pruning=False,
+        keep_blocks=1000,
+        archive=None,
+        read_only=False,
+        compact_ratio=2,
+        state_cache_size=65536,
     ):
         self.coin = Blockchain(
             name=name,
             difficulty=difficulty,
             minimum_transactions=minimum_transactions,
+            max_transactions=max_transactions,
+            max_bytes=max_bytes,
+            max_wait=max_wait,
+            chain=ChainStore(storage, block_cache_size),
+            public_key=self._public_key,
         )
         if not restore:
-            self.coin.chain.append(Block(datetime.now().timestamp(), ["genisis block"]))
+            self.coin.append(Block(datetime.now().timestamp(), ["genisis block"]))
 
         self.wallet = Wallet()
+        self.storage = storage
+        self.snapshot_interval = snapshot_interval
+        self.pruning = pruning
+        self.keep_blocks = keep_blocks
+        self.archive = archive
+        self.read_only = read_only
+        self.compact_ratio = compact_ratio
+        self.state_cache_size = state_cache_size
+        self.compacted = None  # size of the storage after the last compaction
+        self.synced = 0  # number of blocks already written to the storage
+        self.journal = []  # wallet changes made outside of blocks, not yet synced
+        # number of the last wallet change, followers pull the changes after
+        # the one they have, -1 if the wallet needs a snapshot
+        self.seq = 0
+        self.miner = Miner(mining_workers)
+        # hash -> (submission time, size in bytes) of transactions not in a block yet
+        self.pending = {}
+        self.pending_bytes = 0
+        # hash of the first transaction -> size of a bundle that has to be
+        # mined into a single block
+        self.bundles = {}
+        # transactions taken by the block being mined, still spent until the
+        # block is committed
+        self.mining = []
+        # every change to the chain, wallet and pending lists runs on the
+        # committer thread, readers use the state it publishes in self.state
+        self.committer = Committer(self._publish)
+        self.state = self._new_state()
+        self._producing = threading.Lock()  # one block is mined at a time
 
-    def validate_chain(self) -> bool:
+    def _public_key(self, private_key) -> Union[str, None]:
+        # the history indexes the sender of a transaction by its public key
+        public_key = self.wallet.get_public_key(private_key)
+        return None if public_key == "Failed" else public_key
+
+    def _new_state(self) -> LedgerState:
+        # an indexed storage has tables of the balances and NFTs, the state
+        # reads them instead of the wallet
+        if self.storage is not None and self.storage.indexed:
+            source = self.storage
+        else:
+            source = WalletSource(self.wallet, self.committer.changing)
+        return LedgerState(source, self.state_cache_size, len(self.coin.chain) - 1)
+
+    def _publish(self) -> None:
+        # called on the committer thread after every change
+        self.state = self.state.apply(self.wallet, len(self.coin.chain) - 1)
+
+    def validate_chain(self, start=0, workers=1) -> bool:
         """
         Validate the chain of the blockchain
 
+        :param start: int: Height of the first block to validate
+        :param workers: int: Processes used to rehash blocks, 0 for one per core
+
         :return: bool: True if the chain is valid, False if not
         """
-        for i, chain in enumerate(self.coin.chain):
-            if chain.transactions[0] != "genisis block":
-                if chain.get_hash() != chain.hash:
-                    return False
+        return validation.validate_chain(self.coin.chain, start, workers)
 
-                if chain.previous_hash != self.coin.chain[i - 1].hash:
-                    return False
+    def verify(self, workers=1) -> bool:
+        """
+        Validate the blocks added after the last checkpoint of the storage,
+        then move the checkpoint to the tip of the chain
+
+        :param workers: int: Processes used to rehash blocks, 0 for one per core
 
+        :return: bool: True if the chain is valid, False if not
+        """
+        start = 0
+        checkpoint = self.storage.read_checkpoint() if self.storage else None
+        if (
+            checkpoint is not None
+            and checkpoint["height"] < len(self.coin.chain)
+            and self.coin.chain.header(checkpoint["height"]).hash == checkpoint["hash"]
+        ):
+            start = checkpoint["height"] + 1
+
+        if not self.validate_chain(start, workers):
+            return False
+
+        if self.storage is not None and len(self.coin.chain):
+            tip = self.coin.chain.header(len(self.coin.chain) - 1)
+            self.storage.write_checkpoint(len(self.coin.chain) - 1, tip.hash)
         return True
 
     def _valid_proof(self, last_proof, proof):
-        guess = f"{last_proof}{proof}".encode()
-        guess_hash = hashlib.sha256(guess).hexdigest()
-        return guess_hash[:4] == "0000"
+        return valid_proof(last_proof, proof, self.coin.difficulty)
 
     def _proof_of_work(self, last_proof) -> int:
-        proof = 0
-        while self._valid_proof(last_proof, proof) is False:
-            proof += 1
-        return proof
+        return self.miner.mine(last_proof, self.coin.difficulty)
+
+    def ready(self, wait=True) -> bool:
+        """
+        Check if the pending transactions should be sealed into a block
+
+        A block is sealed once max_transactions or max_bytes is reached,
+        or once the oldest pending transaction waited max_wait seconds.
+
+        :param wait: bool: Honor max_wait, False seals a partial block right away
+
+        :return: bool: True if a block can be created
+        """
+        # read without waiting for the committer, the list is replaced and
+        # not emptied when a block takes transactions
+        pending = self.coin.pending_transactions
+        if not pending or len(pending) < self.coin.minimum_transactions:
+            return False
+        if self.coin.max_transactions and len(pending) >= self.coin.max_transactions:
+            return True
+        if self.coin.max_bytes and self.pending_bytes >= self.coin.max_bytes:
+            return True
+        if not wait:
+            return True
+        submitted = self.pending.get(pending[0].hash)
+        if submitted is None:  # taken by a block being mined
+            return False
+        return time.monotonic() - submitted[0] >= self.coin.max_wait
+
+    def _take_pending(self) -> list:
+        # oldest transactions first, up to max_transactions and max_bytes,
+        # bundles are never split and a single transaction or bundle larger
+        # than the limits still gets its own block
+        pending = self.coin.pending_transactions
+        count = 0
+        size = 0
+        while count < len(pending):
+            length = self.bundles.get(pending[count].hash, 1)
+            length_size = sum(
+                self.pending[transaction.hash][1]
+                for transaction in pending[count : count + length]
+            )
+            if count and (
+                (
+                    self.coin.max_transactions
+                    and count + length > self.coin.max_transactions
+                )
+                or (self.coin.max_bytes and size + length_size > self.coin.max_bytes)
+            ):
+                break
+            count += length
+            size += length_size
+
+        transactions = pending[:count]
+        self.coin.pending_transactions = pending[count:]
+        for transaction in transactions:
+            self.pending_bytes -= self.pending[transaction.hash][1]
+            self.bundles.pop(transaction.hash, None)
+        return transactions
 
     def _create_block(self, addresses=None) -> Union[Block, bool]:
-        if len(self.coin.pending_transactions) >= self.coin.minimum_transactions:
-            # block.hash, block.timestamp, block.transactions, block.previous_hash
-            transactions = self.coin.pending_transactions
-            self.coin.pending_transactions = []
-            block = Block(
-                datetime.now().timestamp(),
-                transactions,
-                self.coin.chain[len(self.coin.chain) - 1].hash,
-                self._proof_of_work(self.coin.chain[len(self.coin.chain) - 1].proof),
-                addresses,  # Convert addresses to a string
+        with self._producing:
+            taken = self.committer.call(self._take_block)
+            if taken is None:
+                return False
+            transactions, last_block = taken
+
+            # the proof of work runs outside of the committer, reads and new
+            # submissions are not blocked while a block is being mined
+            try:
+                with MINING_SECONDS.time():
+                    proof = self._proof_of_work(last_block.proof)
+            except BaseException:
+                self.committer.call(self._drop_mining)
+                raise
+            # workers search interleaved proofs from 0, so about proof + 1
+            # proofs were tried in total
+            MINING_ATTEMPTS.inc(proof + 1)
+
+            return self.committer.call(
+                self._commit_block, transactions, last_block, proof, addresses
             )
-            self.coin.chain.append(block)
-            self.sync()
-            return block
 
+    def _take_block(self) -> Union[tuple, None]:
+        if not self.ready(wait=False):
+            return None
+        transactions = self._take_pending()
+        self.mining = transactions
+        return transactions, self.coin.chain.header(len(self.coin.chain) - 1)
+
+    def _drop_mining(self) -> None:
+        self.mining = []
+
+    def _commit_block(self, transactions, last_block, proof, addresses) -> Block:
+        # block.hash, block.timestamp, block.transactions, block.previous_hash
+        block = Block(
+            datetime.now().timestamp(),
+            transactions,
+            last_block.hash,
+            proof,
+            addresses,
+        )
+        self.coin.append(block)
+        # written before they stop being pending, a storage with its own
+        # index can only find them once they are written
         self.sync()
-        return False
+        for transaction in transactions:
+            self.pending.pop(transaction.hash, None)
+        # the wallet now holds what the transactions spent
+        self.mining = []
+        return block
+
+    @committed
+    def submit_transaction(self, timestamp, data) -> dict:
+        """
+        Add a new transaction to the pending transactions without mining it
+
+        :param timestamp: float: Timestamp of the transaction
+        :param data: dict: Data of the transaction
+
+        :return: dict: Hash and status of the transaction, or "rejected" with an error
+        """
+        if data.get("type") == "token-transfer":
+            # a transfer the block would skip is refused before it is pending
+            error = self._check_transfer(data.get("data"), self._pending_spent())
+            if error is not None:
+                return {"status": "rejected", "error": error}
+        transaction = Transaction(timestamp, data=data)
+        size = len(json.dumps(transaction.to_dict()))
+        self.coin.pending_transactions.append(transaction)
+        self.pending[transaction.hash] = (time.monotonic(), size)
+        self.pending_bytes += size
+        return {"hash": transaction.hash, "status": "pending"}
+
+    def _pending_spent(self) -> dict:
+        # private key -> amount already spent by pending token transfers,
+        # including the ones in the block being mined
+        spent = {}
+        for transaction in self.mining + self.coin.pending_transactions:
+            if transaction.input.get("type") != "token-transfer":
+                continue
+            data = transaction.input["data"]
+            spent[data["from"]] = spent.get(data["from"], Decimal(0)) + Decimal(
+                str(data["amount"])
+            )
+        return spent
+
+    def _check_transfer(self, transfer, spent) -> Union[str, None]:
+        if not isinstance(transfer, dict):
+            return "Transfer must be an object"
+        for key in ("from", "to", "amount"):
+            if key not in transfer:
+                return f"Missing {key}"
+        if not isinstance(transfer["from"], str):
+            return "Invalid sender"
+        if not isinstance(transfer["to"], str):
+            return "Invalid receiver"
+        try:
+            amount = Decimal(str(float(transfer["amount"])))
+        except (TypeError, ValueError):
+            return "Invalid amount"
+        if not amount.is_finite() or amount < 0:
+            return "Invalid amount"
+
+        pbc = self.wallet.get_public_key(transfer["from"])
+        if pbc == "Failed":
+            return "Sender not found"
+        if transfer["to"] not in self.wallet.by_pbc:
+            return "Receiver not found"
+        if transfer["to"] == pbc:
+            return "Sender and receiver are the same"
+
+        balance = Decimal(self.wallet.get_balance(transfer["from"], pbc))
+        if balance - spent.get(transfer["from"], Decimal(0)) < amount:
+            return "Insufficient balance"
+        spent[transfer["from"]] = spent.get(transfer["from"], Decimal(0)) + amount
+
+    @committed
+    def submit_batch(self, transfers) -> dict:
+        """
+        Validate token transfers against the wallet and the pending
+        transactions, then submit them as a bundle mined into a single block
+
+        The batch is atomic: if one transfer is invalid none of them is
+        submitted.
+
+        :param transfers: list: Transfers as dicts with "from" (pve), "to" (pbc) and "amount"
+
+        :return: dict: Status of the batch and the result of each transfer
+        """
+        if not transfers:
+            return {"status": "rejected", "error": "Empty batch", "results": []}
+        if self.coin.max_transactions and len(transfers) > self.coin.max_transactions:
+            return {
+                "status": "rejected",
+                "error": f"At most {self.coin.max_transactions} transfers per batch",
+                "results": [],
+            }
+
+        spent = self._pending_spent()
+        timestamp = datetime.now()
+        results = []
+        transactions = []
+        hashes = set()
+        for i, transfer in enumerate(transfers):
+            error = self._check_transfer(transfer, spent)
+            transaction = None
+            if error is None:
+                # one microsecond apart, identical transfers get different hashes
+                # the block applies all the transfers of the bundle or none
+                transaction = Transaction(
+                    timestamp + timedelta(microseconds=i),
+                    data={
+                        "type": "token-transfer",
+                        "data": {
+                            "to": transfer["to"],
+                            "from": transfer["from"],
+                            "amount": float(transfer["amount"]),
+                        },
+                        "bundle": {"index": i, "size": len(transfers)},
+                    },
+                )
+                if (
+                    transaction.hash in hashes
+                    or transaction.hash in self.pending
+                    or self.coin.position(transaction.hash) is not None
+                ):
+                    error = "Duplicate transaction"
+            if error is not None:
+                results.append({"index": i, "status": "rejected", "error": error})
+                continue
+            hashes.add(transaction.hash)
+            transactions.append(transaction)
+            results.append({"index": i, "hash": transaction.hash})
+
+        if len(transactions) < len(transfers):
+            for result in results:
+                if result.pop("hash", None) is not None:
+                    result["status"] = "valid"
+            return {"status": "rejected", "results": results}
+
+        submitted = time.monotonic()
+        for transaction in transactions:
+            size = len(json.dumps(transaction.to_dict()))
+            self.pending[transaction.hash] = (submitted, size)
+            self.pending_bytes += size
+        self.coin.pending_transactions.extend(transactions)
+        self.bundles[transactions[0].hash] = len(transactions)
+        for result in results:
+            result["status"] = "pending"
+        return {"status": "pending", "results": results}
+
+    def mine_pending(self) -> Union[Block, bool]:
+        """
+        Mine the oldest pending transactions into a new block, without
+        waiting for max_wait
+
+        :return: Block: New block, or False if there was nothing to mine
+        """
+        return self._create_block(addresses=self.wallet)
 
     def create_transaction(self, timestamp, data) -> None:
         """
-        Create a new transaction
+        Create a new transaction and mine it right away
 
         :param timestamp: float: Timestamp of the transaction
         :param data: dict: Data of the transaction
 
         :return: None
         """
-        self.coin.pending_transactions.append(Transaction(timestamp, data=data))
-        self._create_block(
-            addresses=self.wallet,
-        )
+        self.submit_transaction(timestamp, data)
+        self.mine_pending()
+
+    def get_status(self, data) -> dict:
+        """
+        Get the status of a transaction by its hash
+
+        :param data: str: Hash of the transaction
+
+        :return: dict: "pending", "confirmed" or "rejected" with the block height, or "unknown"
+        """
+        if data in self.pending:
+            return {"hash": data, "status": "pending"}
+
+        position = self.coin.position(data)
+        if position is not None:
+            height, _ = position
+            # a rejected transaction is in a block but did not change the wallet
+            status = "rejected" if self.coin.is_rejected(data) else "confirmed"
+            return {"hash": data, "status": status, "block": height}
+        return {"hash": data, "status": "unknown"}
 
     def get_transaction(self, data) -> Union[Transaction, None]:
         """
@@ -102,10 +464,145 @@ class Coin:
 
         :return: Transaction: Transaction object
         """
-        for block in self.coin.chain:
-            for transaction in block.transactions:
-                if transaction.hash == data:
-                    return transaction
+        position = self.coin.position(data)
+        if position is not None:
+            height, i = position
+            return self.coin.chain[height].transactions[i]
+
+    def public_transaction(self, transaction) -> dict:
+        """
+        Serialize a transaction without the private key of its sender
+
+        :param transaction: Transaction: Transaction to serialize
+
+        :return: dict: Transaction naming the sender by its public key (pbc), None if the sender is unknown
+        """
+        obj = transaction.to_dict()
+        data = obj["input"].get("data")
+        if isinstance(data, dict) and "from" in data:
+            sender = data["from"]
+            pbc = self.state.keys.get(sender) if isinstance(sender, str) else None
+            obj["input"] = {**obj["input"], "data": {**data, "from": pbc}}
+        return obj
+
+    def get_proof(self, data) -> Union[dict, None]:
+        """
+        Get a Merkle proof that a transaction is in its block
+
+        :param data: str: Hash of the transaction
+
+        :return: dict: Header of the block and the proof, None if the transaction is not in a block
+        """
+        position = self.coin.position(data)
+        if position is None:
+            return None
+        height, i = position
+        block = self.coin.chain[height]
+        return {
+            "hash": data,
+            "block": self.coin.chain.header(height).to_dict(),
+            "index": i,
+            "proof": merkle_proof(block.transaction_hashes(), i),
+        }
+
+    def get_history(self, public_key, cursor=None, limit=50) -> Union[dict, str]:
+        """
+        Get the confirmed transactions sending to or from a wallet address,
+        newest first
+        Raises ValueError if the cursor is invalid
+
+        :param public_key: str: Public key of the wallet (pbc)
+        :param cursor: str: "next" of the previous page, None for the newest transactions
+        :param limit: int: Maximum number of transactions
+
+        :return: dict: Transactions and the cursor of the next page, None on the last page, or "Failed"
+        """
+        if public_key not in self.state.accounts:
+            return "Failed"
+        before = None
+        if cursor:
+            height, _, index = cursor.partition(":")
+            if not (height.isdigit() and index.isdigit()):
+                raise ValueError(f"Invalid cursor {cursor}")
+            before = (int(height), int(index))
+
+        positions = self.coin.history_of([public_key], before, limit)
+        transactions = []
+        for height, i in positions:
+            try:
+                transaction = self.coin.chain[height].transactions[i]
+            except IndexError:  # pruned since the lookup
+                continue
+            transactions.append(
+                {
+                    "hash": transaction.hash,
+                    "block": height,
+                    "index": i,
+                    "transaction": self.public_transaction(transaction),
+                }
+            )
+        return {
+            "address": public_key,
+            "transactions": transactions,
+            "next": "%d:%d" % positions[-1] if len(positions) == limit else None,
+        }
+
+    def get_block(self, height, body=False) -> Union[dict, None]:
+        """
+        Get a block by its height
+        Transactions name their sender by its public key (pbc)
+
+        :param height: int: Height of the block
+        :param body: bool: Include the transactions, only the header by default
+
+        :return: dict: Header or block with its height, "pruned" if the body is gone, None if there is no such block
+        """
+        chain = self.coin.chain
+        if not 0 <= height < len(chain):
+            return None
+        if height < chain.pruned:
+            return {**chain.header(height).to_dict(), "pruned": True}
+        if not body:
+            return chain.header(height).to_dict()
+        try:
+            block = chain[height]
+        except IndexError:  # pruned since the check above
+            return {**chain.header(height).to_dict(), "pruned": True}
+        # the genesis block holds a plain string instead of a transaction
+        transactions = [
+            (
+                transaction
+                if type(transaction) == str
+                else self.public_transaction(transaction)
+            )
+            for transaction in block.transactions
+        ]
+        return {"height": height, **block.to_dict(), "transactions": transactions}
+
+    def get_block_by_hash(self, hash, body=False) -> Union[dict, None]:
+        """
+        Get a block by its hash
+
+        :param hash: str: Hash of the block
+        :param body: bool: Include the transactions, only the header by default
+
+        :return: dict: Header or block with its height, None if the hash is unknown
+        """
+        height = self.coin.chain.height(hash)
+        return None if height is None else self.get_block(height, body)
+
+    def get_blocks(self, start, limit, body=False) -> list:
+        """
+        Get consecutive blocks
+
+        :param start: int: Height of the first block
+        :param limit: int: Maximum number of blocks
+        :param body: bool: Include the transactions, only the headers by default
+
+        :return: list: Headers or blocks, oldest first
+        """
+        stop = min(max(start, 0) + limit, len(self.coin.chain))
+        return [self.get_block(height, body) for height in range(max(start, 0), stop)]
 
     class wallet(Wallet):
         # this class is a subclass of Wallet
@@ -117,13 +614,644 @@ class Coin:
             "Wallet": self.wallet.to_dict(),
         }
 
+    @committed
+    def create_wallet(self) -> dict:
+        """
+        Create a new wallet address and record it in the storage
+
+        :return: dict: Wallet address
+        """
+        address = self.wallet.create_wallet()
+        self.seq += 1
+        self.journal.append({"type": "wallet", "wallet": address, "seq": self.seq})
+        self.sync()
+        return address
+
+    @committed
+    def credit_wallet(self, public_key=None, amount=None) -> Union[float, str]:
+        """
+        Credit a wallet address and record it in the storage
+
+        :param public_key: str: Public key of the wallet (pbc)
+        :param amount: float: Amount to credit the wallet with
+
+        :return: New balance of the wallet or "Failed"
+        """
+        balance = self.wallet.credit_wallet(public_key, amount)
+        if balance != "Failed":
+            self.seq += 1
+            self.journal.append(
+                {
+                    "type": "credit",
+                    "credit": {"pbc": public_key, "amount": amount},
+                    "seq": self.seq,
+                }
+            )
+            self.sync()
+        return balance
+
+    def get_balance(self, private_key=None, public_key=None) -> Union[float, str]:
+        """
+        Get the balance of a wallet address from the published state
+
+        :param private_key: str: Private key of the wallet (pve)
+        :param public_key: str: Public key of the wallet (pbc)
+
+        :return: float: Balance of the wallet
+        """
+        if private_key is None or public_key is None:
+            return "Private and Public keys are required"
+
+        account = self.state.accounts.get(public_key)
+        if account is not None and account[0] == private_key:
+            return account[1]
+
+    def get_public_key(self, private_key=None) -> str:
+        """
+        Get the public key of a wallet address from the published state
+
+        :param private_key: str: Private key of the wallet (pve)
+
+        :return: Public key of the wallet (pbc) or "Failed"
+        """
+        if private_key is None:
+            return "Failed"
+        return self.state.keys.get(private_key, "Failed")
+
+    def validate_address(self, private_key=None, public_key=None) -> Union[bool, str]:
+        """
+        Validate a wallet address against the published state
+
+        :param private_key: str: Private key of the wallet (pve)
+        :param public_key: str: Public key of the wallet (pbc)
+
+        :return: True or False or "Private and Public keys are required"
+        """
+        if private_key is None or public_key is None:
+            return "Private and Public keys are required"
+
+        account = self.state.accounts.get(public_key)
+        return account is not None and account[0] == private_key
+
+    @committed
     def sync(self) -> None:
         """
-        Sync the blockchain to the blockchain.json file
+        Append new blocks and wallet changes to the storage
         Work automatically when a block is created
+
+        Blocks only carry the changes they applied, the full wallet is
+        written as a snapshot every snapshot_interval blocks. Once the
+        storage grew compact_ratio times, the snapshots before the last one
+        are dropped. With pruning the storage is rewritten by prune() instead.
+        """
+        if self.storage is None or self.read_only:
+            return
+        records = [
+            self._record(height) for height in range(self.synced, len(self.coin.chain))
+        ]
+        self._write(records + self.journal)
+
+    def _write(self, records) -> None:
+        # records are written in order, the blocks and headers among them
+        # are the blocks of the chain from self.synced on
+        snapshot = any(
+            height % self.snapshot_interval == 0
+            for height in range(max(self.synced, 1), len(self.coin.chain))
+        )
+        if snapshot and self.pruning:
+            self.prune()
+            return
+
+        if snapshot:
+            records.append(self._snapshot())
+
+        if records:
+            written = self.storage.bytes_written
+            with SYNC_SECONDS.time():
+                offsets = self.storage.append(records)
+            SYNC_BYTES.inc(self.storage.bytes_written - written)
+            height = self.synced
+            for record, offset in zip(records, offsets):
+                if record["type"] in ("block", "header"):
+                    self.coin.chain.written(height, offset)
+                    height += 1
+        self.synced = len(self.coin.chain)
+        self.journal = []
+
+        if self.compact_ratio and records:
+            size = self.storage.size()
+            if self.compacted is None:
+                self.compacted = size
+            elif (
+                size > self.compact_ratio * self.compacted
+                and self.storage.written.get("snapshot", 0) > 1
+            ):
+                self.drop_snapshots()
+
+    @committed
+    def compact(self) -> None:
+        """
+        Rewrite the storage with the chain and a snapshot of the wallet
+        """
+        offsets = self.storage.compact(self._records())
+        for height in range(len(self.coin.chain)):
+            self.coin.chain.written(height, offsets[height])
+        self.synced = len(self.coin.chain)
+        self.journal = []
+        self.compacted = self.storage.size()
+
+    @committed
+    def drop_snapshots(self) -> None:
+        """
+        Rewrite the storage without the snapshots before the last one
+
+        Unlike compact(), every block and wallet change is kept: the wallet
+        can still be rebuilt at any height and followers still receive
+        every change.
+        """
+        moved = self.storage.drop_snapshots()
+        chain = self.coin.chain
+        for height in range(len(chain)):
+            offset = chain.header(height).offset
+            chain.written(height, moved.get(offset, offset))
+        self.compacted = self.storage.size()
+
+    @committed
+    def prune(self) -> int:
+        """
+        Rewrite the storage with a snapshot of the wallet at the tip, only
+        the last keep_blocks blocks keep their body, older blocks keep
+        their header. Restoring then reads the headers, the recent blocks
+        and the snapshot.
+
+        :return: int: Height of the first block that still has its body
+        """
+        chain = self.coin.chain
+        height = max(len(chain) - self.keep_blocks, chain.pruned)
+        if self.archive is not None and height > chain.pruned:
+            self.archive.append(
+                [
+                    {"type": "block", "block": chain[pruned].to_dict()}
+                    for pruned in range(chain.pruned, height)
+                ]
+            )
+        self.coin.prune(height)
+        self.compact()
+        return height
+
+    def _snapshot(self) -> dict:
+        tip = self.coin.chain.header(len(self.coin.chain) - 1)
+        return {
+            "type": "snapshot",
+            "height": tip.height,
+            "hash": tip.hash,
+            "seq": self.seq,
+            "wallet": self.wallet.to_dict(),
+        }
+
+    def _record(self, height) -> dict:
+        # pruned blocks are written as their header
+        if height < self.coin.chain.pruned:
+            header = self.coin.chain.header(height)
+            return {"type": "header", "header": header.to_dict()}
+        return {"type": "block", "block": self.coin.chain[height].to_dict()}
+
+    def _records(self):
+        for height in range(len(self.coin.chain)):
+            yield self._record(height)
+        yield self._snapshot()
+
+    def _replay(self, height=None, blockchain=None) -> tuple:
+        # the wallet starts from the last snapshot and only the changes
+        # recorded after it are applied, older blocks are not deserialized,
+        # returns the wallet and the number of its last change: -1 if
+        # changes were pruned, None if changes were written without numbers
+        snapshot = []
+        changes = []
+        blocks = 0
+        pruned = False  # changes were pruned since the last snapshot
+        seq = 0
+        # a full replay only decodes the last snapshot
+        for offset, record in self.storage.replay(latest=height is None):
+            if record["type"] in ("block", "header"):
+                if height is not None and blocks > height:
+                    if pruned:
+                        raise ValueError(f"The state at height {height} was pruned")
+                    break
+                blocks += 1
+            if record["type"] == "block":
+                if blockchain is not None:
+                    blockchain.append_written(record["block"], offset)
+                changes.append(record)
+            elif record["type"] == "header":
+                if blockchain is not None:
+                    blockchain.append_header(record["header"], offset)
+                pruned = True
+            elif record["type"] == "snapshot" and record["wallet"] is None:
+                # folded into the last snapshot, which is read later
+                changes = []
+                pruned = False
+            elif record["type"] == "snapshot":
+                if (
+                    blockchain is not None
+                    and "hash" in record
+                    and blockchain.chain.header(record["height"]).hash != record["hash"]
+                ):
+                    raise ValueError(
+                        f"Snapshot at height {record['height']} does not match the chain"
+                    )
+                snapshot = record["wallet"]
+                changes = []
+                pruned = False
+                seq = record.get("seq", 0)
+            else:
+                changes.append(record)
+                seq = record["seq"] if "seq" in record and seq is not None else None
+
+        wallet = Wallet().from_dict(snapshot)
+        for change in changes:
+            if change["type"] == "block":
+                block = Block(0)
+                block.from_dict(change["block"])
+                block.apply(wallet)
+            elif change["type"] == "wallet":
+                wallet.load_address(change["wallet"])
+            elif change["type"] == "credit":
+                wallet.credit_wallet(
+                    change["credit"]["pbc"], change["credit"]["amount"]
+                )
+        return wallet, -1 if pruned else seq
+
+    @committed
+    def restore(self) -> object:
+        """
+        Rebuild the blockchain by replaying the storage
+
+        Only block headers are kept in memory, block bodies are read back
+        from the storage when they are needed.
+
+        :return: Coin: self
+        """
+        self.coin.clear()
+        self.wallet, seq = self._replay(blockchain=self.coin)
+        self.coin.resolve()
+        self.compacted = self.storage.size()
+        self.state = self._new_state()
+        self.synced = len(self.coin.chain)
+        self.journal = []
+        self.seq = 0 if seq is None else seq
+        if seq is None and not self.read_only:
+            # wallet changes written before they were numbered are folded
+            # into a snapshot, followers could not tell them apart
+            self.compact()
+        return self
+
+    @committed
+    def refresh(self) -> int:
+        """
+        Apply the records another process appended to the storage since the
+        last restore or refresh, for read-only nodes sharing its storage
+
+        The records are read from the last block on, wallet changes only if
+        they are newer than seq. If the storage was compacted in between, the
+        last block moved and the storage is restored again.
+
+        :return: int: Number of blocks added
+        """
+        if self.storage is None or not self.storage.exists():
+            return 0
+        chain = self.coin.chain
+        start = len(chain)
+        if not start:
+            self.restore()
+            return len(self.coin.chain)
+
+        tip = chain.header(start - 1)
+        # opened before the check, a compaction after it is not read
+        records = self.storage.records(tip.offset)
+        try:
+            record = self.storage.read(tip.offset)
+            moved = record[record["type"]]["hash"] != tip.hash
+        except (LookupError, TypeError, ValueError):
+            moved = True
+        if moved:
+            records.close()
+            # restore replaces the chain
+            self.restore()
+            return len(self.coin.chain) - start
+
+        for offset, record in records:
+            if record["type"] == "block":
+                self.coin.append_written(record["block"], offset)
+                block = Block(0)
+                block.from_dict(record["block"])
+                block.apply(self.wallet)
+            elif record["type"] == "header":
+                if chain.pruned < len(chain):
+                    self.coin.prune(len(chain))
+                self.coin.append_header(record["header"], offset)
+                self.seq = -1
+            elif record["type"] == "snapshot":
+                if self.seq == -1 or record.get("seq", 0) > self.seq:
+                    self.wallet = Wallet().from_dict(record["wallet"])
+                    self.state = self._new_state()
+                    self.seq = record.get("seq", 0)
+                    self.coin.resolve()
+            elif self.seq != -1 and record.get("seq", 0) > self.seq:
+                if record["type"] == "wallet":
+                    self.wallet.load_address(record["wallet"])
+                elif record["type"] == "credit":
+                    self.wallet.credit_wallet(
+                        record["credit"]["pbc"], record["credit"]["amount"]
+                    )
+                self.seq = record["seq"]
+        self.synced = len(chain)
+        return len(chain) - start
+
+    def state_at(self, height) -> Wallet:
+        """
+        Rebuild the wallet as it was while a block was the tip of the chain
+        Raises ValueError if the blocks needed to rebuild it were pruned
+
+        :param height: int: Height of the block
+
+        :return: Wallet: Wallet state at the given height
+        """
+        self.sync()
+        wallet, _ = self._replay(height)
+        return wallet
+
+    def export(self):
+        """
+        Stream the chain and the wallet, one record at a time
+
+        A "chain" record comes first, then every block followed by its
+        transactions, then every wallet address. The wallet comes from the
+        published state and the blocks stop at its height, so the export is
+        consistent while new blocks are added. Pruned blocks only have their
+        header.
+
+        :return: generator: "chain", "block", "transaction" and "wallet" records
+        """
+        state = self.state
+        yield {
+            "type": "chain",
+            "name": self.coin.name,
+            "difficulty": self.coin.difficulty,
+            "height": state.height,
+        }
+        yield from self.export_blocks(self._blocks(state.height + 1))
+        for public_key, (private_key, balance) in state.accounts.items():
+            yield {
+                "type": "wallet",
+                "wallet": {
+                    "address": {"pve": private_key, "pbc": public_key},
+                    "info": {"balance": balance, "nfts": state.owned_by(public_key)},
+                },
+            }
+
+    @staticmethod
+    def export_blocks(records):
+        """
+        Turn stored blocks into export records
+
+        :param records: iterable: Serialized "block" and "header" records, from the genesis block on
+
+        :return: generator: "block" records, each followed by its "transaction" records
+        """
+        for height, record in enumerate(records):
+            if record["type"] == "header":
+                yield {"type": "block", **record["header"], "pruned": True}
+                continue
+            block = dict(record["block"])
+            transactions = block.pop("transactions")
+            yield {
+                "type": "block",
+                "height": height,
+                **block,
+                "transactions": len(transactions),
+            }
+            for i, transaction in enumerate(transactions):
+                # the genesis block holds a plain string instead of a transaction
+                if type(transaction) != str:
+                    yield {
+                        "type": "transaction",
+                        "block": height,
+                        "index": i,
+                        "transaction": transaction,
+                    }
+
+    def _blocks(self, stop):
+        # serialized blocks below a height, read in order from the storage
+        # without going through the block cache
+        if self.storage is None:
+            for height in range(stop):
+                yield self._record(height)
+            return
+        height = 0
+        for _, record in self.committer.call(self._open_records, 0):
+            if height == stop:
+                return
+            if record["type"] in ("block", "header"):
+                height += 1
+                yield record
+
+    def replication_headers(self, start, limit) -> list:
+        """
+        Get the headers of written blocks, for followers to check them
+        before they pull the blocks
+
+        :param start: int: Height of the first header
+        :param limit: int: Maximum number of headers
+
+        :return: list: Serialized headers
+        """
+        chain = self.coin.chain
+        stop = min(start + limit, self.synced)
+        return [chain.header(height).to_dict() for height in range(start, stop)]
+
+    def replication_records(self, start, seq, limit):
+        """
+        Read the records a follower needs after the block before start
+
+        Blocks come in order, pruned blocks as their header. Wallet changes
+        are only sent if they are newer than seq, snapshots only if the
+        follower is missing changes folded into them.
+
+        :param start: int: Height of the first block to send
+        :param seq: int: Number of the last wallet change the follower has, -1 if it needs a snapshot
+        :param limit: int: Maximum number of blocks, the records stop after the last one
+
+        :return: generator: Records in the order they were written
+        """
+        # opened on the committer so no compaction happens in between
+        records = self.committer.call(self._open_records, start)
+        pruned = False  # a pruned block was sent, its changes are missing
+        blocks = 0
+        for _, record in records:
+            if record["type"] in ("block", "header"):
+                if blocks == limit:
+                    return
+                blocks += 1
+                pruned = pruned or record["type"] == "header"
+                yield record
+            elif record["type"] == "snapshot":
+                if pruned or record.get("seq", 0) > seq:
+                    yield record
+            elif record.get("seq", 0) > seq:
+                yield record
+
+    def _open_records(self, start):
+        if self.storage is None or not self.storage.exists() or start > self.synced:
+            return iter(())
+        if start == 0:
+            return self.storage.records()
+        return self.storage.records(self.coin.chain.header(start - 1).offset)
+
+    @committed
+    def replicate(self, headers, records) -> int:
         """
-        with open(os.getcwd() + "/blockchain.json", "w") as file:
-            json.dump(self.to_dict(), file)
+        Append blocks and wallet changes pulled from a leader node
+
+        The headers are checked first against the tip of the chain, then
+        every block is checked against its header before it is applied.
+        Raises ValueError on the first invalid header or block, what was
+        applied before it is kept.
+
+        :param headers: list: Serialized headers following the tip of the chain
+        :param records: iterable: Records read by replication_records on the leader
+
+        :return: int: Number of blocks appended
+        """
+        chain = self.coin.chain
+        previous = chain.header(len(chain) - 1) if len(chain) else None
+        checked = []
+        for obj in headers:
+            header = BlockHeader.load(obj)
+            if not validation.valid_header(header, previous, self.coin.difficulty):
+                raise ValueError(f"Invalid header at height {header.height}")
+            checked.append(header)
+            previous = header
+
+        start = len(chain)
+        applied = []
+        try:
+            for record in records:
+                if record["type"] in ("block", "header"):
+                    if len(chain) - start >= len(checked):
+                        raise ValueError(
+                            f"Block {len(chain)} was sent without its header"
+                        )
+                    self._append_replicated(record, checked[len(chain) - start])
+                elif record["type"] == "snapshot":
+                    if record["height"] >= len(chain) or (
+                        "hash" in record
+                        and chain.header(record["height"]).hash != record["hash"]
+                    ):
+                        raise ValueError(
+                            f"Snapshot at height {record['height']} does not match the chain"
+                        )
+                    self.wallet = Wallet().from_dict(record["wallet"])
+                    self.state = self._new_state()
+                    self.seq = record.get("seq", 0)
+                    self.coin.resolve()
+                else:
+                    if record["type"] == "wallet":
+                        self.wallet.load_address(record["wallet"])
+                    elif record["type"] == "credit":
+                        self.wallet.credit_wallet(
+                            record["credit"]["pbc"], record["credit"]["amount"]
+                        )
+                    if self.seq != -1 and "seq" in record:
+                        self.seq = record["seq"]
+                applied.append(record)
+        finally:
+            # the records are written in the order they were applied
+            if self.storage is not None:
+                self._write(applied)
+        return len(chain) - start
+
+    def _append_replicated(self, record, header) -> None:
+        if record["type"] == "header":
+            if BlockHeader.load(record["header"]).to_dict() != header.to_dict():
+                raise ValueError(f"Header {header.height} does not match")
+            # the blocks below a pruned block have no body either
+            if self.coin.chain.pruned < len(self.coin.chain):
+                self.coin.prune(len(self.coin.chain))
+            self.coin.append_header(record["header"], None)
+            # the changes of the block are missing until the next snapshot
+            self.seq = -1
+            return
+
+        block = Block(0)
+        block.from_dict(record["block"])
+        if BlockHeader.from_block(
+            header.height, block
+        ).to_dict() != header.to_dict() or not validation.valid_block(block):
+            raise ValueError(f"Block {header.height} does not match its header")
+        if self.seq == -1:
+            # the wallet misses the changes of pruned blocks until the next
+            # snapshot replaces it, the transactions can not be executed again
+            block.apply(self.wallet)
+        else:
+            self._execute_replicated(block, header.height)
+        self.coin.append(block)
+
+    def _execute_replicated(self, block, height) -> None:
+        # the changes recorded by the leader are not covered by the block
+        # hash: the transactions are applied again and have to make the same
+        # changes, a block that does not is undone and refused
+        wallet = self.wallet
+        balances = {}  # pbc -> balance before the block
+        owners = {}  # NFT id -> owner before the block
+        derived = set()
+        for i, transaction in enumerate(block.transactions):
+            if type(transaction) == str or not isinstance(
+                transaction.input.get("data"), dict
+            ):
+                continue
+            derived.add(nft_id(transaction.hash, i))
+            data = transaction.input["data"]
+            for field in ("from", "to", "owner"):
+                key = data.get(field)
+                if not isinstance(key, str):
+                    continue
+                row = wallet.by_pbc.get(key, wallet.by_pve.get(key))
+                if row is not None:
+                    balances.setdefault(wallet.pbc[row], wallet.balances[row])
+            nft = (
+                wallet.nfts.get(data.get("nft"))
+                if isinstance(data.get("nft"), str)
+                else None
+            )
+            if nft is not None:
+                owners.setdefault(nft.id, nft.owner)
+
+        # blocks mined before NFT ids were derived from their transaction
+        # keep the ids they were given, an id that exists is still refused
+        nfts = block.nft or []
+        ids = (
+            None if all(nft.id in derived for nft in nfts) else [nft.id for nft in nfts]
+        )
+        executed = block.execute(wallet, ids)
+        expected = {
+            "balances": block.deltas["balances"],
+            "nfts": block.deltas["nfts"],
+            "rejected": block.deltas.get("rejected", executed.deltas["rejected"]),
+        }
+        if executed.deltas == expected and [
+            nft.to_dict() for nft in executed.nft or []
+        ] == [nft.to_dict() for nft in nfts]:
+            return
+
+        for pbc, balance in balances.items():
+            wallet.balances[wallet.by_pbc[pbc]] = balance
+            wallet.changed.add(pbc)
+        for nft in executed.nft or []:
+            wallet.nfts.remove(nft.id)
+        for id, owner in owners.items():
+            wallet.nfts.move(id, owner)
+        raise ValueError(f"Block {height} does not match the changes it recorded")
 
     """
     ---
@@ -133,13 +1261,26 @@ class Coin:
     used for syncing the blockchain to a file
     """
 
+    @committed
     def from_dict(self, data) -> object:
-        self.coin.chain = []
+        self.coin.clear()
+        previous = None
         for block in data["coin"]:
             block_ = Block(0)
             block_.from_dict(block)
-            self.coin.chain.append(block_)
+            # blockchain.json hashed the repr of the transaction objects, which
+            # can not be computed again: such blocks and the ones linked after
+            # them are hashed again the way blocks are hashed now
+            if previous is not None and (
+                block_.previous_hash != previous.hash
+                or not validation.valid_block(block_)
+            ):
+                block_.rehash(previous.hash)
+            self.coin.append(block_)
+            previous = block_
 
         wallet = Wallet()
         self.wallet = wallet.from_dict(data["Wallet"])
+        self.coin.resolve()
+        self.state = self._new_state()
         return self
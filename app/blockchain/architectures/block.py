@@ -1,11 +1,46 @@
 from .transaction import Transaction
-from .wallet import Wallet
-from .nft import NFT
+from .nft import NFT, nft_id
+from ..encoding import encode
+from ..merkle import merkle_root
+import copy
 import hashlib
 from typing import Union
 from datetime import datetime
 
 
+def block_hash(timestamp, merkle_root, previous_hash) -> str:
+    """
+    Hash of a block from the fields of its header
+
+    :param timestamp: float: Timestamp of the block
+    :param merkle_root: str: Merkle root of the transaction hashes
+    :param previous_hash: str: Hash of the previous block
+
+    :return: str: Hash of the block
+    """
+    return hashlib.sha256(
+        encode(
+            {
+                "timestamp": timestamp,
+                "merkle_root": merkle_root,
+                "previous_hash": previous_hash,
+            }
+        )
+    ).hexdigest()
+
+
+def _bundle_size(transaction) -> int:
+    # transfers submitted as a batch carry their place in the bundle, the
+    # first one its size
+    if type(transaction) == str or not isinstance(transaction.input, dict):
+        return 1
+    bundle = transaction.input.get("bundle")
+    if not isinstance(bundle, dict) or bundle.get("index") != 0:
+        return 1
+    size = bundle.get("size")
+    return size if type(size) == int and size > 1 else 1
+
+
 class Block:
     """
     Block class for blockchain
@@ -14,10 +49,23 @@ class Block:
     :param transactions: list: List of transactions
     :param previous_hash: str: Hash of the previous block
     :param proof: int: Proof of work
-    :param addresses: dict: Wallet addresses
+    :param addresses: Wallet: Wallet the transactions are applied to
     :param nft: list: List of NFTs
     """
 
+    __slots__ = (
+        "addresses",
+        "nft",
+        "timestamp",
+        "transactions",
+        "previous_hash",
+        "merkle_root",
+        "hash",
+        "proof",
+        "status",
+        "deltas",
+    )
+
     def __init__(
         self,
         timestamp,
@@ -37,65 +85,193 @@ class Block:
         self.timestamp = timestamp
         self.transactions = transactions if transactions else []
         self.previous_hash = previous_hash if previous_hash else ""
+        self.merkle_root = merkle_root(self.transaction_hashes())
         self.hash = self.get_hash()
         self.proof = proof if proof else 0
         self.status = 0  # 0 = pending, 1 = completed
+        # changes applied to the wallet, the block does not keep a wallet copy,
+        # and the index of the transactions that could not be applied
+        self.deltas = {"balances": [], "nfts": [], "rejected": []}
         self._complete()
 
-    def _complete(self):
-        for transaction in self.transactions:
-            try:
-                pbc = self.addresses.get_public_key(transaction.input["data"]["from"])
-                pve = transaction.input["data"]["from"]
-            except:
-                pass
+    def _credit(self, public_key, amount):
+        if self.addresses.credit_wallet(public_key, amount) != "Failed":
+            self.deltas["balances"].append([public_key, amount])
 
+    def _complete(self, nft_ids=None):
+        i = 0
+        while i < len(self.transactions):
+            transaction = self.transactions[i]
             if transaction == "genisis block":
                 return
-
-            if transaction.input["type"] == "token-transfer":
-                if float(transaction.input["data"]["amount"]) >= 0:
-                    if transaction.input["data"]["to"] == pbc:
-                        return
-                    if self.addresses.get_balance(pve, pbc) >= float(
-                        transaction.input["data"]["amount"]
-                    ):
-                        self.addresses.credit_wallet(
-                            transaction.input["data"]["to"],
-                            float(transaction.input["data"]["amount"]),
-                        )
-                        self.addresses.credit_wallet(
-                            pbc, -float(transaction.input["data"]["amount"])
-                        )
-
-            if transaction.input["type"] == "nft-transfer":
-                nft = self.addresses.get_nft(transaction.input["data"]["nft"])
-                from_ = transaction.input["data"]["from"]  # pve
-                to_ = transaction.input["data"]["to"]  # pbc
-                self.addresses.give_nft(to_, nft)
-                self.addresses.take_nft(from_, nft)
-
-            if transaction.input["type"] == "nft-create":
-                if not self.nft:
-                    self.nft = []
-                nft = NFT(
-                    transaction.input["data"]["name"],
-                    transaction.input["data"]["description"],
-                    transaction.input["data"]["url"],
-                    transaction.input["data"]["owner"],
-                    transaction.timestamp,
-                )
-                self.nft.append(nft)
-                self.addresses.give_nft(transaction.input["data"]["owner"], nft)
+            size = _bundle_size(transaction)
+            if size > 1:
+                self._apply_bundle(i, min(i + size, len(self.transactions)))
+                i += size
+                continue
+            # a transaction that can not be applied is skipped, the other
+            # transactions of the block are still applied
+            if not self._apply_transaction(i, transaction, nft_ids):
+                self.deltas["rejected"].append(i)
+            i += 1
 
         self.status = 1
 
+    def _apply_bundle(self, start, stop) -> None:
+        # the transfers of a batch are applied together or not at all
+        wallet = self.addresses
+        bundle = self.transactions[start:stop]
+        applied = len(self.deltas["balances"])
+        balances = {}  # pbc -> balance before the bundle
+        for transaction in bundle:
+            if transaction.input.get("type") != "token-transfer":
+                break
+            data = transaction.input.get("data", {})
+            for pbc in (wallet.get_public_key(data.get("from")), data.get("to")):
+                if pbc in wallet.by_pbc:
+                    balances[pbc] = wallet.balances[wallet.by_pbc[pbc]]
+        else:
+            if all(
+                self._apply_transaction(start + i, transaction)
+                for i, transaction in enumerate(bundle)
+            ):
+                return
+        for pbc, balance in balances.items():
+            wallet.balances[wallet.by_pbc[pbc]] = balance
+            wallet.changed.add(pbc)
+        del self.deltas["balances"][applied:]
+        self.deltas["rejected"].extend(range(start, stop))
+
+    def _apply_transaction(self, i, transaction, nft_ids=None) -> bool:
+        pbc = pve = None
+        try:
+            pbc = self.addresses.get_public_key(transaction.input["data"]["from"])
+            pve = transaction.input["data"]["from"]
+        except:
+            pass
+
+        if transaction.input["type"] == "token-transfer":
+            amount = float(transaction.input["data"]["amount"])
+            if not amount >= 0 or transaction.input["data"]["to"] == pbc:
+                return False
+            balance = self.addresses.get_balance(pve, pbc)
+            if type(balance) != float or balance < amount:
+                return False
+            if transaction.input["data"]["to"] not in self.addresses.by_pbc:
+                return False
+            self._credit(transaction.input["data"]["to"], amount)
+            self._credit(pbc, -amount)
+            return True
+
+        if transaction.input["type"] == "nft-transfer":
+            from_ = transaction.input["data"]["from"]  # pve
+            to_ = transaction.input["data"]["to"]  # pbc
+            nft = self.addresses.transfer_nft(
+                from_, to_, transaction.input["data"]["nft"]
+            )
+            if nft == "Failed":
+                return False
+            self.deltas["nfts"].append({"id": nft.id, "from": pbc, "to": to_})
+            return True
+
+        if transaction.input["type"] == "nft-create":
+            if transaction.input["data"]["owner"] not in self.addresses.by_pbc:
+                return False
+            # the id comes from the transaction, an NFT with the same id is
+            # never replaced
+            id = nft_id(transaction.hash, i) if nft_ids is None else next(nft_ids, None)
+            if id is None or self.addresses.nfts.get(id) is not None:
+                return False
+            if not self.nft:
+                self.nft = []
+            nft = NFT(
+                transaction.input["data"]["name"],
+                transaction.input["data"]["description"],
+                transaction.input["data"]["url"],
+                transaction.input["data"]["owner"],
+                transaction.timestamp,
+                id,
+            )
+            self.nft.append(nft)
+            # the wallet gets its own copy, the block keeps the NFT as created
+            self.addresses.give_nft(transaction.input["data"]["owner"], copy.copy(nft))
+            return True
+
+        return False
+
+    def execute(self, wallet, nft_ids=None) -> "Block":
+        """
+        Apply the transactions of the block to a wallet again
+
+        :param wallet: Wallet: Wallet to apply the transactions to
+        :param nft_ids: list: IDs of the NFTs created by the block, in order, None to derive them from the transactions
+
+        :return: Block: Copy of the block holding the changes made to the wallet
+        """
+        block = Block(0)
+        block.timestamp = self.timestamp
+        block.transactions = self.transactions
+        block.previous_hash = self.previous_hash
+        block.merkle_root = self.merkle_root
+        block.hash = self.hash
+        block.proof = self.proof
+        block.addresses = wallet
+        block.status = 0
+        block._complete(None if nft_ids is None else iter(nft_ids))
+        return block
+
+    def apply(self, wallet) -> None:
+        """
+        Apply the recorded changes of the block to a wallet
+
+        :param wallet: Wallet: Wallet to apply the changes to
+        """
+        for public_key, amount in self.deltas["balances"]:
+            wallet.credit_wallet(public_key, amount)
+
+        for nft in self.nft or []:
+            wallet.give_nft(nft.owner, copy.copy(nft))
+
+        for move in self.deltas["nfts"]:
+            wallet.nfts.move(move["id"], move["to"])
+
+    def transaction_hashes(self) -> list:
+        return [
+            transaction if type(transaction) == str else transaction.hash
+            for transaction in self.transactions
+        ]
+
+    def rehash(self, previous_hash) -> str:
+        """
+        Hash the transactions and the block again and link it to a new previous block
+
+        :param previous_hash: str: Hash of the previous block
+
+        :return: str: New hash of the block
+        """
+        for transaction in self.transactions:
+            if type(transaction) != str:
+                transaction.hash = transaction.get_hash()
+        self.previous_hash = previous_hash
+        self.merkle_root = merkle_root(self.transaction_hashes())
+        self.hash = self.get_hash()
+        return self.hash
+
     def get_hash(self) -> str:
-        return hashlib.sha256(
-            str(self.timestamp).encode("utf-8")
-            + str(self.transactions).encode("utf-8")
-            + str(self.previous_hash).encode("utf-8")
-        ).hexdigest()
+        # transactions are covered by the Merkle root of their hashes, so a
+        # transaction can be proven to be in a block without the whole block
+        if self.merkle_root is None:
+            # blocks stored before the Merkle root was added
+            return hashlib.sha256(
+                encode(
+                    {
+                        "timestamp": self.timestamp,
+                        "transactions": self.transaction_hashes(),
+                        "previous_hash": self.previous_hash,
+                    }
+                )
+            ).hexdigest()
+        return block_hash(self.timestamp, self.merkle_root, self.previous_hash)
 
     """
     ---
@@ -116,8 +292,9 @@ class Block:
         obj = {
             "timestamp": self.timestamp,
             "transactions": transactions,
-            "addresses": self.addresses.to_dict() if self.addresses else "",
+            "deltas": self.deltas,
             "previous_hash": self.previous_hash,
+            "merkle_root": self.merkle_root,
             "hash": self.hash,
             "status": self.status,
             "nft": [nft.to_dict() for nft in self.nft] if self.nft else "",
@@ -127,10 +304,7 @@ class Block:
         return obj
 
     def from_dict(self, obj) -> object:
-        # reinit addresses
-        self.addresses = Wallet()
-        self.addresses.from_dict(obj["addresses"])
-
+        self.deltas = obj.get("deltas", {"balances": [], "nfts": []})
         self.timestamp = obj["timestamp"]
 
         # reinit transactions
@@ -153,9 +327,10 @@ class Block:
                 nft["owner"],
                 nft["timestamp"],
             )
-            self.nft.append(nft_class)
+            self.nft.append(nft_class.from_dict(nft))
 
         self.previous_hash = obj["previous_hash"]
+        self.merkle_root = obj.get("merkle_root")
         self.hash = obj["hash"]
         self.status = obj["status"]
         self.proof = obj["proof"]
@@ -1,3 +1,27 @@
+import heapq
+from bisect import bisect_left
+from typing import Union
+from ..storage.chain import ChainStore
+
+
+def _parties(data) -> tuple:
+    # keys named by a transaction input: sender private key or None, and the
+    # set of receiver and owner public keys
+    if not isinstance(data, dict) or not isinstance(data.get("data"), dict):
+        return None, set()
+    sender = data["data"].get("from")
+    return sender if isinstance(sender, str) else None, {
+        data["data"][field]
+        for field in ("to", "owner")
+        if isinstance(data["data"].get(field), str)
+    }
+
+
+def _newest_first(positions, stop):
+    for i in range(stop - 1, -1, -1):
+        yield positions[i]
+
+
 class Blockchain:
     """
     Blockchain class
@@ -5,20 +29,242 @@ class Blockchain:
     :param name: str: Name of the blockchain
     :param difficulty: int: Difficulty of the blockchain
     :param minimum_transactions: int: Minimum transactions required to create a block
+    :param max_transactions: int: Maximum transactions in a block, 0 for no limit
+    :param max_bytes: int: Maximum serialized transaction bytes in a block, 0 for no limit
+    :param max_wait: float: Seconds a transaction waits before a partial block is sealed
+    :param chain: ChainStore: Store holding the blocks, in memory by default
+    :param public_key: callable: Public key (pbc) of a private key, None if it is unknown
     """
 
-    def __init__(self, name="", difficulty=2, minimum_transactions=2):
+    def __init__(
+        self,
+        name="",
+        difficulty=2,
+        minimum_transactions=2,
+        max_transactions=0,
+        max_bytes=0,
+        max_wait=0,
+        chain=None,
+        public_key=None,
+    ):
         self.name = name
         self.difficulty = difficulty
         self.minimum_transactions = minimum_transactions
-        self.chain = []
+        self.max_transactions = max_transactions
+        self.max_bytes = max_bytes
+        self.max_wait = max_wait
+        self.chain = ChainStore() if chain is None else chain
+        self.public_key = public_key
         self.pending_transactions = []
+        # the indexes below stay empty when the storage has its own
+        self.tx_index = {}  # transaction hash -> (block height, index in block)
+        # hashes of the transactions a block could not apply
+        self.rejected = set()
+        # public key found in a transaction -> (block height, index in block),
+        # oldest first. Senders are named by their private key, they are
+        # indexed under it until their public key is known
+        self.history = {}
+        self.unresolved = set()  # private keys indexed in the history
+
+    @property
+    def indexed(self) -> bool:
+        # the storage looks up transactions itself
+        return getattr(self.chain.storage, "indexed", False)
+
+    def append(self, block) -> None:
+        """
+        Add a block to the end of the chain and index its transactions
+
+        :param block: Block: Block to add
+        """
+        height = self.chain.append(block)
+        self._index(
+            height,
+            [
+                (
+                    (transaction, None)
+                    if type(transaction) == str
+                    else (transaction.hash, transaction.input)
+                )
+                for transaction in block.transactions
+            ],
+            block.deltas.get("rejected", []),
+        )
+
+    def append_written(self, obj, offset) -> None:
+        """
+        Add a block that is already in the storage, without loading it
+
+        :param obj: dict: Serialized block
+        :param offset: Position of the block in the storage
+        """
+        height = self.chain.append_written(obj, offset)
+        self._index(
+            height,
+            [
+                (
+                    (transaction, None)
+                    if type(transaction) == str
+                    else (transaction["hash"], transaction["input"])
+                )
+                for transaction in obj["transactions"]
+            ],
+            obj.get("deltas", {}).get("rejected", []),
+        )
+
+    def append_header(self, obj, offset) -> None:
+        """
+        Add a block whose body was pruned, its transactions are not indexed
+
+        :param obj: dict: Serialized header
+        :param offset: Position of the header in the storage
+        """
+        self.chain.append_header(obj, offset)
+
+    def prune(self, height) -> None:
+        """
+        Drop the bodies of the blocks below a height and their transactions
+
+        :param height: int: Height of the first block that keeps its body
+        """
+        self.chain.prune(height)
+        self.tx_index = {
+            transaction: position
+            for transaction, position in self.tx_index.items()
+            if position[0] >= height
+        }
+        self.rejected = {
+            transaction for transaction in self.rejected if transaction in self.tx_index
+        }
+        # new lists, readers may still be walking the old ones
+        history = {}
+        for key, positions in self.history.items():
+            start = bisect_left(positions, (height, 0))
+            if start < len(positions):
+                history[key] = positions[start:]
+        self.history = history
+
+    def clear(self) -> None:
+        """
+        Remove every block, keeping the storage and cache size of the chain
+        """
+        self.chain = ChainStore(self.chain.storage, self.chain.cache.maxsize)
+        self.tx_index = {}
+        self.rejected = set()
+        self.history = {}
+        self.unresolved = set()
+
+    def _index(self, height, transactions, rejected=()) -> None:
+        if self.indexed:
+            return
+        for i in rejected:
+            self.rejected.add(transactions[i][0])
+        for i, (transaction, data) in enumerate(transactions):
+            # the genesis block holds a plain string instead of a transaction
+            if transaction == "genisis block":
+                continue
+            position = (height, i)
+            self.tx_index[transaction] = position
+            sender, keys = _parties(data)
+            if sender is not None:
+                public_key = self.public_key(sender) if self.public_key else None
+                if public_key is None:
+                    self.unresolved.add(sender)
+                    public_key = sender
+                keys.add(public_key)
+            for key in keys:
+                self.history.setdefault(key, []).append(position)
+
+    def resolve(self) -> None:
+        """
+        Move the transactions indexed under the private key of their sender
+        to its public key, once it is known
+        """
+        if not self.unresolved or self.public_key is None:
+            return
+        # new lists, readers may still be walking the old ones
+        history = dict(self.history)
+        for private_key in list(self.unresolved):
+            public_key = self.public_key(private_key)
+            if public_key is None:
+                continue
+            self.unresolved.discard(private_key)
+            positions = history.pop(private_key, None)
+            if positions:
+                history[public_key] = list(
+                    heapq.merge(history.get(public_key, []), positions)
+                )
+        self.history = history
+
+    def position(self, hash) -> Union[tuple, None]:
+        """
+        Get where a transaction is in the chain
+
+        :param hash: str: Hash of the transaction
+
+        :return: tuple: (block height, index in block), None if it is in no block
+        """
+        if not self.indexed:
+            return self.tx_index.get(hash)
+        row = self.chain.storage.transaction(hash)
+        # the storage can be ahead of the blocks this process has loaded
+        if row is None or row[0] >= len(self.chain):
+            return None
+        return row[:2]
+
+    def is_rejected(self, hash) -> bool:
+        """
+        Check if the block of a transaction could not apply it
+
+        :param hash: str: Hash of the transaction
+
+        :return: bool: True if the transaction is in a block that rejected it
+        """
+        if not self.indexed:
+            return hash in self.rejected
+        row = self.chain.storage.transaction(hash)
+        return row is not None and row[0] < len(self.chain) and row[2]
+
+    def history_of(self, keys, before=None, limit=50) -> list:
+        """
+        Get the positions of the transactions naming any of the given keys
+
+        :param keys: list: Public keys (pbc) of wallet addresses
+        :param before: tuple: Only positions older than this (height, index), None for the newest
+        :param limit: int: Maximum number of positions
+
+        :return: list: (block height, index in block), newest first
+        """
+        if self.indexed:
+            tip = (len(self.chain), 0)
+            before = tip if before is None else min(before, tip)
+            return self.chain.storage.transactions_of(keys, before, limit)
+
+        history = self.history
+        walks = []
+        for key in keys:
+            positions = history.get(key, [])
+            stop = len(positions) if before is None else bisect_left(positions, before)
+            walks.append(_newest_first(positions, stop))
+
+        page = []
+        for position in heapq.merge(*walks, reverse=True):
+            # a transaction naming several of the keys is listed once
+            if page and page[-1] == position:
+                continue
+            if len(page) == limit:
+                break
+            page.append(position)
+        return page
 
     def to_dict(self) -> dict:
         return {
             "name": self.name,
             "difficulty": self.difficulty,
             "minimum_transactions": self.minimum_transactions,
+            "max_transactions": self.max_transactions,
+            "max_bytes": self.max_bytes,
+            "max_wait": self.max_wait,
             "chain": [block.to_dict() for block in self.chain],
             "pending_transactions": [
                 transaction.to_dict() for transaction in self.pending_transactions
@@ -1,13 +1,34 @@
 import hashlib
 import random
+from datetime import datetime
+from itertools import islice
+from typing import Union
+
+
+def nft_id(transaction_hash, index) -> str:
+    """
+    ID of the NFT created by a transaction
+
+    :param transaction_hash: str: Hash of the nft-create transaction
+    :param index: int: Index of the transaction in its block
+
+    :return: str: ID of the NFT
+    """
+    return (
+        "0x" + hashlib.sha256(f"{transaction_hash}:{index}".encode("utf-8")).hexdigest()
+    )
 
 
 class NFT:
-    def __init__(self, name, description, url, public_key, timestamp):
-        identificator = random.randint(10000000, 9999999999)
-        self.id = "0x" + str(
-            hashlib.sha256(str(identificator).encode("utf-8")).hexdigest()
-        )
+    __slots__ = ("id", "name", "description", "url", "owner", "timestamp")
+
+    def __init__(self, name, description, url, public_key, timestamp, id=None):
+        if id is None:
+            identificator = random.randint(10000000, 9999999999)
+            id = "0x" + str(
+                hashlib.sha256(str(identificator).encode("utf-8")).hexdigest()
+            )
+        self.id = id
         self.name = name
         self.description = description
         self.url = url
@@ -34,3 +55,96 @@ class NFT:
             "timestamp": self.timestamp.timestamp(),
             "hash": self.get_hash(),
         }
+
+    def from_dict(self, obj) -> object:
+        self.id = obj["id"]
+        self.name = obj["name"]
+        self.description = obj["description"]
+        self.url = obj["url"]
+        self.owner = obj["owner"]
+        self.timestamp = datetime.fromtimestamp(obj["timestamp"])
+        return self
+
+
+class NFTRegistry:
+    """
+    NFTs by id, with the ids of the NFTs owned by each public key
+    """
+
+    def __init__(self):
+        self.nfts = {}  # id -> NFT
+        self.owners = {}  # pbc -> {id: None}, kept in the order NFTs were received
+        # NFTs and owners changed since the last state
+        self.changed = set()
+        self.changed_owners = set()
+
+    def add(self, public_key, nft) -> None:
+        """
+        Register an NFT and give it to a wallet address
+
+        :param public_key: str: Public key of the owner (pbc)
+        :param nft: NFT: NFT to register
+        """
+        old = self.nfts.get(nft.id)
+        if old is not None:
+            self.owners.get(old.owner, {}).pop(nft.id, None)
+            self.changed_owners.add(old.owner)
+        self.changed.add(nft.id)
+        self.changed_owners.add(public_key)
+        nft.owner = public_key
+        self.nfts[nft.id] = nft
+        self.owners.setdefault(public_key, {})[nft.id] = None
+
+    def get(self, nft_id) -> Union[NFT, None]:
+        return self.nfts.get(nft_id)
+
+    def move(self, nft_id, public_key) -> Union[NFT, None]:
+        """
+        Change the owner of an NFT
+
+        :param nft_id: str: ID of the NFT
+        :param public_key: str: Public key of the new owner (pbc)
+
+        :return: NFT or None if it does not exist
+        """
+        nft = self.nfts.get(nft_id)
+        if nft is None:
+            return None
+        self.owners.get(nft.owner, {}).pop(nft_id, None)
+        self.changed.add(nft_id)
+        self.changed_owners.update((nft.owner, public_key))
+        nft.owner = public_key
+        self.owners.setdefault(public_key, {})[nft_id] = None
+        return nft
+
+    def remove(self, nft_id) -> Union[NFT, None]:
+        """
+        Unregister an NFT
+
+        :param nft_id: str: ID of the NFT
+
+        :return: NFT or None if it does not exist
+        """
+        nft = self.nfts.pop(nft_id, None)
+        if nft is not None:
+            self.owners.get(nft.owner, {}).pop(nft_id, None)
+            self.changed.add(nft_id)
+            self.changed_owners.add(nft.owner)
+        return nft
+
+    def count(self, public_key) -> int:
+        return len(self.owners.get(public_key, ()))
+
+    def owned_by(self, public_key, offset=0, limit=None) -> list:
+        """
+        Get the NFTs of a wallet address
+
+        :param public_key: str: Public key of the owner (pbc)
+        :param offset: int: Number of NFTs to skip
+        :param limit: int: Maximum number of NFTs to return, None for all
+
+        :return: list: List of NFTs
+        """
+        ids = self.owners.get(public_key, {})
+        stop = None if limit is None else offset + limit
+        return [self.nfts[nft_id] for nft_id in islice(ids, offset, stop)]
@@ -1,4 +1,6 @@
 import hashlib
+from datetime import datetime
+from ..encoding import encode
 
 
 class Transaction:
@@ -9,14 +11,19 @@ class Transaction:
     :param data: dict: Data of the transaction
     """
 
+    __slots__ = ("timestamp", "input", "hash")
+
     def __init__(self, timestamp, data):
         self.timestamp = timestamp
         self.input = data if data else {}
         self.hash = self.get_hash()
 
     def get_hash(self) -> str:
+        timestamp = self.timestamp
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.timestamp()
         return hashlib.sha256(
-            str(self.timestamp).encode("utf-8") + str(self.input).encode("utf-8")
+            encode({"timestamp": timestamp, "input": self.input})
         ).hexdigest()
 
     def to_dict(self) -> dict:
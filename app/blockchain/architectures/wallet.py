@@ -1,8 +1,8 @@
 import hashlib, random
+from array import array
 from typing import Union
 from decimal import Decimal, getcontext
-import copy
-
+from .nft import NFT, NFTRegistry
 
 getcontext().prec = 10
 
@@ -11,11 +11,30 @@ class Wallet:
     """
     Wallet class, saves wallet addresses and balances
 
+    Addresses are stored column by column: row i of the key lists and of
+    the balance array is one wallet address, by_pbc and by_pve map the keys
+    to their row. Address dicts are only built when they are returned.
+
     :param addresses: list: List of wallet addresses
     """
 
     def __init__(self, addresses=None):
-        self.addresses = [] if addresses is None else addresses
+        self.pbc = []
+        self.pve = []
+        self.balances = array("d")
+        self.by_pbc = {}  # pbc -> row
+        self.by_pve = {}  # pve -> row
+        self.changed = set()  # pbc of the addresses changed since the last state
+        self.nfts = NFTRegistry()
+        for address in addresses or []:
+            self.add_address(address)
+
+    def __len__(self) -> int:
+        return len(self.pbc)
+
+    @property
+    def addresses(self) -> list:
+        return [self._row_to_dict(row) for row in range(len(self.pbc))]
 
     def create_wallet(self) -> dict:
         """
@@ -31,10 +50,9 @@ class Wallet:
             "address": {"pve": private_key, "pbc": public_key},
             "info": {"balance": float(0), "nfts": []},
         }
-        if self.validate_address(private_key, public_key) == False:
-            self.addresses.append(cred_keys)
-            return cred_keys
-        return self.create_address()
+        if private_key not in self.by_pve and public_key not in self.by_pbc:
+            return self.add_address(cred_keys)
+        return self.create_wallet()
 
     def get_balance(self, private_key=None, public_key=None) -> Union[float, str]:
         """
@@ -49,12 +67,9 @@ class Wallet:
         if r is False:
             return "Private and Public keys are required"
 
-        for address in self.addresses:
-            if (
-                address["address"]["pbc"] == public_key
-                and address["address"]["pve"] == private_key
-            ):
-                return float(address["info"]["balance"])
+        row = self.by_pbc.get(public_key)
+        if row is not None and self.pve[row] == private_key:
+            return self.balances[row]
 
     def get_public_key(self, private_key=None) -> str:
         """
@@ -67,9 +82,9 @@ class Wallet:
         if private_key is None:
             return "Failed"
 
-        for address in self.addresses:
-            if address["address"]["pve"] == private_key:
-                return address["address"]["pbc"]
+        row = self.by_pve.get(private_key)
+        if row is not None:
+            return self.pbc[row]
         return "Failed"
 
     def credit_wallet(self, public_key=None, amount=None) -> Union[float, str]:
@@ -84,12 +99,11 @@ class Wallet:
         if public_key is None or amount is None:
             return "Failed"
 
-        for address in self.addresses:
-            if address["address"]["pbc"] == public_key:
-                address["info"]["balance"] = float(
-                    Decimal(address["info"]["balance"]) + Decimal(amount)
-                )
-                return address["info"]["balance"]
+        row = self.by_pbc.get(public_key)
+        if row is not None:
+            self.balances[row] = float(Decimal(self.balances[row]) + Decimal(amount))
+            self.changed.add(public_key)
+            return self.balances[row]
         return "Failed"
 
     def validate_address(self, private_key=None, public_key=None) -> Union[bool, str]:
@@ -105,31 +119,25 @@ class Wallet:
         if r == False:
             return "Private and Public keys are required"
 
-        for address in self.addresses:
-            if (
-                address["address"]["pbc"] == public_key
-                and address["address"]["pve"] == private_key
-            ):
-                return True
-        return False
+        row = self.by_pbc.get(public_key)
+        return row is not None and self.pve[row] == private_key
 
-    def get_nfts(self, public_key=None) -> list:
+    def get_nfts(self, public_key=None, offset=0, limit=None) -> list:
         """
         Get the NFTs of a wallet address
 
         :param public_key: str: Public key of the wallet (pbc)
+        :param offset: int: Number of NFTs to skip
+        :param limit: int: Maximum number of NFTs to return, None for all
 
         :return: list: List of NFTs or "Failed"
         """
-        if public_key is None:
+        if public_key is None or public_key not in self.by_pbc:
             return "Failed"
 
-        for address in self.addresses:
-            if address["address"]["pbc"] == public_key:
-                return address["info"]["nfts"]
-        return "Failed"
+        return self.nfts.owned_by(public_key, offset, limit)
 
-    def get_nft(self, nft_id=None) -> Union[dict, str]:
+    def get_nft(self, nft_id=None) -> Union[NFT, str]:
         """
         Get an NFT by its ID
 
@@ -137,71 +145,127 @@ class Wallet:
 
         :return: NFT or "Failed"
         """
-        if nft_id is None:
+        nft = self.nfts.get(nft_id)
+        if nft is None:
             return "Failed"
-
-        for address in self.addresses:
-            for nft in address["info"]["nfts"]:
-                if nft.id is nft_id:
-                    return nft
-        return "Failed"
+        return nft
 
     def give_nft(self, public_key=None, nft=None) -> Union[list, str]:
         """
         Give an NFT to a wallet address
 
         :param public_key: str: Public key of the wallet (pbc)
-        :param nft: dict: NFT to give
+        :param nft: NFT: NFT to give
 
         :return: List of NFTs or "Failed"
         """
-        if public_key is None or nft is None:
+        if public_key is None or nft is None or public_key not in self.by_pbc:
             return "Failed"
 
-        for address in self.addresses:
-            if address["address"]["pbc"] == public_key:
-                address["info"]["nfts"].append(nft)
-                return address["info"]["nfts"]
-        return "Failed"
+        self.nfts.add(public_key, nft)
+        return self.nfts.owned_by(public_key)
 
     def take_nft(self, private_key=None, nft=None) -> Union[list, str]:
         """
         Take an NFT from a wallet address
 
         :param private_key: str: Private key of the wallet (pve)
-        :param nft: dict: NFT to take
+        :param nft: NFT: NFT to take
 
         :return: List of NFTs or "Failed"
         """
         if private_key is None or nft is None:
             return "Failed"
 
-        for address in self.addresses:
-            if address["address"]["pve"] == private_key:
-                for n in address["info"]["nfts"]:
-                    if n.id == nft.id:
-                        address["info"]["nfts"].remove(n)
-                        return address["info"]["nfts"]
-        return "Failed"
+        row = self.by_pve.get(private_key)
+        owned = self.nfts.get(nft.id)
+        if row is None or owned is None or owned.owner != self.pbc[row]:
+            return "Failed"
+
+        self.nfts.remove(nft.id)
+        return self.nfts.owned_by(self.pbc[row])
+
+    def transfer_nft(self, private_key=None, public_key=None, nft_id=None):
+        """
+        Move an NFT from its owner to another wallet address
+
+        :param private_key: str: Private key of the owner (pve)
+        :param public_key: str: Public key of the receiver (pbc)
+        :param nft_id: str: ID of the NFT
+
+        :return: NFT or "Failed"
+        """
+        row = self.by_pve.get(private_key)
+        nft = self.nfts.get(nft_id)
+        if row is None or nft is None or public_key not in self.by_pbc:
+            return "Failed"
+        if nft.owner != self.pbc[row]:
+            return "Failed"
+
+        return self.nfts.move(nft_id, public_key)
 
     def _require(self, private_key=None, public_key=None) -> bool:
         if private_key is None or public_key is None:
             return False
         return True
 
+    def address_to_dict(self, address) -> dict:
+        """
+        Serialize a single wallet address
+
+        :param address: dict: Wallet address
+
+        :return: dict: Wallet address with its serialized NFTs
+        """
+        return self._row_to_dict(self.by_pbc[address["address"]["pbc"]])
+
+    def _row_to_dict(self, row) -> dict:
+        return {
+            "address": {"pve": self.pve[row], "pbc": self.pbc[row]},
+            "info": {
+                "balance": self.balances[row],
+                "nfts": [nft.to_dict() for nft in self.nfts.owned_by(self.pbc[row])],
+            },
+        }
+
+    def add_address(self, address) -> dict:
+        """
+        Add an existing wallet address
+
+        :param address: dict: Wallet address
+
+        :return: dict: Wallet address
+        """
+        row = len(self.pbc)
+        self.pbc.append(address["address"]["pbc"])
+        self.pve.append(address["address"]["pve"])
+        self.balances.append(float(address["info"]["balance"]))
+        self.by_pbc[address["address"]["pbc"]] = row
+        self.by_pve[address["address"]["pve"]] = row
+        self.changed.add(address["address"]["pbc"])
+        return address
+
+    def load_address(self, obj) -> dict:
+        """
+        Add a serialized wallet address and register its NFTs
+
+        :param obj: dict: Serialized wallet address
+
+        :return: dict: Wallet address
+        """
+        address = self.add_address(obj)
+        for nft in obj["info"].get("nfts", []):
+            self.nfts.add(
+                obj["address"]["pbc"],
+                NFT(None, None, None, None, None).from_dict(nft),
+            )
+        return address
+
     def to_dict(self) -> list:
-        addresses = copy.deepcopy(self.addresses)
-        for address in addresses:
-            if (
-                address["info"]["nfts"] != []
-                and type(address["info"]["nfts"][0]) != dict
-            ):
-                address["info"]["nfts"] = [
-                    nft.to_dict() for nft in address["info"]["nfts"]
-                ]
-
-        return addresses
+        return self.addresses
 
     def from_dict(self, obj) -> object:
-        self.addresses = obj
+        self.__init__()
+        for address in obj:
+            self.load_address(address)
         return self
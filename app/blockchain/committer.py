@@ -0,0 +1,95 @@
+import functools
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class Committer:
+    """
+    Single writer of the ledger, changes run one at a time on its thread
+
+    After each change publish is called, it updates the state readers
+    use. The changing lock is held while a change and its publish run, a
+    reader holding it never sees a change half applied. The caller waiting
+    for a change is answered after it is published. A change that makes
+    other changes runs them inline.
+
+    :param publish: callable: Called on the committer thread after every change
+    """
+
+    def __init__(self, publish):
+        self.publish = publish
+        self.queue = queue.Queue()
+        self.thread = None
+        self._lock = threading.Lock()
+        self.changing = threading.RLock()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._run, name="committer", daemon=True
+                )
+                self.thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            future, function, args, kwargs = job
+            result = error = None
+            with self.changing:
+                try:
+                    result = function(*args, **kwargs)
+                except BaseException as e:
+                    error = e
+                # the caller is only answered once readers can see its change
+                try:
+                    self.publish()
+                except BaseException as e:
+                    error = error or e
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def call(self, function, *args, **kwargs):
+        """
+        Run a change on the committer thread and wait for it
+
+        :param function: callable: Change to run
+        :param args: Arguments of the change
+        :param kwargs: Keyword arguments of the change
+
+        :return: Result of the change, its exception is raised again here
+        """
+        if threading.current_thread() is self.thread:
+            return function(*args, **kwargs)
+        self._start()
+        future = Future()
+        self.queue.put((future, function, args, kwargs))
+        return future.result()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+
+
+def committed(method):
+    """
+    Run a method of an object with a committer attribute on that committer
+
+    :param method: callable: Method making changes to the ledger
+
+    :return: callable: Method waiting for the change to be committed
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self.committer.call(method, self, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,17 @@
+import json
+
+
+def encode(obj) -> bytes:
+    """
+    Canonical encoding used for hashing and storage
+
+    Compact JSON with sorted keys: the same value always gives the same
+    bytes, whatever the dict ordering or the Python objects it came from.
+
+    :param obj: JSON-serializable value
+
+    :return: bytes: Encoded value
+    """
+    return json.dumps(
+        obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    ).encode("utf-8")
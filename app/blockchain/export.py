@@ -0,0 +1,99 @@
+"""
+Export the chain and the wallet of a node as NDJSON, one record per line
+
+The storage named in the config file is read once, without restoring the
+chain: memory does not grow with the size of the export and the storage of
+a running node is left as it is. The wallet is only rebuilt, with a second
+read up to the last exported block, when the balances are asked for. Run
+from the directory of the node:
+
+    python -m app.blockchain.export --output backup.ndjson --balances
+"""
+
+import argparse
+import os
+import sys
+from . import Coin
+from .encoding import encode
+from .storage import STORAGES
+from ..config import parse_config
+
+BATCH = 256  # lines joined into one chunk
+
+
+def ndjson(records, batch=BATCH):
+    """
+    Encode records as NDJSON
+
+    :param records: iterable: Records to encode
+    :param batch: int: Records per chunk
+
+    :return: generator: Chunks of lines, as bytes
+    """
+    lines = []
+    for record in records:
+        lines.append(encode(record) + b"\n")
+        if len(lines) == batch:
+            yield b"".join(lines)
+            lines = []
+    if lines:
+        yield b"".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--config", default="config.toml")
+    parser.add_argument("--output", default="-", help="file to write, - for stdout")
+    parser.add_argument(
+        "--balances", action="store_true", help="add the wallet after the blocks"
+    )
+    args = parser.parse_args()
+
+    config = parse_config(args.config).blockchain.get_config()
+    storage = STORAGES[config["backend"]](os.path.join(os.getcwd(), config["storage"]))
+    if not storage.exists():
+        sys.exit(f"No blockchain in {storage.path}")
+
+    coin = Coin(
+        restore=True,
+        storage=storage,
+        difficulty=config["difficulty"],
+        read_only=True,
+    )
+    height = -1
+
+    def blocks():
+        # counted while they are streamed, the wallet is rebuilt up to the last one
+        nonlocal height
+        for _, record in storage.records():
+            if record["type"] in ("block", "header"):
+                height += 1
+                yield record
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        # the height is not known before the blocks are read, it is left out
+        chain = {
+            "type": "chain",
+            "name": coin.coin.name,
+            "difficulty": coin.coin.difficulty,
+        }
+        output.write(encode(chain) + b"\n")
+        for chunk in ndjson(Coin.export_blocks(blocks())):
+            output.write(chunk)
+        if args.balances:
+            wallet = coin.state_at(height)
+            records = (
+                {"type": "wallet", "wallet": wallet._row_to_dict(row)}
+                for row in range(len(wallet.pbc))
+            )
+            for chunk in ndjson(records):
+                output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+        coin.committer.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import hashlib
+
+# leaves and inner nodes are hashed with different prefixes, an inner node
+# can not be passed off as a transaction
+LEAF = b"\x00"
+NODE = b"\x01"
+
+
+def _leaf(transaction_hash) -> bytes:
+    try:
+        data = bytes.fromhex(transaction_hash)
+    except ValueError:
+        # the genesis block holds a plain string instead of a transaction
+        data = transaction_hash.encode("utf-8")
+    return hashlib.sha256(LEAF + data).digest()
+
+
+def _node(left, right) -> bytes:
+    return hashlib.sha256(NODE + left + right).digest()
+
+
+def _levels(transaction_hashes) -> list:
+    # an odd node at the end of a level is moved up unchanged
+    levels = [[_leaf(transaction_hash) for transaction_hash in transaction_hashes]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append(
+            [
+                _node(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                for i in range(0, len(level), 2)
+            ]
+        )
+    return levels
+
+
+def merkle_root(transaction_hashes) -> str:
+    """
+    Merkle root of the transactions of a block
+
+    :param transaction_hashes: list: Hashes of the transactions, in block order
+
+    :return: str: Hex root, the hash of nothing for a block without transactions
+    """
+    if not transaction_hashes:
+        return hashlib.sha256(b"").hexdigest()
+    return _levels(transaction_hashes)[-1][0].hex()
+
+
+def merkle_proof(transaction_hashes, index) -> list:
+    """
+    Hashes needed to rebuild the Merkle root from one transaction
+
+    :param transaction_hashes: list: Hashes of the transactions, in block order
+    :param index: int: Position of the transaction in the block
+
+    :return: list: {"hash", "position"} from the leaf up, position is "left" or "right" of the running hash
+    """
+    proof = []
+    for level in _levels(transaction_hashes)[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(
+                {
+                    "hash": level[sibling].hex(),
+                    "position": "left" if sibling < index else "right",
+                }
+            )
+        index //= 2
+    return proof
+
+
+def verify_proof(transaction_hash, proof, root) -> bool:
+    """
+    Check that a transaction is part of a Merkle root
+
+    :param transaction_hash: str: Hash of the transaction
+    :param proof: list: Proof returned by merkle_proof
+    :param root: str: Merkle root of the block
+
+    :return: bool: True if the proof leads to the root
+    """
+    current = _leaf(transaction_hash)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        if step["position"] == "left":
+            current = _node(sibling, current)
+        else:
+            current = _node(current, sibling)
+    return current.hex() == root
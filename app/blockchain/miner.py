@@ -0,0 +1,116 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+_stop = None  # multiprocessing.Event shared with the worker processes
+CHECK_EVERY = 0x1000  # attempts between checks of the stop event
+
+
+def _init(stop) -> None:
+    global _stop
+    _stop = stop
+
+
+def _target(difficulty) -> tuple:
+    # a hex digest starting with `difficulty` zeros is a digest starting with
+    # difficulty // 2 zero bytes, plus a byte below 0x10 if difficulty is odd
+    return b"\0" * (difficulty // 2), difficulty % 2 == 1
+
+
+def valid_proof(last_proof, proof, difficulty) -> bool:
+    """
+    Check a proof of work
+
+    :param last_proof: int: Proof of the previous block
+    :param proof: int: Proof to check
+    :param difficulty: int: Number of leading zero hex digits required
+
+    :return: bool: True if the proof is valid
+    """
+    zeros, odd = _target(difficulty)
+    digest = hashlib.sha256(f"{last_proof}{proof}".encode()).digest()
+    return digest.startswith(zeros) and (not odd or digest[len(zeros)] < 0x10)
+
+
+def search(last_proof, difficulty, start=0, step=1):
+    """
+    Search proofs start, start + step, start + 2 * step, ...
+
+    :param last_proof: int: Proof of the previous block
+    :param difficulty: int: Number of leading zero hex digits required
+    :param start: int: First proof to try
+    :param step: int: Distance between two tried proofs
+
+    :return: int: Valid proof, or None if the search was stopped
+    """
+    zeros, odd = _target(difficulty)
+    size = len(zeros)
+    prefix = hashlib.sha256(str(last_proof).encode())
+    proof = start
+    attempts = 0
+    while True:
+        guess = prefix.copy()
+        guess.update(b"%d" % proof)
+        digest = guess.digest()
+        if digest.startswith(zeros) and (not odd or digest[size] < 0x10):
+            return proof
+        proof += step
+        attempts += 1
+        if attempts % CHECK_EVERY == 0 and _stop is not None and _stop.is_set():
+            return None
+
+
+class Miner:
+    """
+    Proof of work miner, splits the proofs between worker processes
+
+    Worker i tries proofs i, i + n, i + 2n, ... and every worker stops as soon
+    as one of them finds a valid proof.
+
+    :param workers: int: Number of worker processes, 0 for one per CPU core
+    """
+
+    def __init__(self, workers=1):
+        self.workers = workers if workers else os.cpu_count() or 1
+        self._pool = None
+        self._stop = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._stop = multiprocessing.Event()
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init, initargs=(self._stop,)
+            )
+        return self._pool
+
+    def mine(self, last_proof, difficulty) -> int:
+        """
+        Find a proof for the given previous proof
+
+        :param last_proof: int: Proof of the previous block
+        :param difficulty: int: Number of leading zero hex digits required
+
+        :return: int: Valid proof
+        """
+        if self.workers == 1:
+            return search(last_proof, difficulty)
+
+        with self._lock:
+            pool = self._get_pool()
+            self._stop.clear()
+            futures = [
+                pool.submit(search, last_proof, difficulty, i, self.workers)
+                for i in range(self.workers)
+            ]
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            self._stop.set()
+            wait(futures)
+            return next(f.result() for f in done if f.result() is not None)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
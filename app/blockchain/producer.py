@@ -0,0 +1,46 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BlockProducer:
+    """
+    Background task that mines pending transactions into blocks
+
+    Mining runs in the default executor so the event loop keeps serving
+    requests while a block is being mined.
+
+    :param coin: Coin: Blockchain to produce blocks for
+    :param interval: float: Seconds to wait when no block is ready to be mined
+    """
+
+    def __init__(self, coin, interval=0.1):
+        self.coin = coin
+        self.interval = interval
+        self.task = None
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            block = False
+            if self.coin.ready():
+                try:
+                    block = await loop.run_in_executor(None, self.coin.mine_pending)
+                except Exception:
+                    logger.exception("Failed to mine a block")
+            if not block:
+                await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
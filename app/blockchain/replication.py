@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+import zlib
+import requests
+from .encoding import encode
+
+logger = logging.getLogger(__name__)
+
+FLUSH_EVERY = 64  # records compressed before a chunk is sent
+
+
+def compress(records):
+    """
+    Encode records as gzip-compressed NDJSON, one record per line
+
+    :param records: iterable: Records to encode
+
+    :return: generator: Compressed chunks, sent as they are produced
+    """
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for i, record in enumerate(records, 1):
+        chunk = compressor.compress(encode(record) + b"\n")
+        if i % FLUSH_EVERY == 0:
+            chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+class PeerClient:
+    """
+    Client of the replication routes of a leader node
+
+    :param url: str: Base URL of the leader, e.g. http://127.0.0.1:8000
+    :param key: str: Secret key of the leader
+    :param timeout: float: Seconds to wait for the leader
+    """
+
+    def __init__(self, url, key, timeout=30):
+        self.url = url.rstrip("/")
+        self.key = key
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def headers(self, start, limit) -> list:
+        """
+        Get block headers from a height
+
+        :param start: int: Height of the first header
+        :param limit: int: Maximum number of headers
+
+        :return: list: Serialized headers
+        """
+        response = self.session.get(
+            f"{self.url}/api/bc/peer/headers",
+            params={"from": start, "limit": limit, "key": self.key},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
+        if "error" in data:
+            raise ValueError(data["error"])
+        return data["headers"]
+
+    def records(self, start, hash, seq, limit):
+        """
+        Stream the records following a block
+
+        :param start: int: Height of the first block to get
+        :param hash: str: Hash of the block before it, checked by the leader
+        :param seq: int: Number of the last wallet change already applied
+        :param limit: int: Maximum number of blocks
+
+        :return: generator: Records in the order the leader wrote them
+        """
+        params = {"from": start, "seq": seq, "limit": limit, "key": self.key}
+        if hash is not None:
+            params["hash"] = hash
+        response = self.session.get(
+            f"{self.url}/api/bc/peer/blocks",
+            params=params,
+            stream=True,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        if response.headers.get("content-type", "").startswith("application/json"):
+            raise ValueError(response.json()["error"])
+        # requests decompresses the gzip content encoding
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+class Replicator:
+    """
+    Background task that keeps a follower node in sync with a leader
+
+    Each round pulls the headers after the tip of the chain, checks them,
+    then pulls the blocks and wallet changes they cover. Only new blocks
+    and changes are transferred.
+
+    :param coin: Coin: Blockchain of the follower
+    :param url: str: Base URL of the leader
+    :param key: str: Secret key of the leader
+    :param batch_size: int: Maximum number of blocks pulled per round
+    :param interval: float: Seconds to wait when the follower is up to date
+    """
+
+    def __init__(self, coin, url, key, batch_size=500, interval=1.0):
+        self.coin = coin
+        self.client = PeerClient(url, key)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.task = None
+
+    def pull(self) -> int:
+        """
+        Pull one batch of blocks and wallet changes from the leader
+
+        :return: int: Number of blocks appended
+        """
+        chain = self.coin.coin.chain
+        start = len(chain)
+        hash = chain.header(start - 1).hash if start else None
+        headers = self.client.headers(start, self.batch_size)
+        records = self.client.records(start, hash, self.coin.seq, len(headers))
+        return self.coin.replicate(headers, records)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            appended = 0
+            try:
+                appended = await loop.run_in_executor(None, self.pull)
+            except Exception:
+                logger.exception("Failed to replicate from %s", self.client.url)
+            if not appended:
+                await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+class StorageFollower:
+    """
+    Background task that keeps a read-only node in sync with the storage
+    another process on the same host writes
+
+    :param coin: Coin: Read-only blockchain sharing the storage
+    :param interval: float: Seconds to wait when no block was added
+    """
+
+    def __init__(self, coin, interval=0.1):
+        self.coin = coin
+        self.interval = interval
+        self.task = None
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            added = 0
+            try:
+                added = await loop.run_in_executor(None, self.coin.refresh)
+            except Exception:
+                logger.exception("Failed to read %s", self.coin.storage.path)
+            if not added:
+                await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
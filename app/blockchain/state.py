@@ -0,0 +1,184 @@
+import threading
+from itertools import islice
+from cachetools import LRUCache
+
+_MISSING = object()
+
+
+class CachedLookup:
+    """
+    Read-only mapping answered by a lookup function, recent answers are kept
+    in a bounded LRU cache
+
+    Unknown keys are cached too. An answer read while entries were evicted
+    may be stale and is not cached.
+
+    :param lookup: callable: Value of a key, None if it is unknown
+    :param cache_size: int: Answers kept in the cache
+    :param items: callable: Every key and value, None if the mapping can not be iterated
+    """
+
+    __slots__ = ("lookup", "cache", "lock", "version", "_items")
+
+    def __init__(self, lookup, cache_size, items=None):
+        self.lookup = lookup
+        self.cache = LRUCache(maxsize=max(cache_size, 1))
+        self.lock = threading.Lock()
+        self.version = 0  # incremented by every eviction
+        self._items = items
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self.cache.get(key, _MISSING)
+            version = self.version
+        if value is _MISSING:
+            value = self.lookup(key)
+            with self.lock:
+                if version == self.version:
+                    self.cache[key] = value
+        return default if value is None else value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def items(self):
+        """
+        Iterate over the keys and values of the mapping, without the cache
+
+        :return: generator: (key, value) pairs
+        """
+        return self._items()
+
+    def evict(self, keys) -> None:
+        """
+        Forget the cached answers of some keys
+
+        :param keys: iterable: Keys whose value changed
+        """
+        with self.lock:
+            self.version += 1
+            for key in keys:
+                self.cache.pop(key, None)
+
+
+class WalletSource:
+    """
+    Lookups of the wallet changed by the committer, read between changes
+
+    :param wallet: Wallet: Wallet of the ledger
+    :param lock: RLock: Lock the committer holds while a change runs
+    """
+
+    def __init__(self, wallet, lock):
+        self.wallet = wallet
+        self.lock = lock
+
+    def account(self, public_key):
+        with self.lock:
+            row = self.wallet.by_pbc.get(public_key)
+            if row is None:
+                return None
+            return self.wallet.pve[row], self.wallet.balances[row]
+
+    def accounts(self):
+        # the columns are copied at once, the wallet can change afterwards
+        with self.lock:
+            pbc = list(self.wallet.pbc)
+            pve = list(self.wallet.pve)
+            balances = self.wallet.balances[:]
+        for row in range(len(pbc)):
+            yield pbc[row], (pve[row], balances[row])
+
+    def public_key(self, private_key):
+        with self.lock:
+            row = self.wallet.by_pve.get(private_key)
+            return None if row is None else self.wallet.pbc[row]
+
+    def nft(self, nft_id):
+        with self.lock:
+            nft = self.wallet.nfts.get(nft_id)
+            return None if nft is None else nft.to_dict()
+
+    def owned(self, public_key):
+        with self.lock:
+            return tuple(self.wallet.nfts.owners.get(public_key, ())) or None
+
+
+class LedgerState:
+    """
+    Balances, public keys and NFTs as of the last change the committer
+    published
+
+    Lookups read a source through bounded LRU caches: the wallet, between
+    two changes, or the wallets and nfts tables of an indexed storage. When
+    a change is published, the entries of the addresses and NFTs it changed
+    are evicted, so a lookup never sees a stale entry and the state never
+    holds more than cache_size entries per lookup.
+
+    :param source: WalletSource or SQLiteStore: account, accounts, public_key, nft and owned lookups
+    :param cache_size: int: Entries kept by each lookup
+    :param height: int: Height of the last block
+    """
+
+    __slots__ = ("source", "accounts", "keys", "nfts", "owned", "height")
+
+    def __init__(self, source, cache_size=65536, height=-1):
+        self.source = source
+        self.accounts = CachedLookup(source.account, cache_size, source.accounts)
+        self.keys = CachedLookup(source.public_key, cache_size)
+        self.nfts = CachedLookup(source.nft, cache_size)
+        self.owned = CachedLookup(source.owned, cache_size)
+        self.height = height
+
+    def apply(self, wallet, height) -> "LedgerState":
+        """
+        Evict the entries changed in a wallet since the last change
+
+        :param wallet: Wallet: Wallet the changes were made to
+        :param height: int: Height of the last block
+
+        :return: LedgerState: State at the new height sharing the caches, or this one
+        """
+        registry = wallet.nfts
+        if wallet.changed:
+            self.accounts.evict(wallet.changed)
+            # a new address was looked up as unknown by its private key
+            self.keys.evict(
+                wallet.pve[wallet.by_pbc[pbc]]
+                for pbc in wallet.changed
+                if pbc in wallet.by_pbc
+            )
+        if registry.changed:
+            self.nfts.evict(registry.changed)
+        if registry.changed_owners:
+            self.owned.evict(registry.changed_owners)
+        wallet.changed.clear()
+        registry.changed.clear()
+        registry.changed_owners.clear()
+        if height == self.height:
+            return self
+
+        state = LedgerState.__new__(LedgerState)
+        state.source = self.source
+        state.accounts = self.accounts
+        state.keys = self.keys
+        state.nfts = self.nfts
+        state.owned = self.owned
+        state.height = height
+        return state
+
+    def owned_by(self, public_key, offset=0, limit=None) -> list:
+        """
+        Get the serialized NFTs of a wallet address
+
+        :param public_key: str: Public key of the owner (pbc)
+        :param offset: int: Number of NFTs to skip
+        :param limit: int: Maximum number of NFTs to return, None for all
+
+        :return: list: List of serialized NFTs
+        """
+        ids = self.owned.get(public_key, ())
+        stop = None if limit is None else offset + limit
+        nfts = (self.nfts.get(nft_id) for nft_id in islice(ids, offset, stop))
+        # an NFT removed since its owner was looked up is skipped
+        return [nft for nft in nfts if nft is not None]
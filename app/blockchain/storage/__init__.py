@@ -0,0 +1,4 @@
+from .log import BlockLog
+from .sqlite import SQLiteStore
+
+STORAGES = {"log": BlockLog, "sqlite": SQLiteStore}  # config backend -> storage
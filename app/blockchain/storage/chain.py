@@ -0,0 +1,272 @@
+import threading
+from typing import Union
+from cachetools import LRUCache
+from ..architectures.block import Block
+
+
+class BlockHeader:
+    """
+    Fields of a block kept in memory while its body stays in the storage
+
+    :param height: int: Height of the block
+    :param hash: str: Hash of the block
+    :param previous_hash: str: Hash of the previous block
+    :param merkle_root: str: Merkle root of the transaction hashes
+    :param timestamp: float: Timestamp of the block
+    :param proof: int: Proof of work
+    :param transactions: int: Number of transactions in the block
+    :param genesis: bool: True for the genesis block
+    :param offset: Position of the block in the storage, None until written
+    """
+
+    __slots__ = (
+        "height",
+        "hash",
+        "previous_hash",
+        "merkle_root",
+        "timestamp",
+        "proof",
+        "transactions",
+        "genesis",
+        "offset",
+    )
+
+    def __init__(
+        self,
+        height,
+        hash,
+        previous_hash,
+        merkle_root,
+        timestamp,
+        proof,
+        transactions,
+        genesis=False,
+        offset=None,
+    ):
+        self.height = height
+        self.hash = hash
+        self.previous_hash = previous_hash
+        self.merkle_root = merkle_root
+        self.timestamp = timestamp
+        self.proof = proof
+        self.transactions = transactions
+        self.genesis = genesis
+        self.offset = offset
+
+    @classmethod
+    def from_block(cls, height, block) -> "BlockHeader":
+        return cls(
+            height,
+            block.hash,
+            block.previous_hash,
+            block.merkle_root,
+            block.timestamp,
+            block.proof,
+            len(block.transactions),
+            block.transactions[:1] == ["genisis block"],
+        )
+
+    @classmethod
+    def load(cls, obj, offset=None) -> "BlockHeader":
+        """
+        Build a header from the output of to_dict
+
+        :param obj: dict: Serialized header
+        :param offset: Position of the header in the storage
+
+        :return: BlockHeader: Header
+        """
+        return cls(
+            obj["height"],
+            obj["hash"],
+            obj["previous_hash"],
+            obj.get("merkle_root"),
+            obj["timestamp"],
+            obj["proof"],
+            obj["transactions"],
+            obj.get("genesis", False),
+            offset,
+        )
+
+    @classmethod
+    def from_dict(cls, height, obj, offset=None) -> "BlockHeader":
+        return cls(
+            height,
+            obj["hash"],
+            obj["previous_hash"],
+            obj.get("merkle_root"),
+            obj["timestamp"],
+            obj["proof"],
+            len(obj["transactions"]),
+            obj["transactions"][:1] == ["genisis block"],
+            offset,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "height": self.height,
+            "hash": self.hash,
+            "previous_hash": self.previous_hash,
+            "merkle_root": self.merkle_root,
+            "timestamp": self.timestamp,
+            "proof": self.proof,
+            "transactions": self.transactions,
+            "genesis": self.genesis,
+        }
+
+
+class ChainStore:
+    """
+    Chain of blocks that keeps only the headers in memory
+
+    Blocks not written to the storage yet stay in memory, written blocks
+    are read back from the storage on demand and kept in an LRU cache.
+    Without a storage every block stays in memory. The bodies of the
+    first `pruned` blocks were dropped from the storage, only their
+    headers are left.
+
+    :param storage: BlockLog: Storage the blocks are read from
+    :param cache_size: int: Maximum number of written blocks kept in memory
+    """
+
+    def __init__(self, storage=None, cache_size=1024):
+        self.storage = storage
+        self.headers = []
+        # block hash -> height, empty when the storage looks up hashes itself
+        self.heights = {}
+        self.indexed = getattr(storage, "indexed", False)
+        self.unsynced = {}  # height -> block, not written to the storage yet
+        self.pruned = 0  # blocks below this height have no body
+        self.cache = LRUCache(maxsize=max(cache_size, 1))
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.headers)
+
+    def __iter__(self):
+        for height in range(len(self.headers)):
+            yield self[height]
+
+    def __getitem__(self, height):
+        if isinstance(height, slice):
+            return [self[i] for i in range(*height.indices(len(self.headers)))]
+        if height < 0:
+            height += len(self.headers)
+        if not 0 <= height < len(self.headers):
+            raise IndexError("block height out of range")
+        if height < self.pruned:
+            raise IndexError(f"block {height} was pruned, only its header is kept")
+
+        with self._lock:
+            block = self.unsynced.get(height)
+            if block is None:
+                block = self.cache.get(height)
+            if block is None:
+                record = self.storage.read(self.headers[height].offset)
+                if record.get("block", {}).get("hash") != self.headers[height].hash:
+                    # the storage was compacted by another process
+                    raise LookupError(f"block {height} moved in the storage")
+                block = Block(0)
+                block.from_dict(record["block"])
+                self.cache[height] = block
+            return block
+
+    def header(self, height) -> BlockHeader:
+        return self.headers[height]
+
+    def height(self, hash) -> Union[int, None]:
+        """
+        Get the height of a block by its hash
+
+        :param hash: str: Hash of the block
+
+        :return: int: Height of the first block with this hash, None if it is unknown
+        """
+        if not self.indexed:
+            return self.heights.get(hash)
+        height = self.storage.block_height(hash)
+        # the storage can be ahead of the headers of this process
+        if height is not None and height < len(self.headers):
+            return height
+        # blocks not written yet
+        for height, block in sorted(self.unsynced.items()):
+            if block.hash == hash:
+                return height
+        return None
+
+    def append(self, block) -> int:
+        """
+        Add a block that is not written to the storage yet
+
+        :param block: Block: Block to add
+
+        :return: int: Height of the block
+        """
+        height = len(self.headers)
+        with self._lock:
+            self.headers.append(BlockHeader.from_block(height, block))
+            if not self.indexed:
+                self.heights.setdefault(block.hash, height)
+            self.unsynced[height] = block
+        return height
+
+    def append_written(self, obj, offset, block=None) -> int:
+        """
+        Add a block that is already in the storage
+
+        :param obj: dict: Serialized block
+        :param offset: Position of the block in the storage
+        :param block: Block: Deserialized block to cache, if there is one
+
+        :return: int: Height of the block
+        """
+        height = len(self.headers)
+        with self._lock:
+            self.headers.append(BlockHeader.from_dict(height, obj, offset))
+            if not self.indexed:
+                self.heights.setdefault(obj["hash"], height)
+            if block is not None:
+                self.cache[height] = block
+        return height
+
+    def append_header(self, obj, offset) -> int:
+        """
+        Add a block whose body was pruned from the storage
+
+        :param obj: dict: Serialized header
+        :param offset: Position of the header in the storage
+
+        :return: int: Height of the block
+        """
+        height = len(self.headers)
+        with self._lock:
+            self.headers.append(BlockHeader.load(obj, offset))
+            if not self.indexed:
+                self.heights.setdefault(obj["hash"], height)
+            self.pruned = height + 1
+        return height
+
+    def prune(self, height) -> None:
+        """
+        Forget the bodies of the blocks below a height
+
+        :param height: int: Height of the first block that keeps its body
+        """
+        with self._lock:
+            for pruned in range(self.pruned, height):
+                self.cache.pop(pruned, None)
+                self.unsynced.pop(pruned, None)
+            self.pruned = max(self.pruned, height)
+
+    def written(self, height, offset) -> None:
+        """
+        Record where a block was written, it can then be evicted from memory
+
+        :param height: int: Height of the block
+        :param offset: Position of the block in the storage
+        """
+        with self._lock:
+            self.headers[height].offset = offset
+            block = self.unsynced.pop(height, None)
+            if block is not None:
+                self.cache[height] = block
@@ -0,0 +1,242 @@
+import json
+import os
+from typing import Union
+from ..encoding import encode
+
+# first bytes of the snapshot records written so far: canonical with and
+# without the hash of the tip, and the older insertion-ordered encoding
+SNAPSHOT_PREFIXES = (b'{"hash":', b'{"height":', b'{"type": "snapshot"')
+
+
+class BlockLog:
+    """
+    Append-only storage for the blockchain, one JSON record per line
+
+    Every record is a dict with a "type" key:
+    "block" records hold a serialized block with the changes it applied,
+    "wallet" and "credit" records hold wallet changes made outside of blocks,
+    "snapshot" records hold the full wallet produced by all records before it,
+    "header" records hold the header of a block whose body was pruned.
+
+    :param path: str: Path to the log file
+    """
+
+    indexed = False  # the chain keeps its own index of the log
+
+    def __init__(self, path):
+        self.path = path
+        self.checkpoint_path = path + ".checkpoint"
+        self.written = {}  # records written per type
+        self.bytes_written = 0
+        self.torn = None  # offset of an incomplete last line found by replay
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def size(self) -> int:
+        return os.path.getsize(self.path) if self.exists() else 0
+
+    def _write(self, file, records) -> list:
+        offsets = []
+        start = file.tell()
+        for record in records:
+            offsets.append(file.tell())
+            file.write(encode(record) + b"\n")
+            self.written[record["type"]] = self.written.get(record["type"], 0) + 1
+        file.flush()
+        os.fsync(file.fileno())
+        self.bytes_written += file.tell() - start
+        return offsets
+
+    def append(self, records) -> list:
+        """
+        Append records to the end of the log
+
+        :param records: list: Records to append
+
+        :return: list: Byte offset of each record in the log
+        """
+        with open(self.path, "ab") as file:
+            if self.torn is not None:
+                # drop the record a crash left half written
+                file.truncate(self.torn)
+                file.seek(self.torn)
+                self.torn = None
+            return self._write(file, records)
+
+    def read(self, offset) -> dict:
+        """
+        Read a single record
+
+        :param offset: int: Byte offset of the record in the log
+
+        :return: dict: Record
+        """
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            return json.loads(file.readline())
+
+    @staticmethod
+    def read_many(path, offsets) -> list:
+        """
+        Read records without opening the storage, from another process
+
+        :param path: str: Path to the log file
+        :param offsets: list: Byte offsets of the records, in increasing order
+
+        :return: list: Records
+        """
+        records = []
+        with open(path, "rb") as file:
+            for offset in offsets:
+                file.seek(offset)
+                records.append(json.loads(file.readline()))
+        return records
+
+    def replay(self, latest=False):
+        """
+        Read the log from the beginning
+
+        A last line without a newline was cut by a crash during an append,
+        it is skipped and overwritten by the next append.
+
+        :param latest: bool: Do not decode the snapshots before the last one, they are read as {"type": "snapshot", "wallet": None}
+
+        :return: generator: (byte offset, record) in the order they were written
+        """
+        self.written = {}
+        self.torn = None
+        last = self._last_snapshot() if latest else None
+        offset = 0
+        with open(self.path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    self.torn = offset
+                    return
+                if (
+                    last is not None
+                    and offset < last
+                    and line.startswith(SNAPSHOT_PREFIXES)
+                ):
+                    record = {"type": "snapshot", "wallet": None}
+                    self.written["snapshot"] = self.written.get("snapshot", 0) + 1
+                    yield offset, record
+                elif line.strip():
+                    record = json.loads(line)
+                    self.written[record["type"]] = (
+                        self.written.get(record["type"], 0) + 1
+                    )
+                    yield offset, record
+                offset += len(line)
+
+    def _last_snapshot(self) -> Union[int, None]:
+        # byte offset of the last snapshot, found without decoding the records
+        last = None
+        offset = 0
+        with open(self.path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                if line.startswith(SNAPSHOT_PREFIXES):
+                    last = offset
+                offset += len(line)
+        return last
+
+    def records(self, offset=None):
+        """
+        Read the records written after a given one
+
+        The log is opened before returning, a later compaction does not
+        change what is read.
+
+        :param offset: int: Byte offset of the record to start after, None for the beginning
+
+        :return: generator: (byte offset, record) in the order they were written
+        """
+        file = open(self.path, "rb")
+        if offset is not None:
+            file.seek(offset)
+            file.readline()
+        return self._read_records(file)
+
+    def _read_records(self, file):
+        with file:
+            offset = file.tell()
+            for line in file:
+                # a line without a newline is still being appended
+                if not line.endswith(b"\n"):
+                    return
+                if line.strip():
+                    yield offset, json.loads(line)
+                offset += len(line)
+
+    def compact(self, records) -> None:
+        """
+        Rewrite the log with only the given records
+
+        The new log is written next to the old one and swapped in atomically,
+        so a crash during compaction leaves the previous log intact.
+
+        :param records: iterable: Records describing the current state
+
+        :return: list: Byte offset of each record in the new log
+        """
+        tmp = self.path + ".tmp"
+        self.written = {}
+        self.torn = None
+        with open(tmp, "wb") as file:
+            offsets = self._write(file, records)
+        os.replace(tmp, self.path)
+        return offsets
+
+    def drop_snapshots(self) -> dict:
+        """
+        Rewrite the log without the snapshots before the last one
+
+        The other records are copied without being decoded. The new log is
+        swapped in atomically like a compaction.
+
+        :return: dict: Byte offset of each kept record -> its byte offset in the new log
+        """
+        last = self._last_snapshot()
+        moved = {}
+        tmp = self.path + ".tmp"
+        with open(self.path, "rb") as source, open(tmp, "wb") as file:
+            offset = 0
+            for line in source:
+                # a torn last line is dropped
+                if not line.endswith(b"\n"):
+                    break
+                if offset == last or not line.startswith(SNAPSHOT_PREFIXES):
+                    moved[offset] = file.tell()
+                    file.write(line)
+                offset += len(line)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.path)
+        self.torn = None
+        self.written["snapshot"] = 0 if last is None else 1
+        return moved
+
+    def read_checkpoint(self) -> Union[dict, None]:
+        """
+        Read the last validated block
+
+        :return: dict: Height and hash of the block, or None if there is no checkpoint
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, "r") as file:
+            return json.load(file)
+
+    def write_checkpoint(self, height, hash) -> None:
+        """
+        Remember that the chain is valid up to a block
+
+        :param height: int: Height of the block
+        :param hash: str: Hash of the block
+        """
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "w") as file:
+            json.dump({"height": height, "hash": hash}, file)
+        os.replace(tmp, self.checkpoint_path)
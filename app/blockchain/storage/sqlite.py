@@ -0,0 +1,687 @@
+import json
+import sqlite3
+import threading
+from decimal import Decimal
+from typing import Union
+from ..architectures.nft import NFT
+from ..encoding import encode
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_type ON records (type, id);
+CREATE TABLE IF NOT EXISTS blocks (
+    height INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    previous_hash TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    proof INTEGER NOT NULL,
+    record INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_hash ON blocks (hash);
+CREATE TABLE IF NOT EXISTS transactions (
+    hash TEXT PRIMARY KEY,
+    height INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    sender TEXT,
+    receiver TEXT,
+    rejected INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS transactions_height ON transactions (height);
+CREATE INDEX IF NOT EXISTS transactions_sent ON transactions (sender, height, position);
+CREATE INDEX IF NOT EXISTS transactions_received
+    ON transactions (receiver, height, position);
+CREATE TABLE IF NOT EXISTS wallets (
+    pbc TEXT PRIMARY KEY,
+    pve TEXT NOT NULL UNIQUE,
+    balance REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nfts (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    name TEXT,
+    description TEXT,
+    url TEXT,
+    timestamp REAL
+);
+CREATE INDEX IF NOT EXISTS nfts_owner ON nfts (owner);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# tables built from the records, dropped and built again when VERSION changes
+INDEXES = """
+DROP TABLE IF EXISTS blocks;
+DROP TABLE IF EXISTS transactions;
+DROP TABLE IF EXISTS keys;
+DROP TABLE IF EXISTS wallets;
+DROP TABLE IF EXISTS nfts;
+"""
+VERSION = 3
+
+REPLAY_BATCH = 1000  # records read per query while replaying
+
+
+class SQLiteStore:
+    """
+    SQLite storage for the blockchain, a drop-in replacement for BlockLog
+
+    The records of BlockLog are kept in order in the records table, the id
+    of a record is its offset. Every append also updates indexed tables of
+    blocks and transactions in the same transaction. Block hashes,
+    transaction positions and the history of an address are looked up in
+    these tables instead of in memory, so the chain does not keep an index
+    of every transaction. The wallets and nfts tables follow the balances
+    and NFTs of the wallet, so they can be read without the wallet in
+    memory.
+
+    :param path: str: Path to the database file
+    """
+
+    indexed = True  # block hashes and transactions can be looked up
+
+    def __init__(self, path):
+        self.path = path
+        self.written = {}  # records written per type
+        self.bytes_written = 0
+        self._lock = threading.RLock()
+        self._local = threading.local()  # read connection of each thread
+        # senders written before their wallet address, resolved by the next snapshot
+        self._unresolved = False
+        # the wallets table missed changes, the next snapshot replaces it
+        self._stale = False
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+        self._stale = (
+            self.connection.execute("SELECT 1 FROM meta WHERE key = 'stale'").fetchone()
+            is not None
+        )
+
+    def _migrate(self) -> None:
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'version'"
+        ).fetchone()
+        if row is not None and int(row[0]) == VERSION:
+            return
+        # the indexed tables of an older version are built again from the records
+        self.connection.executescript(INDEXES + SCHEMA)
+        with self.connection:
+            self.connection.execute("DELETE FROM meta WHERE key = 'stale'")
+            last = 0
+            while True:
+                rows = self.connection.execute(
+                    "SELECT id, body FROM records WHERE id > ? ORDER BY id LIMIT ?",
+                    (last, REPLAY_BATCH),
+                ).fetchall()
+                if not rows:
+                    break
+                for offset, body in rows:
+                    self._index(json.loads(body), offset)
+                last = rows[-1][0]
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(VERSION),)
+            )
+
+    def _reader(self) -> sqlite3.Connection:
+        # lookups read the last committed append through a connection of
+        # their own thread, they do not wait for a write in progress
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._local.connection = connection
+        return connection
+
+    def exists(self) -> bool:
+        with self._lock:
+            return (
+                self.connection.execute("SELECT 1 FROM records LIMIT 1").fetchone()
+                is not None
+            )
+
+    def size(self) -> int:
+        # pages in use, the pages freed by a compaction are reused
+        with self._lock:
+            (pages,) = self.connection.execute("PRAGMA page_count").fetchone()
+            (free,) = self.connection.execute("PRAGMA freelist_count").fetchone()
+            (page_size,) = self.connection.execute("PRAGMA page_size").fetchone()
+        return (pages - free) * page_size
+
+    def _write(self, records, apply=True) -> list:
+        # apply is False when the records describe the state the wallets
+        # and nfts tables already have
+        offsets = []
+        for record in records:
+            body = encode(record)
+            cursor = self.connection.execute(
+                "INSERT INTO records (type, body) VALUES (?, ?)",
+                (record["type"], body),
+            )
+            offsets.append(cursor.lastrowid)
+            self._index(record, cursor.lastrowid, apply)
+            self.written[record["type"]] = self.written.get(record["type"], 0) + 1
+            self.bytes_written += len(body)
+        return offsets
+
+    def _index(self, record, offset, apply=True) -> None:
+        if record["type"] == "block":
+            self._index_block(record["block"], offset, apply)
+        elif record["type"] == "header":
+            if apply:
+                # the changes of a pruned block are not recorded
+                self._set_stale(True)
+            header = record["header"]
+            self.connection.execute(
+                "INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    header["height"],
+                    header["hash"],
+                    header["previous_hash"],
+                    header["timestamp"],
+                    header["proof"],
+                    offset,
+                ),
+            )
+        elif record["type"] == "wallet":
+            self._add_wallet(record["wallet"])
+            if self._unresolved:
+                # blocks are written before the wallet changes synced with them
+                address = record["wallet"]["address"]
+                self.connection.execute(
+                    "UPDATE transactions SET sender = ? WHERE sender = ?",
+                    (address["pbc"], address["pve"]),
+                )
+        elif record["type"] == "credit":
+            self._credit(record["credit"]["pbc"], record["credit"]["amount"])
+        elif record["type"] == "snapshot":
+            empty = (
+                self.connection.execute("SELECT 1 FROM wallets LIMIT 1").fetchone()
+                is None
+            )
+            if self._stale or empty:
+                self.connection.execute("DELETE FROM wallets")
+                self.connection.execute("DELETE FROM nfts")
+                for address in record["wallet"]:
+                    self._add_wallet(address)
+                self._set_stale(False)
+            if self._unresolved:
+                self.connection.execute(
+                    "UPDATE transactions SET sender ="
+                    " (SELECT pbc FROM wallets WHERE wallets.pve = transactions.sender)"
+                    " WHERE sender IN (SELECT pve FROM wallets)"
+                )
+                self._unresolved = False
+
+    def _index_block(self, block, offset, apply=True) -> None:
+        (height,) = self.connection.execute(
+            "SELECT COALESCE(MAX(height) + 1, 0) FROM blocks"
+        ).fetchone()
+        self.connection.execute(
+            "INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                height,
+                block["hash"],
+                block["previous_hash"],
+                block["timestamp"],
+                block["proof"],
+                offset,
+            ),
+        )
+
+        rejected = set(block.get("deltas", {}).get("rejected", []))
+        for position, transaction in enumerate(block["transactions"]):
+            if type(transaction) == str:
+                continue
+            data = transaction["input"].get("data", {})
+            sender = data.get("from")
+            receiver = data.get("to", data.get("owner"))
+            if not isinstance(sender, str):
+                sender = None
+            else:
+                # transfers are signed with the private key, the table keeps
+                # the public key once the wallet address is known
+                row = self.connection.execute(
+                    "SELECT pbc FROM wallets WHERE pve = ?", (sender,)
+                ).fetchone()
+                if row is not None:
+                    sender = row[0]
+                else:
+                    self._unresolved = True
+            self.connection.execute(
+                "INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    transaction["hash"],
+                    height,
+                    position,
+                    transaction["input"].get("type", ""),
+                    sender,
+                    receiver if isinstance(receiver, str) else None,
+                    position in rejected,
+                ),
+            )
+        if not apply:
+            return
+
+        # same order as Block.apply
+        for public_key, amount in block.get("deltas", {}).get("balances", []):
+            self._credit(public_key, amount)
+        for nft in block.get("nft") or []:
+            self._add_nft(nft)
+        for move in block.get("deltas", {}).get("nfts", []):
+            # replaced rather than updated, the NFTs of an owner are listed
+            # in the order they were received
+            self.connection.execute(
+                "INSERT OR REPLACE INTO nfts SELECT id, ?, name, description, url,"
+                " timestamp FROM nfts WHERE id = ?",
+                (move["to"], move["id"]),
+            )
+
+    def _add_wallet(self, address) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO wallets VALUES (?, ?, ?)",
+            (
+                address["address"]["pbc"],
+                address["address"]["pve"],
+                float(address["info"]["balance"]),
+            ),
+        )
+        for nft in address["info"].get("nfts", []):
+            self._add_nft(nft)
+
+    def _add_nft(self, nft) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO nfts VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                nft["id"],
+                nft["owner"],
+                nft["name"],
+                nft["description"],
+                nft["url"],
+                nft["timestamp"],
+            ),
+        )
+
+    def _credit(self, public_key, amount) -> None:
+        # same arithmetic as Wallet.credit_wallet, the table matches the
+        # wallet kept in memory
+        row = self.connection.execute(
+            "SELECT balance FROM wallets WHERE pbc = ?", (public_key,)
+        ).fetchone()
+        if row is None:
+            # the address was folded into a snapshot written later
+            self._set_stale(True)
+            return
+        self.connection.execute(
+            "UPDATE wallets SET balance = ? WHERE pbc = ?",
+            (float(Decimal(row[0]) + Decimal(amount)), public_key),
+        )
+
+    def _set_stale(self, stale) -> None:
+        if stale == self._stale:
+            return
+        if stale:
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('stale', '1')")
+        else:
+            self.connection.execute("DELETE FROM meta WHERE key = 'stale'")
+        self._stale = stale
+
+    def append(self, records) -> list:
+        """
+        Append records in a single transaction
+
+        :param records: list: Records to append
+
+        :return: list: Offset of each record
+        """
+        with self._lock, self.connection:
+            return self._write(records)
+
+    def read(self, offset) -> dict:
+        """
+        Read a single record
+
+        :param offset: int: Offset of the record
+
+        :return: dict: Record
+        """
+        with self._lock:
+            (body,) = self.connection.execute(
+                "SELECT body FROM records WHERE id = ?", (offset,)
+            ).fetchone()
+        return json.loads(body)
+
+    @staticmethod
+    def read_many(path, offsets) -> list:
+        """
+        Read records without opening the storage, from another process
+
+        :param path: str: Path to the database file
+        :param offsets: list: Offsets of the records, in increasing order
+
+        :return: list: Records
+        """
+        if not offsets:
+            return []
+        connection = sqlite3.connect(path)
+        try:
+            # the blocks between the first and the last record, the wallet
+            # changes and snapshots in between are not read
+            bodies = dict(
+                connection.execute(
+                    "SELECT id, body FROM records WHERE type IN ('block', 'header')"
+                    " AND id BETWEEN ? AND ?",
+                    (offsets[0], offsets[-1]),
+                ).fetchall()
+            )
+        finally:
+            connection.close()
+        return [json.loads(bodies[offset]) for offset in offsets]
+
+    def replay(self, latest=False):
+        """
+        Read the records from the beginning
+
+        :param latest: bool: Do not decode the snapshots before the last one, they are read as {"type": "snapshot", "wallet": None}
+
+        :return: generator: (offset, record) in the order they were written
+        """
+        self.written = {}
+        snapshot = 0
+        if latest:
+            with self._lock:
+                (snapshot,) = self.connection.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM records WHERE type = 'snapshot'"
+                ).fetchone()
+        last = 0
+        while True:
+            with self._lock:
+                rows = self.connection.execute(
+                    "SELECT id, CASE WHEN type = 'snapshot' AND id < ? THEN NULL"
+                    " ELSE body END FROM records WHERE id > ? ORDER BY id LIMIT ?",
+                    (snapshot, last, REPLAY_BATCH),
+                ).fetchall()
+            if not rows:
+                return
+            for offset, body in rows:
+                if body is None:
+                    record = {"type": "snapshot", "wallet": None}
+                else:
+                    record = json.loads(body)
+                self.written[record["type"]] = self.written.get(record["type"], 0) + 1
+                yield offset, record
+            last = rows[-1][0]
+
+    def records(self, offset=None):
+        """
+        Read the records written after a given one
+
+        The records are read from a separate connection in a read
+        transaction, a later append or compaction does not change what is
+        read.
+
+        :param offset: int: Offset of the record to start after, None for the beginning
+
+        :return: generator: (offset, record) in the order they were written
+        """
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("BEGIN")
+        rows = connection.execute(
+            "SELECT id, body FROM records WHERE id > ? ORDER BY id LIMIT ?",
+            (offset or 0, REPLAY_BATCH),
+        ).fetchall()
+        return self._read_records(connection, rows)
+
+    def _read_records(self, connection, rows):
+        try:
+            while rows:
+                for offset, body in rows:
+                    yield offset, json.loads(body)
+                rows = connection.execute(
+                    "SELECT id, body FROM records WHERE id > ? ORDER BY id LIMIT ?",
+                    (rows[-1][0], REPLAY_BATCH),
+                ).fetchall()
+        finally:
+            connection.close()
+
+    def compact(self, records) -> list:
+        """
+        Replace every record with the given records in a single transaction
+
+        :param records: iterable: Records describing the current state
+
+        :return: list: Offset of each record
+        """
+        with self._lock, self.connection:
+            # the given records may be read back from the old records while
+            # they are written, so the old records are deleted last, the
+            # wallets and nfts tables already hold the state they describe
+            (last,) = self.connection.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM records"
+            ).fetchone()
+            for table in ("blocks", "transactions"):
+                self.connection.execute(f"DELETE FROM {table}")
+            self.written = {}
+            offsets = self._write(records, apply=False)
+            self.connection.execute("DELETE FROM records WHERE id <= ?", (last,))
+            return offsets
+
+    def drop_snapshots(self) -> dict:
+        """
+        Delete the snapshots before the last one
+
+        :return: dict: Offsets that changed, always empty: the other records keep their id
+        """
+        with self._lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM records WHERE type = 'snapshot' AND id <"
+                " (SELECT MAX(id) FROM records WHERE type = 'snapshot')"
+            )
+            (count,) = self.connection.execute(
+                "SELECT COUNT(*) FROM records WHERE type = 'snapshot'"
+            ).fetchone()
+        self.written["snapshot"] = count
+        return {}
+
+    def read_checkpoint(self) -> Union[dict, None]:
+        """
+        Read the last validated block
+
+        :return: dict: Height and hash of the block, or None if there is no checkpoint
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = 'checkpoint'"
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def write_checkpoint(self, height, hash) -> None:
+        """
+        Remember that the chain is valid up to a block
+
+        :param height: int: Height of the block
+        :param hash: str: Hash of the block
+        """
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('checkpoint', ?)",
+                (json.dumps({"height": height, "hash": hash}),),
+            )
+
+    def block_height(self, hash) -> Union[int, None]:
+        """
+        Get the height of a block by its hash
+
+        :param hash: str: Hash of the block
+
+        :return: int: Height of the first block with this hash, or None if it is unknown
+        """
+        row = (
+            self._reader()
+            .execute(
+                "SELECT height FROM blocks WHERE hash = ? ORDER BY height LIMIT 1",
+                (hash,),
+            )
+            .fetchone()
+        )
+        return row[0] if row is not None else None
+
+    def transaction(self, hash) -> Union[tuple, None]:
+        """
+        Get the position of a transaction by its hash
+
+        :param hash: str: Hash of the transaction
+
+        :return: tuple: Height of the block, index in the block and True if the block rejected it, or None
+        """
+        row = (
+            self._reader()
+            .execute(
+                "SELECT height, position, rejected FROM transactions WHERE hash = ?",
+                (hash,),
+            )
+            .fetchone()
+        )
+        return None if row is None else (row[0], row[1], bool(row[2]))
+
+    def transactions_of(self, keys, before, limit=50) -> list:
+        """
+        Get the transactions sent or received by a wallet address
+
+        :param keys: list: Public keys (pbc) of wallet addresses
+        :param before: tuple: Only transactions older than this (height, index)
+        :param limit: int: Maximum number of transactions to return
+
+        :return: list: (height, index in the block), newest first
+        """
+        # every key and column is read backwards on its own index, the
+        # merged pages are cut to the limit
+        select = (
+            "SELECT * FROM (SELECT height, position FROM transactions"
+            " WHERE {} = ? AND (height < ? OR (height = ? AND position < ?))"
+            " ORDER BY height DESC, position DESC LIMIT ?)"
+        )
+        parts = []
+        parameters = []
+        for column in ("sender", "receiver"):
+            for key in keys:
+                parts.append(select.format(column))
+                parameters += [key, before[0], before[0], before[1], limit]
+        query = " UNION ".join(parts) + " ORDER BY height DESC, position DESC LIMIT ?"
+        return [
+            tuple(row)
+            for row in self._reader().execute(query, parameters + [limit]).fetchall()
+        ]
+
+    def account(self, public_key) -> Union[tuple, None]:
+        """
+        Get a wallet address by its public key
+
+        :param public_key: str: Public key of the wallet (pbc)
+
+        :return: tuple: Private key (pve) and balance, or None if it is unknown
+        """
+        row = (
+            self._reader()
+            .execute("SELECT pve, balance FROM wallets WHERE pbc = ?", (public_key,))
+            .fetchone()
+        )
+        return None if row is None else tuple(row)
+
+    def accounts(self):
+        """
+        Read every wallet address
+
+        The addresses are read from a separate connection in a read
+        transaction, like records().
+
+        :return: generator: (public key, (private key, balance))
+        """
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            connection.execute("BEGIN")
+            for pbc, pve, balance in connection.execute(
+                "SELECT pbc, pve, balance FROM wallets ORDER BY rowid"
+            ):
+                yield pbc, (pve, balance)
+        finally:
+            connection.close()
+
+    def public_key(self, private_key) -> Union[str, None]:
+        """
+        Get the public key of a wallet address
+
+        :param private_key: str: Private key of the wallet (pve)
+
+        :return: str: Public key (pbc), or None if it is unknown
+        """
+        row = (
+            self._reader()
+            .execute("SELECT pbc FROM wallets WHERE pve = ?", (private_key,))
+            .fetchone()
+        )
+        return row[0] if row is not None else None
+
+    def nft(self, nft_id) -> Union[dict, None]:
+        """
+        Get an NFT by its ID
+
+        :param nft_id: str: ID of the NFT
+
+        :return: dict: Serialized NFT, or None if it is unknown
+        """
+        row = (
+            self._reader()
+            .execute(
+                "SELECT id, owner, name, description, url, timestamp FROM nfts"
+                " WHERE id = ?",
+                (nft_id,),
+            )
+            .fetchone()
+        )
+        return None if row is None else self._nft(row)
+
+    def owned(self, public_key) -> Union[tuple, None]:
+        """
+        Get the IDs of the NFTs of a wallet address
+
+        :param public_key: str: Public key of the owner (pbc)
+
+        :return: tuple: IDs in the order the NFTs were received, None if it has none
+        """
+        rows = (
+            self._reader()
+            .execute(
+                "SELECT id FROM nfts WHERE owner = ? ORDER BY rowid", (public_key,)
+            )
+            .fetchall()
+        )
+        return tuple(nft for (nft,) in rows) or None
+
+    def _nft(self, row) -> dict:
+        # built again by NFT, the hash covers the fields as NFT formats them
+        return (
+            NFT(None, None, None, None, None)
+            .from_dict(
+                {
+                    "id": row[0],
+                    "owner": row[1],
+                    "name": row[2],
+                    "description": row[3],
+                    "url": row[4],
+                    "timestamp": row[5],
+                }
+            )
+            .to_dict()
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,174 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from .architectures.block import Block, block_hash
+from .merkle import merkle_root
+from .miner import valid_proof
+
+CHUNK_SIZE = 1000  # blocks hashed by a worker process per task
+
+
+def _is_genesis(block) -> bool:
+    return block.transactions[0] == "genisis block"
+
+
+def valid_block(block) -> bool:
+    """
+    Check the hashes of the transactions, the Merkle root and the hash of a block
+
+    :param block: Block: Block to check
+
+    :return: bool: True if the block is valid
+    """
+    if _is_genesis(block):
+        return True
+    for transaction in block.transactions:
+        if type(transaction) != str and transaction.get_hash() != transaction.hash:
+            return False
+    if block.merkle_root is not None and block.merkle_root != merkle_root(
+        block.transaction_hashes()
+    ):
+        return False
+    return block.get_hash() == block.hash
+
+
+def valid_header(header, previous, difficulty) -> bool:
+    """
+    Check a block header against the header before it, without the body
+
+    :param header: BlockHeader: Header to check
+    :param previous: BlockHeader: Header of the previous block, None for the genesis block
+    :param difficulty: int: Difficulty of the proof of work
+
+    :return: bool: True if the header is valid
+    """
+    if previous is None:
+        return header.height == 0 and header.genesis
+    if header.height != previous.height + 1 or header.genesis:
+        return False
+    if header.previous_hash != previous.hash:
+        return False
+    if not valid_proof(previous.proof, header.proof, difficulty):
+        return False
+    # blocks stored before the Merkle root was added are checked with their body
+    return header.merkle_root is None or header.hash == block_hash(
+        header.timestamp, header.merkle_root, header.previous_hash
+    )
+
+
+def check_hashes(records) -> int:
+    """
+    Rehash serialized blocks
+
+    :param records: list: Serialized blocks
+
+    :return: int: Position of the first block with a wrong hash, -1 if all are valid
+    """
+    for i, record in enumerate(records):
+        block = Block(0)
+        block.from_dict(record)
+        if not valid_block(block):
+            return i
+    return -1
+
+
+def validate_chain(chain, start=0, workers=1) -> bool:
+    """
+    Validate the hashes and links of a chain from a given height
+
+    Hashes are checked in chunks by a process pool when there is more than
+    one chunk to check, the links between blocks are checked afterwards on
+    the headers only.
+
+    :param chain: ChainStore: Blocks of the chain
+    :param start: int: Height of the first block to validate
+    :param workers: int: Number of worker processes, 0 for one per CPU core
+
+    :return: bool: True if the chain is valid, False if not
+    """
+    # pruned blocks are checked from their headers, their transactions
+    # are gone
+    for height in range(start, min(chain.pruned, len(chain))):
+        header = chain.header(height)
+        if header.genesis or header.merkle_root is None:
+            continue
+        expected = block_hash(
+            header.timestamp, header.merkle_root, header.previous_hash
+        )
+        if expected != header.hash:
+            return False
+    start = max(start, chain.pruned)
+
+    workers = workers if workers else os.cpu_count() or 1
+    if workers > 1 and len(chain) - start > CHUNK_SIZE:
+        if not _check_parallel(chain, start, workers):
+            return False
+    else:
+        for height in range(start, len(chain)):
+            if not valid_block(chain[height]):
+                return False
+
+    for height in range(max(start, 1), len(chain)):
+        header = chain.header(height)
+        if not header.genesis and header.previous_hash != chain.header(height - 1).hash:
+            return False
+    return True
+
+
+def check_stored(storage, path, offsets, hashes) -> int:
+    """
+    Read blocks from a storage and rehash them
+
+    :param storage: type: Class of the storage, BlockLog or SQLiteStore
+    :param path: str: Path of the storage
+    :param offsets: list: Offsets of the blocks in the storage
+    :param hashes: list: Hashes the blocks should have
+
+    :return: int: Position of the first block with a wrong hash, -1 if all are valid
+    """
+    records = storage.read_many(path, offsets)
+    for i, (record, hash) in enumerate(zip(records, hashes)):
+        if record.get("block", {}).get("hash") != hash:
+            return i
+    return check_hashes([record["block"] for record in records])
+
+
+def _check_parallel(chain, start, workers) -> bool:
+    # blocks written to the storage are read and parsed by the workers, only
+    # blocks not written yet are serialized here, at most two chunks per
+    # worker are submitted ahead of the pool
+    storage = chain.storage
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for i in range(start, len(chain), CHUNK_SIZE):
+            heights = range(i, min(i + CHUNK_SIZE, len(chain)))
+            headers = [chain.header(height) for height in heights]
+            if storage is not None and all(h.offset is not None for h in headers):
+                future = pool.submit(
+                    check_stored,
+                    type(storage),
+                    storage.path,
+                    [header.offset for header in headers],
+                    [header.hash for header in headers],
+                )
+            else:
+                future = pool.submit(
+                    check_hashes, [chain[height].to_dict() for height in heights]
+                )
+            futures[future] = heights
+            if len(futures) >= workers * 2:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if not _checked(chain, futures.pop(future), future.result()):
+                        return False
+        return all(
+            _checked(chain, heights, future.result())
+            for future, heights in futures.items()
+        )
+
+
+def _checked(chain, heights, failed) -> bool:
+    # a block a worker found invalid is checked again here with the rest of
+    # its chunk, another process may have compacted the storage
+    if failed == -1:
+        return True
+    return all(valid_block(chain[height]) for height in heights[failed:])
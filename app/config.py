@@ -10,18 +10,69 @@ class ConfigWeb:
     host: str
     port: int
     key: str = "secret"
+    workers: int = 1
+    writer_socket: str = "writer.sock"
 
     def get_config(self):
         return {
             "host": self.host,
             "port": self.port,
             "key": self.key,
+            "workers": self.workers,
+            "writer_socket": self.writer_socket,
+        }
+
+
+@dataclass
+class ConfigBlockchain:
+    storage: str = "blockchain.log"
+    backend: str = "log"
+    snapshot_interval: int = 1000
+    compact_ratio: float = 2.0
+    prune: bool = False
+    keep_blocks: int = 1000
+    archive: str = ""
+    difficulty: int = 4
+    mining_workers: int = 0
+    validation_workers: int = 0
+    minimum_transactions: int = 1
+    max_transactions: int = 1000
+    max_bytes: int = 1048576
+    max_wait: float = 1.0
+    block_cache_size: int = 1024
+    state_cache_size: int = 65536
+    leader: str = ""
+    replication_batch: int = 500
+    replication_interval: float = 1.0
+
+    def get_config(self):
+        return {
+            "storage": self.storage,
+            "backend": self.backend,
+            "snapshot_interval": self.snapshot_interval,
+            "compact_ratio": self.compact_ratio,
+            "prune": self.prune,
+            "keep_blocks": self.keep_blocks,
+            "archive": self.archive,
+            "difficulty": self.difficulty,
+            "mining_workers": self.mining_workers,
+            "validation_workers": self.validation_workers,
+            "minimum_transactions": self.minimum_transactions,
+            "max_transactions": self.max_transactions,
+            "max_bytes": self.max_bytes,
+            "max_wait": self.max_wait,
+            "block_cache_size": self.block_cache_size,
+            "state_cache_size": self.state_cache_size,
+            "leader": self.leader,
+            "replication_batch": self.replication_batch,
+            "replication_interval": self.replication_interval,
         }
 
 
 @dataclass
 class Config:
     web: ConfigWeb
+    blockchain: ConfigBlockchain
 
     @classmethod
     def parse(cls, data: dict) -> "Config":
@@ -29,7 +80,7 @@ class Config:
 
         for section in fields(cls):
             pre = {}
-            current = data[section.name]
+            current = data.get(section.name, {})
 
             for field in fields(section.type):
                 if field.name in current:
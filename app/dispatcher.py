@@ -1,10 +1,153 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+import os
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Match
 from app.handlers import router as handlers_router
+from app.handlers.blockchain.api import blockchain, blockchain_config, producer
+from app.metrics import REQUEST_SECONDS, WRITER_METRICS, families, registry
+from app.workers import SOCKET_VARIABLE, WriterProxy, role
+
+# routes answered by the writer for transactions that are not in a block yet
+PENDING_ROUTES = ("/api/bc/status/", "/api/bc/tx/", "/api/bc/proof/")
+
+writer = WriterProxy(os.environ[SOCKET_VARIABLE]) if role() == "reader" else None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    producer.start()
+    yield
+    await producer.stop()
+    if writer is not None:
+        await writer.close()
+    blockchain.committer.stop()
+
+
+def route_table(routes) -> list:
+    """
+    Every route of an app with its full path template
+
+    Recent FastAPI versions keep the routes of an included router with
+    their path relative to the router, the prefixes are only known by the
+    router including them.
+
+    :param routes: list: Routes of the app
+
+    :return: list: (route handling the requests, route matching the full path) pairs
+    """
+    table = []
+    for route in routes:
+        contexts = getattr(route, "effective_route_contexts", None)
+        if contexts is None:
+            table.append((route, route))
+            continue
+        table.extend((context.original_route, context) for context in contexts())
+    return table
+
+
+def route_template(request, table) -> str:
+    """
+    Path template of the route of a request, so there is one latency series
+    per route and not per URL
+
+    A request forwarded to the writer or refused by a follower is not routed
+    in this process, its route is found by matching the path.
+
+    :param request: Request: Handled request
+    :param table: list: Routes of the app (see route_table)
+
+    :return: str: Route template, "unmatched" if no route handles the request
+    """
+    route = request.scope.get("route")
+    for original, full in table:
+        if original is route or (
+            route is None and full.matches(request.scope)[0] == Match.FULL
+        ):
+            return full.path
+    return "unmatched" if route is None else route.path
+
+
+def forwarded(request) -> bool:
+    """
+    Check if an HTTP worker has to forward a request to the writer process
+
+    :param request: Request: Received request
+
+    :return: bool: True for writes and for transactions only the writer knows
+    """
+    path = request.url.path
+    if not path.startswith("/api/"):
+        return False
+    if request.method != "GET" or path == "/api/bc/sync":
+        return True
+    for prefix in PENDING_ROUTES:
+        if path.startswith(prefix):
+            return blockchain.coin.position(path[len(prefix) :]) is None
+    return False
 
 
 def dispatcher(context):
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
     app.include_router(router=handlers_router, prefix="/api")
+    routes = []  # filled once every route is added
+
+    if writer is not None:
+
+        @app.middleware("http")
+        async def forward_to_writer(request: Request, call_next):
+            if not forwarded(request):
+                return await call_next(request)
+            response = await writer.forward(request)
+            if request.method != "GET":
+                # later reads on this worker see the change
+                await asyncio.get_running_loop().run_in_executor(
+                    None, blockchain.refresh
+                )
+            return response
+
+    elif blockchain_config["leader"]:
+
+        @app.middleware("http")
+        async def read_only(request: Request, call_next):
+            # a follower only changes through replication, its ledger
+            # would diverge from the leader
+            if request.method != "GET" and request.url.path.startswith("/api/"):
+                return JSONResponse(
+                    {
+                        "error": "Read-only follower, send writes to "
+                        + blockchain_config["leader"]
+                    },
+                    status_code=403,
+                )
+            return await call_next(request)
+
+    # added last so it is the outermost middleware and times forwarded
+    # and refused requests too
+    @app.middleware("http")
+    async def measure_latency(request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route_template(request, routes),
+        )
+        return response
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        if writer is None:
+            text = registry.render()
+        else:
+            # mining, sync and pending transactions are in the writer, this
+            # worker would report them as zero
+            text = registry.render(skip=WRITER_METRICS) + families(
+                await writer.get("/metrics"), WRITER_METRICS
+            )
+        return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
 
     @app.get("/")
     async def root():
@@ -13,4 +156,5 @@ def dispatcher(context):
             "start_time": context["start_time"],
         }
 
+    routes.extend(route_table(app.routes))
     return app
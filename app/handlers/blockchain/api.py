@@ -1,31 +1,117 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Body, Query
+from fastapi.responses import StreamingResponse
 from app.blockchain import Coin
+from app.blockchain.producer import BlockProducer
+from app.blockchain.export import ndjson
+from app.blockchain.replication import Replicator, StorageFollower, compress
+from app.blockchain.storage import STORAGES, BlockLog
 import os, json
 import logging
 import coloredlogs
 from datetime import datetime
+from typing import Any, List
 
 from app.config import parse_config
+from app.metrics import registry
+from app.workers import role
 
 logger = logging.getLogger(__name__)
 coloredlogs.install(level="DEBUG", logger=logger)
 
-if not os.path.exists(os.getcwd() + "/blockchain.json"):
-    logger.info("Creating new blockchain")
-    blockchain = Coin()
-else:
+config = parse_config("config.toml")
+blockchain_config = config.blockchain.get_config()
+if blockchain_config["backend"] not in STORAGES:
+    raise ValueError(f"Unknown storage backend {blockchain_config['backend']}")
+storage = STORAGES[blockchain_config["backend"]](
+    os.path.join(os.getcwd(), blockchain_config["storage"])
+)
+coin_options = {
+    "difficulty": blockchain_config["difficulty"],
+    "storage": storage,
+    "snapshot_interval": blockchain_config["snapshot_interval"],
+    "compact_ratio": blockchain_config["compact_ratio"],
+    "pruning": blockchain_config["prune"],
+    "keep_blocks": blockchain_config["keep_blocks"],
+    "archive": (
+        BlockLog(os.path.join(os.getcwd(), blockchain_config["archive"]))
+        if blockchain_config["archive"]
+        else None
+    ),
+    "mining_workers": blockchain_config["mining_workers"],
+    "minimum_transactions": blockchain_config["minimum_transactions"],
+    "max_transactions": blockchain_config["max_transactions"],
+    "max_bytes": blockchain_config["max_bytes"],
+    "max_wait": blockchain_config["max_wait"],
+    "block_cache_size": blockchain_config["block_cache_size"],
+    "state_cache_size": blockchain_config["state_cache_size"],
+}
+
+if role() == "reader":
+    # the writer process created the storage, it is only read here
+    logger.info("Reading %s", storage.path)
+    blockchain = Coin(restore=True, read_only=True, **coin_options)
+    if storage.exists():
+        blockchain.restore()
+elif storage.exists():
     logger.info("Restoring blockchain")
+    blockchain = Coin(restore=True, **coin_options).restore()
+elif blockchain_config["leader"]:
+    logger.info("Following %s", blockchain_config["leader"])
+    # the genesis block is pulled from the leader
+    blockchain = Coin(restore=True, **coin_options)
+elif os.path.exists(os.getcwd() + "/blockchain.json"):
+    logger.info("Migrating blockchain.json to %s", storage.path)
     with open(os.getcwd() + "/blockchain.json", "r") as file:
         data = json.load(file)
-        blockchain = Coin(restore=True).from_dict(data)
+        blockchain = Coin(restore=True, **coin_options).from_dict(data)
+    # checked before the storage is written, a failed migration leaves no log
+    if not blockchain.validate_chain(workers=blockchain_config["validation_workers"]):
+        raise Exception("Invalid chain")
+    blockchain.compact()
+else:
+    logger.info("Creating new blockchain")
+    blockchain = Coin(**coin_options)
+    blockchain.sync()
 router = APIRouter()
-
-if not blockchain.validate_chain():
-    raise Exception("Invalid chain")
-logger.info("Chain is valid")
-
-config = parse_config("config.toml").web.get_config()
-SECRET_KEY = config["key"]
+if role() == "reader":
+    # blocks and wallet changes come from the writer through the storage
+    producer = StorageFollower(blockchain)
+elif blockchain_config["leader"]:
+    # a follower gets its blocks from the leader instead of mining them
+    producer = Replicator(
+        blockchain,
+        blockchain_config["leader"],
+        config.web.get_config()["key"],
+        blockchain_config["replication_batch"],
+        blockchain_config["replication_interval"],
+    )
+else:
+    producer = BlockProducer(blockchain)
+
+# the writer verified the chain before the workers started
+if role() != "reader":
+    if not blockchain.verify(workers=blockchain_config["validation_workers"]):
+        raise Exception("Invalid chain")
+    logger.info("Chain is valid")
+
+SECRET_KEY = config.web.get_config()["key"]
+
+registry.gauge(
+    "blockchain_height",
+    "Height of the last block",
+    lambda: len(blockchain.coin.chain) - 1,
+)
+registry.gauge(
+    "blockchain_pending_transactions",
+    "Transactions waiting to be mined",
+    lambda: len(blockchain.coin.pending_transactions),
+)
+registry.gauge(
+    "blockchain_pending_bytes",
+    "Serialized size of the transactions waiting to be mined",
+    lambda: blockchain.pending_bytes,
+)
+registry.gauge("blockchain_wallets", "Wallet addresses", lambda: len(blockchain.wallet))
 
 
 @router.post("/")
@@ -33,7 +119,7 @@ def create_wallet():
     """
     Create a new wallet
     """
-    return blockchain.wallet.create_wallet()
+    return blockchain.create_wallet()
 
 
 @router.get("/")
@@ -44,7 +130,7 @@ def get_balance(public_key: str, private_key: str):
     :param public_key: str: Public key of the wallet
     :param private_key: str: Private key of the wallet
     """
-    return blockchain.wallet.get_balance(private_key, public_key)
+    return blockchain.get_balance(private_key, public_key)
 
 
 @router.post("/transfer")
@@ -54,20 +140,34 @@ def transfer(from_: str, to: str, amount: float):
 
     :param from_: str: Private key of the sender (pve)
     :param to: str: Public key of the receiver (pbc)
+
+    :return: dict: Hash of the transaction and "pending" status, or "rejected" with an error
     """
     try:
-        blockchain.create_transaction(
+        return blockchain.submit_transaction(
             datetime.now(),
             data={
                 "type": "token-transfer",
                 "data": {"to": to, "from": from_, "amount": amount},
             },
         )
-        return {"status": "success"}
     except Exception as e:
         return {"error": str(e)}
 
 
+@router.post("/transfer/batch")
+def transfer_batch(transfers: List[Any] = Body(...)):
+    """
+    Transfer amounts between wallets, all transfers are mined into one block
+
+    :param transfers: list: Transfers with "from" (pve), "to" (pbc) and "amount"
+
+    :return: dict: "pending", or "rejected" if a transfer is invalid, with the result of each transfer
+    """
+    # items are checked one by one, an invalid one is reported in its result
+    return blockchain.submit_batch(transfers)
+
+
 @router.post("/credit")
 def credit_wallet(public_key: str, amount: float, key: str):
     """
@@ -81,7 +181,7 @@ def credit_wallet(public_key: str, amount: float, key: str):
     """
     if key != SECRET_KEY:
         return {"error": "Invalid key"}
-    return blockchain.wallet.credit_wallet(public_key, amount)
+    return blockchain.credit_wallet(public_key, amount)
 
 
 @router.get("/public-key")
@@ -93,7 +193,7 @@ def get_public_key(private_key: str):
 
     :return: str: Public key
     """
-    return blockchain.wallet.get_public_key(private_key)
+    return blockchain.get_public_key(private_key)
 
 
 @router.get("/validate")
@@ -106,7 +206,7 @@ def validate_wallet(private_key: str, public_key: str):
 
     :return: bool: True if the wallet is valid, False if not
     """
-    return blockchain.wallet.validate_wallet(private_key, public_key)
+    return blockchain.validate_address(private_key, public_key)
 
 
 @router.post("/nft")
@@ -118,8 +218,10 @@ def create_nft(name: str, description: str, url: str, owner: str):
     :param description: str: Description of the NFT
     :param url: str: URL of the NFT
     :param owner: str: Public key of the owner
+
+    :return: dict: Hash of the transaction and "pending" status
     """
-    blockchain.create_transaction(
+    return blockchain.submit_transaction(
         datetime.now(),
         data={
             "type": "nft-create",
@@ -131,7 +233,6 @@ def create_nft(name: str, description: str, url: str, owner: str):
             },
         },
     )
-    return {"status": "success"}
 
 
 @router.post("/nft-transfer")
@@ -142,20 +243,210 @@ def transfer_nft(nft: str, from_: str, to: str):
     :param nft: str: ID of the NFT
     :param from_: str: Private key of the sender (pve)
     :param to: str: Public key of the receiver (pbc)
+
+    :return: dict: Hash of the transaction and "pending" status
     """
     try:
-        blockchain.create_transaction(
+        return blockchain.submit_transaction(
             datetime.now(),
             data={
                 "type": "nft-transfer",
                 "data": {"nft": nft, "from": from_, "to": to},
             },
         )
-        return {"status": "success"}
     except Exception as e:
         return {"error": str(e)}
 
 
+@router.get("/nfts")
+def list_nfts(owner: str, offset: int = 0, limit: int = 50):
+    """
+    List the NFTs of a wallet
+
+    :param owner: str: Public key of the owner (pbc)
+    :param offset: int: Number of NFTs to skip
+    :param limit: int: Maximum number of NFTs to return, at most 100
+
+    :return: dict: Page of NFTs and the total number of NFTs of the owner
+    """
+    limit = max(0, min(limit, 100))
+    state = blockchain.state
+    if owner not in state.accounts:
+        return {"error": "Wallet not found"}
+    return {
+        "owner": owner,
+        "total": len(state.owned.get(owner, ())),
+        "offset": offset,
+        "limit": limit,
+        "nfts": state.owned_by(owner, max(0, offset), limit),
+    }
+
+
+@router.get("/nft/{nft_id}")
+def get_nft(nft_id: str):
+    """
+    Get an NFT by its ID
+
+    :param nft_id: str: ID of the NFT
+
+    :return: dict: NFT
+    """
+    nft = blockchain.state.nfts.get(nft_id)
+    if nft is None:
+        return {"error": "NFT not found"}
+    return nft
+
+
+@router.get("/history/{public_key}")
+def get_history(public_key: str, cursor: str = None, limit: int = 50):
+    """
+    Get the confirmed transactions of a wallet, newest first
+
+    :param public_key: str: Public key of the wallet (pbc)
+    :param cursor: str: "next" of the previous page, omitted for the first page
+    :param limit: int: Maximum number of transactions to return, at most 100
+
+    :return: dict: Transactions and the cursor of the next page, null on the last page
+    """
+    try:
+        history = blockchain.get_history(public_key, cursor, max(1, min(limit, 100)))
+    except ValueError as e:
+        return {"error": str(e)}
+    if history == "Failed":
+        return {"error": "Wallet not found"}
+    return history
+
+
+@router.get("/blocks")
+def list_blocks(
+    start: int = Query(0, alias="from"), limit: int = 20, body: bool = False
+):
+    """
+    List blocks by height
+
+    :param start: int: Height of the first block
+    :param limit: int: Maximum number of blocks to return, at most 100
+    :param body: bool: Return the transactions too, only the headers by default
+
+    :return: dict: Page of blocks, oldest first, and the height of the last block
+    """
+    limit = max(0, min(limit, 100))
+    return {
+        "height": len(blockchain.coin.chain) - 1,
+        "from": start,
+        "limit": limit,
+        "blocks": blockchain.get_blocks(start, limit, body),
+    }
+
+
+@router.get("/block/{height}")
+def get_block(height: int, body: bool = False):
+    """
+    Get a block by its height
+
+    :param height: int: Height of the block
+    :param body: bool: Return the transactions too, only the header by default
+
+    :return: dict: Block, "pruned" is set when only its header is left
+    """
+    block = blockchain.get_block(height, body)
+    if block is None:
+        return {"error": "Block not found"}
+    return block
+
+
+@router.get("/block/hash/{block_hash}")
+def get_block_by_hash(block_hash: str, body: bool = False):
+    """
+    Get a block by its hash
+
+    :param block_hash: str: Hash of the block
+    :param body: bool: Return the transactions too, only the header by default
+
+    :return: dict: Block, "pruned" is set when only its header is left
+    """
+    block = blockchain.get_block_by_hash(block_hash, body)
+    if block is None:
+        return {"error": "Block not found"}
+    return block
+
+
+@router.get("/status/{tx_hash}")
+def transaction_status(tx_hash: str):
+    """
+    Get the status of a submitted transaction
+
+    :param tx_hash: str: Hash of the transaction
+
+    :return: dict: "pending", "confirmed" or "rejected" with the block height, or "unknown"
+    """
+    return blockchain.get_status(tx_hash)
+
+
+@router.get("/tx/{tx_hash}")
+def get_transaction(tx_hash: str):
+    """
+    Get a confirmed transaction by its hash
+
+    :param tx_hash: str: Hash of the transaction
+
+    :return: dict: Transaction with its block height and index in the block, the sender named by its public key
+    """
+    position = blockchain.coin.position(tx_hash)
+    if position is None:
+        return blockchain.get_status(tx_hash)
+
+    height, index = position
+    return {
+        "hash": tx_hash,
+        "status": blockchain.get_status(tx_hash)["status"],
+        "block": height,
+        "index": index,
+        "transaction": blockchain.public_transaction(
+            blockchain.get_transaction(tx_hash)
+        ),
+    }
+
+
+@router.get("/proof/{tx_hash}")
+def transaction_proof(tx_hash: str):
+    """
+    Get a Merkle proof that a confirmed transaction is in its block
+
+    The leaf is sha256(0x00 + transaction hash), a node is
+    sha256(0x01 + left + right), the last hash must be the merkle_root
+    of the block header.
+
+    :param tx_hash: str: Hash of the transaction
+
+    :return: dict: Block header, index of the transaction and the sibling hashes from the leaf up
+    """
+    proof = blockchain.get_proof(tx_hash)
+    if proof is None:
+        return blockchain.get_status(tx_hash)
+    return proof
+
+
+@router.get("/export")
+def export(key: str):
+    """
+    Stream the chain and the wallet as NDJSON, for backups and analytics
+
+    Lines are a "chain" record, then every block followed by its
+    "transaction" records, then every "wallet" record, private keys
+    included.
+
+    :param key: str: Secret key
+
+    :return: StreamingResponse: One record per line
+    """
+    if key != SECRET_KEY:
+        return {"error": "Invalid key"}
+    return StreamingResponse(
+        ndjson(blockchain.export()), media_type="application/x-ndjson"
+    )
+
+
 @router.get("/sync")
 def sync(key: str):
     """
@@ -165,3 +456,67 @@ def sync(key: str):
         return {"error": "Invalid key"}
     blockchain.sync()
     return {"status": "success"}
+
+
+@router.get("/peer/headers")
+def peer_headers(key: str, start: int = Query(0, alias="from"), limit: int = 500):
+    """
+    Get the headers of written blocks, followers check them before they
+    pull the blocks
+
+    :param key: str: Secret key
+    :param start: int: Height of the first header
+    :param limit: int: Maximum number of headers, at most 2000
+
+    :return: dict: Height of the last block and the headers
+    """
+    if key != SECRET_KEY:
+        return {"error": "Invalid key"}
+    if blockchain.storage is None:
+        return {"error": "Replication needs a storage"}
+    limit = max(0, min(limit, 2000))
+    return {
+        "height": blockchain.synced - 1,
+        "headers": blockchain.replication_headers(max(0, start), limit),
+    }
+
+
+@router.get("/peer/blocks")
+def peer_blocks(
+    key: str,
+    start: int = Query(0, alias="from"),
+    hash: str = None,
+    seq: int = -1,
+    limit: int = 500,
+):
+    """
+    Stream the blocks and wallet changes following a block, as
+    gzip-compressed NDJSON, private keys included
+
+    :param key: str: Secret key
+    :param start: int: Height of the first block
+    :param hash: str: Hash of the block before it, the follower's tip
+    :param seq: int: Number of the last wallet change the follower has, -1 for a snapshot
+    :param limit: int: Maximum number of blocks, at most 2000
+
+    :return: StreamingResponse: One record per line, the records of the storage
+    """
+    if key != SECRET_KEY:
+        return {"error": "Invalid key"}
+    if blockchain.storage is None:
+        return {"error": "Replication needs a storage"}
+    start = max(0, start)
+    if start > blockchain.synced:
+        return {"error": f"Block {start - 1} is not written yet"}
+    if (
+        hash is not None
+        and start > 0
+        and blockchain.coin.chain.header(start - 1).hash != hash
+    ):
+        return {"error": f"Block {start - 1} does not match {hash}"}
+    limit = max(0, min(limit, 2000))
+    return StreamingResponse(
+        compress(blockchain.replication_records(start, seq, limit)),
+        media_type="application/x-ndjson",
+        headers={"Content-Encoding": "gzip"},
+    )
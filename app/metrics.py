@@ -0,0 +1,207 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds, from a fast request to a slow proof of work
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+# metrics only the writer process updates, HTTP workers serve the writer's
+WRITER_METRICS = ("blockchain_mining_", "blockchain_sync_", "blockchain_pending_")
+
+
+def _format_labels(names, values, extra="") -> str:
+    labels = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Metric:
+    """
+    Base class of the metrics, samples are kept per label values
+
+    :param name: str: Name of the metric
+    :param documentation: str: Help text of the metric
+    :param labels: tuple: Names of the labels
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.samples = {}  # label values -> value
+        self.lock = threading.Lock()
+
+    def _key(self, labels) -> tuple:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> list:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self.lock:
+            samples = list(self.samples.items())
+        for key, value in samples:
+            lines.append(
+                f"{self.name}{_format_labels(self.labels, key)} {float(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Gauge computed by a function when the metrics are scraped
+
+    :param name: str: Name of the metric
+    :param documentation: str: Help text of the metric
+    :param function: callable: Returns the current value
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, function):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def render(self) -> list:
+        self.samples = {(): self.function()}
+        return super().render()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                # bucket counts, sum, count
+                sample = self.samples[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[0][i] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        with self.lock:
+            samples = [
+                (key, list(counts), total, count)
+                for key, (counts, total, count) in self.samples.items()
+            ]
+        for key, counts, total, count in samples:
+            for bound, bucket in zip(self.buckets, counts):
+                labels = _format_labels(self.labels, key, f'le="{float(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {float(bucket)}")
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {float(count)}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {float(count)}")
+        return lines
+
+
+class Registry:
+    """
+    Metrics exposed in the Prometheus text format
+
+    Counters and histograms are updated where the work is done, gauges are
+    only computed when the metrics are rendered.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, function) -> Gauge:
+        return self.register(Gauge(name, documentation, function))
+
+    def histogram(self, name, documentation, labels=(), buckets=BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self, skip=()) -> str:
+        """
+        Render the metrics
+
+        :param skip: tuple: Prefixes of the names of metrics to leave out
+
+        :return: str: Metrics in the text format
+        """
+        lines = []
+        for name, metric in self.metrics.items():
+            if not name.startswith(skip):
+                lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+def families(text, prefixes) -> str:
+    """
+    Keep some metrics of a rendered registry
+
+    :param text: str: Metrics in the text format
+    :param prefixes: tuple: Prefixes of the names of metrics to keep
+
+    :return: str: Lines of the kept metrics
+    """
+    lines = []
+    keep = False
+    for line in text.splitlines():
+        # every metric starts with its help line
+        if line.startswith("# HELP "):
+            keep = line.split(" ", 3)[2].startswith(prefixes)
+        if keep:
+            lines.append(line)
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+registry = Registry()
+
+MINING_SECONDS = registry.histogram(
+    "blockchain_mining_seconds", "Time spent on the proof of work of a block"
+)
+MINING_ATTEMPTS = registry.counter(
+    "blockchain_mining_attempts_total", "Proofs tried by the proof of work"
+)
+SYNC_SECONDS = registry.histogram(
+    "blockchain_sync_seconds", "Time spent appending records to the storage"
+)
+SYNC_BYTES = registry.counter(
+    "blockchain_sync_bytes_total", "Bytes appended to the storage"
+)
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Latency of the API routes", ("method", "route")
+)
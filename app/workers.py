@@ -0,0 +1,162 @@
+"""
+Serve the API from several processes
+
+One writer process owns the ledger: it mines blocks and writes the storage,
+and listens on a Unix socket. The HTTP workers restore the same storage,
+follow what the writer appends to it and answer reads themselves. Writes,
+and reads of transactions that are still pending, are forwarded to the
+writer.
+"""
+
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from datetime import datetime
+
+import aiohttp
+import coloredlogs
+import uvicorn
+from fastapi import Response
+from yarl import URL
+
+ROLE_VARIABLE = "BLOCKCHAIN_ROLE"  # "writer" or "reader"
+SOCKET_VARIABLE = "BLOCKCHAIN_WRITER_SOCKET"
+
+
+def role() -> str:
+    """
+    Get the role of this process
+
+    :return: str: "reader" for an HTTP worker, "writer" or "" for the process owning the ledger
+    """
+    return os.environ.get(ROLE_VARIABLE, "")
+
+
+class WriterProxy:
+    """
+    Forward requests of an HTTP worker to the writer process
+
+    :param path: str: Unix socket the writer listens on
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.session = None
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=self.path)
+            )
+        return self.session
+
+    async def forward(self, request) -> Response:
+        """
+        Send a request to the writer
+
+        :param request: Request: Request received by the worker
+
+        :return: Response: Response of the writer
+        """
+        url = "http://writer" + request.url.path
+        if request.url.query:
+            url += "?" + request.url.query
+        async with self._session().request(
+            request.method,
+            URL(url, encoded=True),
+            data=await request.body(),
+            headers={
+                name: value
+                for name, value in request.headers.items()
+                if name in ("content-type", "accept")
+            },
+        ) as response:
+            return Response(
+                await response.read(),
+                status_code=response.status,
+                media_type=response.headers.get("content-type"),
+            )
+
+    async def get(self, path) -> str:
+        """
+        Read a page of the writer
+
+        :param path: str: Path of the page
+
+        :return: str: Body of the page
+        """
+        async with self._session().get("http://writer" + path) as response:
+            response.raise_for_status()
+            return await response.text()
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+def create_app():
+    """
+    Build the app of an HTTP worker, uvicorn calls it in every worker
+
+    :return: FastAPI: App
+    """
+    from app.dispatcher import dispatcher
+
+    return dispatcher({"start_time": datetime.now()})
+
+
+def _run_writer(path) -> None:
+    os.environ[ROLE_VARIABLE] = "writer"
+    coloredlogs.install(level=logging.INFO)
+    from app.dispatcher import dispatcher
+
+    uvicorn.run(dispatcher({"start_time": datetime.now()}), uds=path)
+
+
+def _wait_for(process, path) -> None:
+    # the writer listens once the chain is restored and verified
+    while True:
+        if not process.is_alive():
+            logging.error("Writer process exited with code %s", process.exitcode)
+            raise SystemExit(1)
+        try:
+            with socket.socket(socket.AF_UNIX) as client:
+                client.connect(path)
+            return
+        except OSError:
+            time.sleep(0.1)
+
+
+def serve(web_config) -> None:
+    """
+    Start the writer process, then the HTTP workers, and wait for them
+
+    :param web_config: dict: Web section of the config
+    """
+    path = os.path.join(os.getcwd(), web_config["writer_socket"])
+    if os.path.exists(path):
+        os.remove(path)
+
+    writer = multiprocessing.get_context("spawn").Process(
+        target=_run_writer, args=(path,), name="writer"
+    )
+    writer.start()
+    try:
+        _wait_for(writer, path)
+        logging.info("Writer listening on %s", path)
+        # inherited by the workers uvicorn starts
+        os.environ[ROLE_VARIABLE] = "reader"
+        os.environ[SOCKET_VARIABLE] = path
+        uvicorn.run(
+            "app.workers:create_app",
+            factory=True,
+            host=web_config["host"],
+            port=web_config["port"],
+            workers=web_config["workers"],
+        )
+    finally:
+        writer.terminate()
+        writer.join()
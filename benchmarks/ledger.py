@@ -0,0 +1,209 @@
+"""
+Timings of the ledger hot paths on synthetic chains
+
+Every size is used both as the number of wallet addresses and as the number
+of transactions, transactions are grouped in blocks of --block-size.
+One JSON object is printed per benchmark and size.
+Run from the repository root:
+
+    python -m benchmarks.ledger --sizes 1000,100000,1000000
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from app.blockchain import Coin
+from app.blockchain.architectures.block import Block
+from app.blockchain.architectures.transaction import Transaction
+from app.blockchain.storage import BlockLog
+
+
+class Timer:
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds += time.perf_counter() - self.start
+
+
+def result(benchmark, size, operations, seconds) -> dict:
+    return {
+        "benchmark": benchmark,
+        "size": size,
+        "operations": operations,
+        "seconds": round(seconds, 6),
+        "operations_per_second": round(operations / seconds, 1) if seconds else None,
+    }
+
+
+def build_transactions(keys, count) -> list:
+    # wallet i sends 1 to wallet i + 1, every wallet can afford its transfers
+    now = datetime.now()
+    return [
+        Transaction(
+            now,
+            data={
+                "type": "token-transfer",
+                "data": {
+                    "to": keys[(i + 1) % len(keys)][1],
+                    "from": keys[i % len(keys)][0],
+                    "amount": 1.0,
+                },
+            },
+        )
+        for i in range(count)
+    ]
+
+
+def bench_wallet(coin, size) -> list:
+    results = []
+    # through the committer, the new addresses are written to the storage
+    with Timer() as timer:
+        for _ in range(size):
+            coin.create_wallet()
+    results.append(result("coin.create_wallet", size, size, timer.seconds))
+
+    keys = list(zip(coin.wallet.pve, coin.wallet.pbc))
+    with Timer() as timer:
+        for pve, pbc in keys:
+            coin.wallet.get_balance(pve, pbc)
+    results.append(result("wallet.get_balance", size, size, timer.seconds))
+
+    with Timer() as timer:
+        for _, pbc in keys:
+            coin.credit_wallet(pbc, 10)
+    results.append(result("coin.credit_wallet", size, size, timer.seconds))
+    return results
+
+
+def bench_state(coin, size, block_size) -> list:
+    results = []
+    keys = list(zip(coin.wallet.pve, coin.wallet.pbc))
+    coin._publish()
+    # a commit changing block_size addresses, then the lookups of readers
+    commits = max(min(size // block_size, 100), 1)
+    timer = Timer()
+    for _ in range(commits):
+        for _, pbc in random.sample(keys, min(block_size, size)):
+            coin.wallet.credit_wallet(pbc, 1)
+        with timer:
+            coin._publish()
+    results.append(result("coin._publish", size, commits, timer.seconds))
+
+    for benchmark in ("coin.get_balance (miss)", "coin.get_balance (hit)"):
+        with Timer() as timer:
+            for pve, pbc in keys[: coin.state_cache_size]:
+                coin.get_balance(pve, pbc)
+        results.append(
+            result(benchmark, size, len(keys[: coin.state_cache_size]), timer.seconds)
+        )
+    return results
+
+
+def bench_blocks(coin, size, block_size) -> list:
+    keys = list(zip(coin.wallet.pve, coin.wallet.pbc))
+    transactions = build_transactions(keys, size)
+    timer = Timer()
+    for i in range(0, size, block_size):
+        last_block = coin.coin.chain[len(coin.coin.chain) - 1]
+        with timer:
+            # the Block constructor applies the transactions with _complete
+            block = Block(
+                datetime.now().timestamp(),
+                transactions[i : i + block_size],
+                last_block.hash,
+                0,
+                coin.wallet,
+            )
+        coin.coin.append(block)
+    return [result("block._complete", size, size, timer.seconds)]
+
+
+def bench_proof_of_work(difficulty, rounds, workers) -> dict:
+    coin = Coin(difficulty=difficulty, mining_workers=workers)
+    proof = 0
+    try:
+        with Timer() as timer:
+            for _ in range(rounds):
+                proof = coin._proof_of_work(proof)
+    finally:
+        coin.miner.shutdown()
+    return result("coin._proof_of_work", None, rounds, timer.seconds)
+
+
+def bench_storage(coin, size, workers) -> list:
+    results = []
+    blocks = len(coin.coin.chain)
+
+    with Timer() as timer:
+        valid = coin.validate_chain(workers=workers)
+    assert valid
+    results.append(result("coin.validate_chain", size, blocks, timer.seconds))
+
+    with Timer() as timer:
+        coin.sync()
+    results.append(result("coin.sync", size, blocks, timer.seconds))
+    results[-1]["bytes"] = os.path.getsize(coin.storage.path)
+
+    # a node started on the log: the last snapshot is loaded and the blocks
+    # and wallet changes written after it are replayed
+    restored = Coin(restore=True, storage=BlockLog(coin.storage.path))
+    try:
+        with Timer() as timer:
+            restored.restore()
+    finally:
+        restored.committer.stop()
+        restored.miner.shutdown()
+    assert len(restored.coin.chain) == blocks
+    results.append(result("coin.restore", size, blocks, timer.seconds))
+    return results
+
+
+def run(size, block_size, directory, workers) -> list:
+    random.seed(size)
+    # blocks stay in memory until bench_storage syncs them to the log
+    coin = Coin(
+        difficulty=1,
+        storage=BlockLog(os.path.join(directory, "blockchain-%d.log" % size)),
+        snapshot_interval=max(size // block_size, 1),
+    )
+    results = bench_wallet(coin, size)
+    results += bench_state(coin, size, block_size)
+    results += bench_blocks(coin, size, block_size)
+    results += bench_storage(coin, size, workers)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--block-size", type=int, default=1000)
+    parser.add_argument("--difficulty", type=int, default=4)
+    parser.add_argument("--pow-rounds", type=int, default=10)
+    parser.add_argument("--mining-workers", type=int, default=1)
+    parser.add_argument("--validation-workers", type=int, default=1)
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            bench_proof_of_work(args.difficulty, args.pow_rounds, args.mining_workers)
+        ),
+        flush=True,
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (int(size) for size in args.sizes.split(",")):
+            for line in run(size, args.block_size, directory, args.validation_workers):
+                print(json.dumps(line), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Memory used per wallet address and per transaction
+
+Run from the repository root:
+
+    python -m benchmarks.memory --wallets 100000 --transactions 100000
+"""
+
+import argparse
+import json
+import tracemalloc
+from datetime import datetime
+
+from app.blockchain.architectures.transaction import Transaction
+from app.blockchain.architectures.wallet import Wallet
+
+
+def measure(build, count) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build(count)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return used / count
+
+
+def build_wallet(count) -> Wallet:
+    wallet = Wallet()
+    for _ in range(count):
+        wallet.create_wallet()
+    return wallet
+
+
+def build_transactions(count) -> list:
+    now = datetime.now()
+    return [
+        Transaction(
+            now,
+            data={
+                "type": "token-transfer",
+                "data": {"to": "%064x" % i, "from": "%064x" % -i, "amount": 1.0},
+            },
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wallets", type=int, default=100000)
+    parser.add_argument("--transactions", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            {
+                "wallets": args.wallets,
+                "bytes_per_wallet": round(measure(build_wallet, args.wallets), 1),
+                "transactions": args.transactions,
+                "bytes_per_transaction": round(
+                    measure(build_transactions, args.transactions), 1
+                ),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import os
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.blockchain import Coin
+from app.blockchain.storage import STORAGES
+
+
+@pytest.fixture(params=sorted(STORAGES))
+def storage(request, tmp_path):
+    """
+    Open storages of the tested backend, the same name opens the same file
+    """
+
+    def open_storage(name="blockchain"):
+        return STORAGES[request.param](str(tmp_path / name))
+
+    return open_storage
+
+
+@pytest.fixture
+def coin():
+    """
+    Create coins that are stopped after the test
+    """
+    coins = []
+
+    def create(**kwargs):
+        kwargs.setdefault("difficulty", 1)
+        coins.append(Coin(**kwargs))
+        return coins[-1]
+
+    yield create
+    for created in coins:
+        created.committer.stop()
+        created.miner.shutdown()
+
+
+@pytest.fixture
+def populate():
+    """
+    Fill a coin with wallets and blocks of transfers
+    """
+
+    def fill(coin, blocks, addresses=3):
+        # a number of new addresses, each credited, or the addresses to use
+        if isinstance(addresses, int):
+            addresses = [coin.create_wallet()["address"] for _ in range(addresses)]
+            for address in addresses:
+                coin.credit_wallet(address["pbc"], 100)
+        for height in range(blocks):
+            for i, sender in enumerate(addresses):
+                # every block sends to other addresses, never to the sender
+                shift = 1 + height % max(len(addresses) - 1, 1)
+                receiver = addresses[(i + shift) % len(addresses)]
+                coin.submit_transaction(
+                    datetime.now(),
+                    {
+                        "type": "token-transfer",
+                        "data": {
+                            "from": sender["pve"],
+                            "to": receiver["pbc"],
+                            "amount": 1.0 + i,
+                        },
+                    },
+                )
+            coin.submit_transaction(
+                datetime.now(),
+                {
+                    "type": "nft-create",
+                    "data": {
+                        "name": "nft %d" % height,
+                        "description": "",
+                        "url": "",
+                        "owner": addresses[height % len(addresses)]["pbc"],
+                    },
+                },
+            )
+            coin.mine_pending()
+        return addresses
+
+    return fill
+
+
+@pytest.fixture
+def summarize():
+    """
+    Sum up what a coin serves for some wallet addresses, to compare coins
+    """
+
+    def summary(coin, addresses):
+        chain = coin.coin.chain
+        return {
+            "hashes": [chain.header(height).hash for height in range(len(chain))],
+            "balances": [coin.get_balance(a["pve"], a["pbc"]) for a in addresses],
+            "nfts": [coin.state.owned_by(a["pbc"]) for a in addresses],
+            "history": [
+                coin.get_history(a["pbc"], limit=1000)["transactions"]
+                for a in addresses
+            ],
+        }
+
+    return summary
+
+
+NODE_CONFIG = """
+[web]
+host = "127.0.0.1"
+port = 8000
+key = "secret"
+
+[blockchain]
+difficulty = 1
+mining_workers = 1
+validation_workers = 1
+max_wait = 0
+"""
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    """
+    The API module, imported in the directory of a new node
+    """
+    directory = tmp_path_factory.mktemp("node")
+    (directory / "config.toml").write_text(NODE_CONFIG)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        from app.handlers.blockchain import api
+    finally:
+        os.chdir(cwd)
+    yield api
+    api.blockchain.committer.stop()
+    api.blockchain.miner.shutdown()
+
+
+@pytest.fixture(scope="session")
+def client(api):
+    """
+    Client of the app of a single process node, blocks are mined by the tests
+    """
+    from app.dispatcher import dispatcher
+
+    return TestClient(dispatcher({"start_time": datetime.now()}))
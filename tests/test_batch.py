@@ -0,0 +1,159 @@
+from datetime import datetime
+
+from app.blockchain.architectures.block import Block
+from app.blockchain.architectures.transaction import Transaction
+from app.blockchain.architectures.wallet import Wallet
+
+
+def transfer(sender, receiver, amount) -> dict:
+    return {"from": sender["pve"], "to": receiver["pbc"], "amount": amount}
+
+
+def bundle(transfers) -> list:
+    return [
+        Transaction(
+            datetime(2024, 1, 1, 0, 0, 0, i),
+            data={
+                "type": "token-transfer",
+                "data": data,
+                "bundle": {"index": i, "size": len(transfers)},
+            },
+        )
+        for i, data in enumerate(transfers)
+    ]
+
+
+def wallet_with(balance):
+    wallet = Wallet()
+    sender = wallet.create_wallet()["address"]
+    receiver = wallet.create_wallet()["address"]
+    wallet.credit_wallet(sender["pbc"], balance)
+    return wallet, sender, receiver
+
+
+def test_bundle_applied_whole():
+    wallet, sender, receiver = wallet_with(15)
+    block = Block(0, bundle([transfer(sender, receiver, 5)] * 2), "", 0, wallet)
+
+    assert block.deltas["rejected"] == []
+    assert wallet.get_balance(sender["pve"], sender["pbc"]) == 5.0
+    assert wallet.get_balance(receiver["pve"], receiver["pbc"]) == 10.0
+
+
+def test_bundle_rejected_whole():
+    wallet, sender, receiver = wallet_with(15)
+    transactions = bundle([transfer(sender, receiver, 10)] * 2)
+    # a transfer outside of the bundle is applied on its own
+    transactions.append(
+        Transaction(
+            datetime(2024, 1, 2),
+            data={"type": "token-transfer", "data": transfer(sender, receiver, 1)},
+        )
+    )
+    block = Block(0, transactions, "", 0, wallet)
+
+    assert block.deltas["rejected"] == [0, 1]
+    assert block.deltas["balances"] == [[receiver["pbc"], 1.0], [sender["pbc"], -1.0]]
+    assert wallet.get_balance(sender["pve"], sender["pbc"]) == 14.0
+    assert wallet.get_balance(receiver["pve"], receiver["pbc"]) == 1.0
+
+
+def test_bundle_executed_again_the_same_way():
+    wallet, sender, receiver = wallet_with(15)
+    replica = Wallet().from_dict(wallet.to_dict())
+    transactions = bundle([transfer(sender, receiver, 10)] * 2)
+    transactions += bundle([transfer(sender, receiver, 5)] * 2)
+    block = Block(0, transactions, "", 0, wallet)
+
+    assert block.deltas["rejected"] == [0, 1]
+    assert block.execute(replica).deltas == block.deltas
+    assert replica.to_dict() == wallet.to_dict()
+
+
+def test_batch_counts_the_block_being_mined(coin):
+    ledger = coin()
+    sender = ledger.create_wallet()["address"]
+    receiver = ledger.create_wallet()["address"]
+    ledger.credit_wallet(sender["pbc"], 10)
+    ledger.submit_transaction(
+        datetime.now(),
+        {"type": "token-transfer", "data": transfer(sender, receiver, 10)},
+    )
+    transactions, last_block = ledger.committer.call(ledger._take_block)
+
+    # the wallet is only debited once the block is committed
+    result = ledger.submit_batch([transfer(sender, receiver, 5)] * 2)
+    assert result["status"] == "rejected"
+    assert result["results"][0]["error"] == "Insufficient balance"
+    single = ledger.submit_transaction(
+        datetime.now(),
+        {"type": "token-transfer", "data": transfer(sender, receiver, 5)},
+    )
+    assert single == {"status": "rejected", "error": "Insufficient balance"}
+
+    ledger.committer.call(
+        ledger._commit_block, transactions, last_block, 0, ledger.wallet
+    )
+    assert ledger.mining == []
+    assert ledger.get_balance(receiver["pve"], receiver["pbc"]) == 10.0
+
+
+def test_batch_mined_in_one_block(coin):
+    ledger = coin()
+    sender = ledger.create_wallet()["address"]
+    receiver = ledger.create_wallet()["address"]
+    ledger.credit_wallet(sender["pbc"], 15)
+
+    result = ledger.submit_batch([transfer(sender, receiver, 5)] * 3)
+    assert [item["status"] for item in result["results"]] == ["pending"] * 3
+    block = ledger.mine_pending()
+
+    assert len(block.transactions) == 3 and block.deltas["rejected"] == []
+    assert ledger.get_balance(sender["pve"], sender["pbc"]) == 0.0
+    for item in result["results"]:
+        assert ledger.get_status(item["hash"])["status"] == "confirmed"
+
+
+def funded(client, balance):
+    # a new wallet address credited through the API
+    address = client.post("/api/bc/").json()["address"]
+    client.post(
+        "/api/bc/credit",
+        params={"public_key": address["pbc"], "amount": balance, "key": "secret"},
+    )
+    return address
+
+
+def test_batch_route(client):
+    sender = funded(client, 10)
+    receiver = funded(client, 0)
+
+    response = client.post(
+        "/api/bc/transfer/batch", json=[transfer(sender, receiver, 5)] * 2
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["status"] == "pending"
+    for item in result["results"]:
+        status = client.get("/api/bc/status/" + item["hash"]).json()
+        assert status["status"] == "pending"
+
+
+def test_batch_route_reports_invalid_items(client):
+    sender = funded(client, 10)
+    receiver = funded(client, 0)
+
+    response = client.post(
+        "/api/bc/transfer/batch",
+        json=[transfer(sender, receiver, 5), "transfer", transfer(sender, receiver, 6)],
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["status"] == "rejected"
+    errors = [item.get("error") for item in result["results"]]
+    assert errors[1:] == ["Transfer must be an object", "Insufficient balance"]
+    balance = client.get(
+        "/api/bc/",
+        params={"public_key": sender["pbc"], "private_key": sender["pve"]},
+    )
+    assert balance.json() == 10.0
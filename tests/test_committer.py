@@ -0,0 +1,60 @@
+import sys
+import time
+
+import pytest
+
+from app.blockchain.committer import Committer
+
+
+class Ledger:
+    def __init__(self):
+        self.value = 0
+        self.published = 0
+        self.committer = Committer(self.publish)
+
+    def publish(self):
+        time.sleep(0.001)  # a slow snapshot must still come before the answer
+        self.published = self.value
+
+    def set(self, value):
+        self.value = value
+        return value
+
+
+def test_answer_after_publish():
+    ledger = Ledger()
+    try:
+        for value in range(1, 50):
+            assert ledger.committer.call(ledger.set, value) == value
+            assert ledger.published == value
+    finally:
+        ledger.committer.stop()
+
+
+def test_error_after_publish():
+    ledger = Ledger()
+
+    def fail():
+        ledger.value = -1
+        raise KeyError("change")
+
+    try:
+        with pytest.raises(KeyError):
+            ledger.committer.call(fail)
+        assert ledger.published == -1
+    finally:
+        ledger.committer.stop()
+
+
+def test_read_your_writes(coin):
+    ledger = coin()
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(300):
+            address = ledger.create_wallet()["address"]
+            assert ledger.get_public_key(address["pve"]) == address["pbc"]
+            ledger.credit_wallet(address["pbc"], 3)
+            assert ledger.get_balance(address["pve"], address["pbc"]) == 3.0
+    finally:
+        sys.setswitchinterval(interval)
@@ -0,0 +1,68 @@
+def test_blocks_by_height_and_hash(coin, populate):
+    ledger = coin()
+    populate(ledger, 3)
+    chain = ledger.coin.chain
+
+    headers = ledger.get_blocks(1, 2)
+    assert [header["height"] for header in headers] == [1, 2]
+    # headers count the transactions
+    assert headers[0]["transactions"] == 4
+    assert ledger.get_blocks(3, 10) == [chain.header(3).to_dict()]
+    assert ledger.get_block_by_hash(chain.header(2).hash) == headers[1]
+    assert ledger.get_block(4) is None and ledger.get_block_by_hash("0x0") is None
+
+    block = ledger.get_block(1, body=True)
+    assert len(block["transactions"]) == 4
+    assert {**block, "transactions": None} == {
+        "height": 1,
+        **chain[1].to_dict(),
+        "transactions": None,
+    }
+
+
+def test_pruned_blocks_served_as_headers(storage, coin, populate):
+    ledger = coin(storage=storage(), pruning=True, keep_blocks=1)
+    populate(ledger, 3)
+    ledger.prune()
+
+    assert ledger.get_block(1, body=True) == {
+        **ledger.coin.chain.header(1).to_dict(),
+        "pruned": True,
+    }
+    assert len(ledger.get_block(3, body=True)["transactions"]) == 4
+
+
+def test_explorer_routes(api, client):
+    sender = client.post("/api/bc/").json()["address"]
+    receiver = client.post("/api/bc/").json()["address"]
+    client.post(
+        "/api/bc/credit",
+        params={"public_key": sender["pbc"], "amount": 5, "key": "secret"},
+    )
+    client.post(
+        "/api/bc/transfer",
+        params={"from_": sender["pve"], "to": receiver["pbc"], "amount": 1},
+    )
+    api.blockchain.mine_pending()
+    height = len(api.blockchain.coin.chain) - 1
+
+    page = client.get("/api/bc/blocks", params={"from": height - 1, "limit": 5}).json()
+    assert page["height"] == height
+    assert [header["height"] for header in page["blocks"]] == [height - 1, height]
+    header = page["blocks"][1]
+    assert client.get("/api/bc/block/%d" % height).json() == header
+    assert client.get("/api/bc/block/hash/" + header["hash"]).json() == header
+
+    block = client.get(
+        "/api/bc/block/hash/" + header["hash"], params={"body": True}
+    ).json()
+    transfers = [
+        transaction["input"]["data"]
+        for transaction in block["transactions"]
+        if transaction["input"]["type"] == "token-transfer"
+    ]
+    # senders are named by their public key
+    assert {"from": sender["pbc"], "to": receiver["pbc"], "amount": 1.0} in transfers
+    assert client.get("/api/bc/block/%d" % (height + 1)).json() == {
+        "error": "Block not found"
+    }
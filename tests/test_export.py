@@ -0,0 +1,54 @@
+import json
+import sys
+
+from app.blockchain import Coin, export
+from app.blockchain.storage import STORAGES
+
+
+def run(tmp_path, monkeypatch, storage, *args):
+    # the export command run in the directory of a node
+    backend = next(name for name, cls in STORAGES.items() if isinstance(storage, cls))
+    (tmp_path / "config.toml").write_text(
+        '[web]\nhost = "127.0.0.1"\nport = 8000\nkey = "secret"\n\n'
+        '[blockchain]\ndifficulty = 1\nstorage = "blockchain"\nbackend = "%s"\n'
+        % backend
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["export", "--output", "out.ndjson", *args])
+    export.main()
+    with open(tmp_path / "out.ndjson") as file:
+        return [json.loads(line) for line in file]
+
+
+def exported(coin):
+    return [
+        json.loads(line)
+        for line in b"".join(export.ndjson(coin.export())).split(b"\n")[:-1]
+    ]
+
+
+def test_export_streams_the_chain_and_the_wallet(storage, coin, populate):
+    leader = coin(storage=storage())
+    populate(leader, 3)
+    leader.sync()
+    records = exported(leader)
+
+    assert records[0]["height"] == 3
+    assert [r["height"] for r in records if r["type"] == "block"] == [0, 1, 2, 3]
+    wallets = [r["wallet"] for r in records if r["type"] == "wallet"]
+    assert wallets == leader.wallet.to_dict()
+
+
+def test_export_command(tmp_path, monkeypatch, storage, coin, populate):
+    leader = coin(storage=storage())
+    populate(leader, 3)
+    leader.sync()
+    expected = exported(leader)
+    del expected[0]["height"]
+
+    # the wallet is only rebuilt when the balances are asked for
+    with monkeypatch.context() as patch:
+        patch.setattr(Coin, "state_at", None)
+        blocks = run(tmp_path, monkeypatch, leader.storage)
+    assert blocks == [r for r in expected if r["type"] != "wallet"]
+    assert run(tmp_path, monkeypatch, leader.storage, "--balances") == expected
@@ -0,0 +1,80 @@
+def scanned(coin, public_key) -> list:
+    # positions of the transactions naming an address, newest first
+    chain = coin.coin.chain
+    return [
+        (height, i)
+        for height in range(len(chain) - 1, 0, -1)
+        for i, transaction in reversed(list(enumerate(chain[height].transactions)))
+        if public_key in coin.public_transaction(transaction)["input"]["data"].values()
+    ]
+
+
+def pages(coin, public_key, limit) -> list:
+    # every page of the history of an address, following the cursors
+    result = [coin.get_history(public_key, limit=limit)]
+    while result[-1]["next"] is not None:
+        result.append(coin.get_history(public_key, result[-1]["next"], limit))
+    return result
+
+
+def positions(page) -> list:
+    return [(item["block"], item["index"]) for item in page["transactions"]]
+
+
+def test_history_pages(storage, coin, populate):
+    ledger = coin(storage=storage())
+    addresses = populate(ledger, 4)
+    ledger.sync()
+    restored = coin(restore=True, storage=storage()).restore()
+
+    for address in addresses:
+        expected = scanned(ledger, address["pbc"])
+        assert len(expected) > 3
+        for node in (ledger, restored):
+            found = pages(node, address["pbc"], 3)
+            assert all(len(positions(page)) == 3 for page in found[:-1])
+            assert sum(map(positions, found), []) == expected
+
+
+def test_cursor_kept_by_new_blocks(coin, populate):
+    ledger = coin()
+    addresses = populate(ledger, 3)
+    pbc = addresses[0]["pbc"]
+    first = ledger.get_history(pbc, limit=2)
+    rest = scanned(ledger, pbc)[2:]
+
+    populate(ledger, 2, addresses)
+    following = ledger.get_history(pbc, first["next"], limit=100)
+    assert positions(following) == rest
+    assert following["next"] is None
+
+
+def test_history_route(api, client):
+    sender = client.post("/api/bc/").json()["address"]
+    receiver = client.post("/api/bc/").json()["address"]
+    client.post(
+        "/api/bc/credit",
+        params={"public_key": sender["pbc"], "amount": 10, "key": "secret"},
+    )
+    for amount in (1, 2, 3):
+        client.post(
+            "/api/bc/transfer",
+            params={"from_": sender["pve"], "to": receiver["pbc"], "amount": amount},
+        )
+    api.blockchain.mine_pending()
+
+    url = "/api/bc/history/" + receiver["pbc"]
+    first = client.get(url, params={"limit": 2}).json()
+    last = client.get(url, params={"limit": 2, "cursor": first["next"]}).json()
+    amounts = [
+        item["transaction"]["input"]["data"]["amount"]
+        for item in first["transactions"] + last["transactions"]
+    ]
+    assert amounts == [3.0, 2.0, 1.0] and last["next"] is None
+    assert first["transactions"][0]["transaction"]["input"]["data"]["from"] == (
+        sender["pbc"]
+    )
+    assert client.get(url, params={"cursor": "x"}).json() == {
+        "error": "Invalid cursor x"
+    }
+    assert client.get("/api/bc/history/unknown").json() == {"error": "Wallet not found"}
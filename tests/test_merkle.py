@@ -0,0 +1,56 @@
+import hashlib
+import math
+
+from app.blockchain.merkle import _levels, merkle_proof, merkle_root, verify_proof
+
+
+def hashes(count) -> list:
+    return [hashlib.sha256(b"%d" % i).hexdigest() for i in range(count)]
+
+
+def test_every_transaction_proven():
+    for count in range(1, 10):
+        transactions = hashes(count)
+        root = merkle_root(transactions)
+        for index, transaction in enumerate(transactions):
+            proof = merkle_proof(transactions, index)
+            assert len(proof) <= math.ceil(math.log2(count))
+            assert verify_proof(transaction, proof, root)
+
+
+def test_wrong_proofs_rejected():
+    transactions = hashes(5)
+    root = merkle_root(transactions)
+    proof = merkle_proof(transactions, 2)
+
+    assert not verify_proof(transactions[3], proof, root)
+    assert not verify_proof(transactions[2], proof, merkle_root(transactions[:4]))
+    # an inner node is not a leaf
+    inner = _levels(transactions)[1][1].hex()
+    assert not verify_proof(inner, proof[1:], root)
+    assert merkle_root(transactions[::-1]) != root
+
+
+def test_proof_route(api, client):
+    owner = client.post("/api/bc/").json()["address"]
+    submitted = [
+        client.post(
+            "/api/bc/nft",
+            params={
+                "name": str(i),
+                "description": "",
+                "url": "",
+                "owner": owner["pbc"],
+            },
+        ).json()
+        for i in range(3)
+    ]
+    api.blockchain.mine_pending()
+
+    for transaction in submitted:
+        found = client.get("/api/bc/proof/" + transaction["hash"]).json()
+        root = found["block"]["merkle_root"]
+        assert verify_proof(transaction["hash"], found["proof"], root)
+        header = api.blockchain.coin.chain.header(found["block"]["height"])
+        assert header.to_dict() == found["block"]
+    assert client.get("/api/bc/proof/0x0").json()["status"] == "unknown"
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.metrics import REQUEST_SECONDS
+
+
+def observed(method, route) -> int:
+    sample = REQUEST_SECONDS.samples.get((method, route))
+    return 0 if sample is None else sample[2]
+
+
+def test_latency_per_route(client):
+    before = observed("GET", "/api/bc/block/{height}")
+    client.get("/api/bc/block/0")
+    client.get("/api/bc/block/1")
+    client.get("/api/bc/nope")
+
+    assert observed("GET", "/api/bc/block/{height}") == before + 2
+    assert ("GET", "/api/bc/block/0") not in REQUEST_SECONDS.samples
+    assert observed("GET", "unmatched") >= 1
+
+
+def test_metrics_rendered(api, client):
+    client.get("/api/bc/block/0")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/api/bc/block/{height}"}'
+        in text
+    )
+    # other tests mine blocks on the same node
+    assert "blockchain_height %d" % (len(api.blockchain.coin.chain) - 1) in text
+
+
+class Writer:
+    # answers the requests forwarded by an HTTP worker
+    async def forward(self, request):
+        return JSONResponse({"status": "unknown"})
+
+
+def test_forwarded_request_timed(api, monkeypatch):
+    from app import dispatcher
+
+    monkeypatch.setattr(dispatcher, "writer", Writer())
+    worker = TestClient(dispatcher.dispatcher({"start_time": datetime.now()}))
+    before = observed("GET", "/api/bc/tx/{tx_hash}")
+
+    response = worker.get("/api/bc/tx/0x0")
+    assert response.json() == {"status": "unknown"}
+    assert observed("GET", "/api/bc/tx/{tx_hash}") == before + 1
@@ -0,0 +1,54 @@
+import hashlib
+import threading
+
+from app.blockchain import miner
+from app.blockchain.miner import Miner, search, valid_proof
+
+
+def first_proof(last_proof, difficulty) -> int:
+    # the search of the original single threaded miner
+    proof = 0
+    while (
+        not hashlib.sha256(f"{last_proof}{proof}".encode())
+        .hexdigest()
+        .startswith("0" * difficulty)
+    ):
+        proof += 1
+    return proof
+
+
+def test_search_finds_the_first_proof():
+    for difficulty in (1, 2, 3):
+        proof = first_proof(100, difficulty)
+        assert search(100, difficulty) == proof
+        assert valid_proof(100, proof, difficulty)
+        assert not valid_proof(100, proof, difficulty + 2)
+
+
+def test_search_stops(monkeypatch):
+    stop = threading.Event()
+    stop.set()
+    monkeypatch.setattr(miner, "_stop", stop)
+    monkeypatch.setattr(miner, "CHECK_EVERY", 1)
+
+    # never found at this difficulty, stopped after the first attempt
+    assert search(100, 64) is None
+
+
+def test_workers_split_the_proofs():
+    pool = Miner(workers=2)
+    try:
+        proofs = [pool.mine(last_proof, 3) for last_proof in range(3)]
+    finally:
+        pool.shutdown()
+
+    assert all(valid_proof(i, proof, 3) for i, proof in enumerate(proofs))
+
+
+def test_blocks_mined_at_the_chain_difficulty(coin, populate):
+    ledger = coin(difficulty=2)
+    populate(ledger, 2)
+    chain = ledger.coin.chain
+
+    for height in range(1, len(chain)):
+        assert chain[height].proof == first_proof(chain[height - 1].proof, 2)
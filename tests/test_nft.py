@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from app.blockchain.architectures.nft import NFT, NFTRegistry
+
+NOW = datetime(2024, 1, 1)
+
+
+def registry_of(owners) -> NFTRegistry:
+    # NFTs "0x0", "0x1", ... given to the owners in order
+    registry = NFTRegistry()
+    for i, owner in enumerate(owners):
+        registry.add(owner, NFT("n", "d", "u", owner, NOW, id="0x%d" % i))
+    return registry
+
+
+def ids(nfts) -> list:
+    return [nft.id for nft in nfts]
+
+
+def test_registry_indexes_owners():
+    registry = registry_of(["a", "b", "a", "a"])
+
+    assert ids(registry.owned_by("a")) == ["0x0", "0x2", "0x3"]
+    assert ids(registry.owned_by("a", offset=1, limit=1)) == ["0x2"]
+    assert registry.count("b") == 1 and registry.count("c") == 0
+
+    assert registry.move("0x0", "b").owner == "b"
+    assert ids(registry.owned_by("a")) == ["0x2", "0x3"]
+    # received NFTs come last
+    assert ids(registry.owned_by("b")) == ["0x1", "0x0"]
+    assert registry.move("0x9", "b") is None
+
+    assert registry.remove("0x2").id == "0x2"
+    assert registry.get("0x2") is None
+    assert ids(registry.owned_by("a")) == ["0x3"]
+
+
+def test_registry_records_changes():
+    registry = registry_of(["a"])
+    registry.changed.clear()
+    registry.changed_owners.clear()
+
+    registry.move("0x0", "b")
+    assert registry.changed == {"0x0"} and registry.changed_owners == {"a", "b"}
+
+
+def test_nft_routes(api, client):
+    owner = client.post("/api/bc/").json()["address"]
+    receiver = client.post("/api/bc/").json()["address"]
+    for i in range(3):
+        client.post(
+            "/api/bc/nft",
+            params={
+                "name": "nft %d" % i,
+                "description": "",
+                "url": "",
+                "owner": owner["pbc"],
+            },
+        )
+    api.blockchain.mine_pending()
+
+    page = client.get(
+        "/api/bc/nfts", params={"owner": owner["pbc"], "offset": 1, "limit": 1}
+    ).json()
+    assert page["total"] == 3
+    assert [item["name"] for item in page["nfts"]] == ["nft 1"]
+    nft = page["nfts"][0]
+    assert client.get("/api/bc/nft/" + nft["id"]).json() == nft
+
+    client.post(
+        "/api/bc/nft-transfer",
+        params={"nft": nft["id"], "from_": owner["pve"], "to": receiver["pbc"]},
+    )
+    api.blockchain.mine_pending()
+
+    assert client.get("/api/bc/nft/" + nft["id"]).json()["owner"] == receiver["pbc"]
+    left = client.get("/api/bc/nfts", params={"owner": owner["pbc"]}).json()["nfts"]
+    assert [item["name"] for item in left] == ["nft 0", "nft 2"]
+    assert client.get("/api/bc/nft/0x0").json() == {"error": "NFT not found"}
+    assert client.get("/api/bc/nfts", params={"owner": "unknown"}).json() == {
+        "error": "Wallet not found"
+    }
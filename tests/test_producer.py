@@ -0,0 +1,101 @@
+import asyncio
+import time
+from datetime import datetime
+
+from app.blockchain.producer import BlockProducer
+
+
+def submit(coin, name="nft") -> dict:
+    # an NFT created for a new address
+    owner = coin.create_wallet()["address"]["pbc"]
+    return coin.submit_transaction(
+        datetime.now(),
+        {
+            "type": "nft-create",
+            "data": {"name": name, "description": "", "url": "", "owner": owner},
+        },
+    )
+
+
+def test_submission_is_not_mined(coin):
+    ledger = coin()
+    submitted = submit(ledger)
+
+    assert submitted["status"] == "pending"
+    assert len(ledger.coin.chain) == 1
+    assert ledger.get_status(submitted["hash"])["status"] == "pending"
+    ledger.mine_pending()
+    status = ledger.get_status(submitted["hash"])
+    assert status["status"] == "confirmed" and status["block"] == 1
+
+
+def test_producer_mines_in_the_background(coin):
+    ledger = coin()
+    submitted = [submit(ledger, str(i)) for i in range(3)]
+
+    async def produce():
+        producer = BlockProducer(ledger, interval=0.01)
+        producer.start()
+        try:
+            while len(ledger.coin.chain) == 1:
+                await asyncio.sleep(0.01)
+        finally:
+            await producer.stop()
+
+    asyncio.run(asyncio.wait_for(produce(), 10))
+    for transaction in submitted:
+        assert ledger.get_status(transaction["hash"])["status"] == "confirmed"
+    assert ledger.mine_pending() is False
+
+
+def test_block_sealed_at_max_transactions(coin):
+    ledger = coin(max_transactions=3, max_wait=60)
+    submit(ledger, "0")
+    submit(ledger, "1")
+    assert not ledger.ready()
+    # the wait is only skipped when mining is asked for
+    assert ledger.ready(wait=False)
+
+    for i in range(2, 7):
+        submit(ledger, str(i))
+    assert ledger.ready()
+    block = ledger.mine_pending()
+    assert len(block.transactions) == 3
+    assert len(ledger.coin.pending_transactions) == 4
+
+
+def test_block_sealed_after_max_wait(coin, monkeypatch):
+    ledger = coin(max_wait=5)
+    submit(ledger)
+    assert not ledger.ready()
+
+    clock = time.monotonic() + 5
+    monkeypatch.setattr(time, "monotonic", lambda: clock)
+    assert ledger.ready()
+
+
+def test_block_sealed_at_max_bytes(coin):
+    ledger = coin()
+    sizes = [submit(ledger, str(i)) and ledger.pending_bytes for i in range(4)]
+    # two transactions fit, their sizes differ by a few bytes
+    ledger.coin.max_bytes = sizes[1] + sizes[0] // 2
+
+    assert ledger.ready()
+    # the blocks take the oldest transactions that fit
+    assert len(ledger.mine_pending().transactions) == 2
+    assert len(ledger.mine_pending().transactions) == 2
+    assert ledger.pending_bytes == 0
+
+
+def test_bundle_not_split(coin):
+    ledger = coin(max_transactions=3)
+    sender = ledger.create_wallet()["address"]
+    receiver = ledger.create_wallet()["address"]
+    ledger.credit_wallet(sender["pbc"], 10)
+    submit(ledger)
+    transfer = {"from": sender["pve"], "to": receiver["pbc"], "amount": 1}
+    assert ledger.submit_batch([transfer] * 3)["status"] == "pending"
+
+    # the bundle does not fit after the first transaction
+    assert len(ledger.mine_pending().transactions) == 1
+    assert len(ledger.mine_pending().transactions) == 3
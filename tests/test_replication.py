@@ -0,0 +1,87 @@
+import copy
+
+import pytest
+
+
+def pull(leader, follower, limit=100):
+    # one round of the Replicator, without the HTTP client
+    start = len(follower.coin.chain)
+    headers = leader.replication_headers(start, limit)
+    records = leader.replication_records(start, follower.seq, len(headers))
+    return follower.replicate(headers, records)
+
+
+def test_replicate_after_prune(storage, coin, populate, summarize):
+    leader = coin(storage=storage(), pruning=True, keep_blocks=2)
+    addresses = populate(leader, 4)
+    leader.prune()
+
+    follower = coin(restore=True, storage=storage("follower"))
+    assert pull(leader, follower) == 5
+
+    assert follower.coin.chain.pruned == 3
+    assert summarize(follower, addresses) == summarize(leader, addresses)
+
+
+def test_replicate_after_compaction(storage, coin, populate, summarize):
+    leader = coin(storage=storage(), snapshot_interval=2)
+    addresses = populate(leader, 2)
+    follower = coin(restore=True, storage=storage("follower"))
+    assert pull(leader, follower) == 3
+
+    populate(leader, 3, addresses)
+    leader.compact()
+    assert pull(leader, follower) == 3
+
+    assert summarize(follower, addresses) == summarize(leader, addresses)
+    restored = coin(restore=True, storage=storage("follower")).restore()
+    assert summarize(restored, addresses) == summarize(leader, addresses)
+
+
+def test_replicate_refuses_changed_deltas(storage, coin, populate):
+    leader = coin(storage=storage())
+    addresses = populate(leader, 2)
+    headers = leader.replication_headers(0, 100)
+    records = copy.deepcopy(list(leader.replication_records(0, -1, 100)))
+    block = [record for record in records if record["type"] == "block"][2]
+    block["block"]["deltas"]["balances"].append([addresses[0]["pbc"], 1000.0])
+
+    follower = coin(restore=True, storage=storage("follower"))
+    with pytest.raises(ValueError):
+        follower.replicate(headers, iter(records))
+
+    assert len(follower.coin.chain) == 2
+    assert [follower.get_balance(a["pve"], a["pbc"]) for a in addresses] == [
+        leader.state_at(1).get_balance(a["pve"], a["pbc"]) for a in addresses
+    ]
+
+
+def test_refresh_after_compaction(storage, coin, populate, summarize):
+    leader = coin(storage=storage(), snapshot_interval=2)
+    addresses = populate(leader, 2)
+    reader = coin(restore=True, storage=storage(), read_only=True).restore()
+    assert summarize(reader, addresses) == summarize(leader, addresses)
+
+    populate(leader, 1, addresses)
+    assert reader.refresh() == 1
+    assert summarize(reader, addresses) == summarize(leader, addresses)
+
+    populate(leader, 2, addresses)
+    leader.compact()
+    assert reader.refresh() == 2
+    assert summarize(reader, addresses) == summarize(leader, addresses)
+
+
+def test_refresh_after_prune(storage, coin, populate):
+    leader = coin(storage=storage(), pruning=True, keep_blocks=1)
+    addresses = populate(leader, 2)
+    reader = coin(restore=True, storage=storage(), read_only=True).restore()
+
+    populate(leader, 2, addresses)
+    leader.prune()
+    assert reader.refresh() == 2
+
+    assert reader.coin.chain.pruned == 4
+    assert [reader.get_balance(a["pve"], a["pbc"]) for a in addresses] == [
+        leader.get_balance(a["pve"], a["pbc"]) for a in addresses
+    ]
@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+from datetime import datetime
+
+from app.blockchain.architectures.wallet import Wallet
+from app.blockchain.state import LedgerState, WalletSource
+from app.blockchain.storage.sqlite import SQLiteStore
+
+
+def served(state, wallet):
+    # what a state serves for every address and NFT of a wallet
+    return {
+        "accounts": {pbc: state.accounts.get(pbc) for pbc in wallet.pbc},
+        "keys": {pve: state.keys.get(pve) for pve in wallet.pve},
+        "nfts": {nft: state.nfts.get(nft) for nft in wallet.nfts.nfts},
+        "owned": {pbc: state.owned_by(pbc) for pbc in wallet.pbc},
+    }
+
+
+def expected(coin):
+    # the wallet in memory is left unchanged
+    wallet = Wallet().from_dict(coin.wallet.to_dict())
+    return served(LedgerState(WalletSource(wallet, threading.RLock())), wallet)
+
+
+def move_nft(coin, sender, receiver):
+    nft = coin.state.owned_by(sender["pbc"])[0]["id"]
+    coin.submit_transaction(
+        datetime.now(),
+        {
+            "type": "nft-transfer",
+            "data": {"from": sender["pve"], "to": receiver["pbc"], "nft": nft},
+        },
+    )
+    coin.mine_pending()
+
+
+def test_tables_follow_the_wallet(tmp_path, coin, populate):
+    leader = coin(storage=SQLiteStore(str(tmp_path / "db")), snapshot_interval=2)
+    addresses = populate(leader, 4)
+    move_nft(leader, addresses[0], addresses[1])
+    leader.credit_wallet(addresses[2]["pbc"], 0.1)
+
+    assert leader.state.source is leader.storage
+    assert served(leader.state, leader.wallet) == expected(leader)
+    assert leader.state.keys.get("unknown") is None
+    assert "unknown" not in leader.state.accounts
+    assert dict(leader.state.accounts.items()) == {
+        pbc: (pve, balance)
+        for pbc, pve, balance in zip(
+            leader.wallet.pbc, leader.wallet.pve, leader.wallet.balances
+        )
+    }
+
+
+def test_tables_kept_by_prune(tmp_path, coin, populate):
+    path = str(tmp_path / "db")
+    leader = coin(storage=SQLiteStore(path), pruning=True, keep_blocks=1)
+    addresses = populate(leader, 3)
+    move_nft(leader, addresses[0], addresses[2])
+    leader.prune()
+
+    # served from the tables before the wallet is replayed
+    opened = coin(restore=True, storage=SQLiteStore(path))
+    assert served(opened.state, leader.wallet) == expected(leader)
+
+
+def test_follower_tables_replaced_by_the_snapshot(tmp_path, coin, populate):
+    storage = SQLiteStore(str(tmp_path / "leader"))
+    leader = coin(storage=storage, pruning=True, keep_blocks=1)
+    populate(leader, 3)
+    leader.prune()
+
+    follower = coin(restore=True, storage=SQLiteStore(str(tmp_path / "follower")))
+    headers = leader.replication_headers(0, 100)
+    follower.replicate(headers, leader.replication_records(0, -1, len(headers)))
+
+    assert served(follower.state, leader.wallet) == expected(leader)
+
+
+def test_tables_rebuilt_from_an_older_version(tmp_path, coin, populate):
+    path = str(tmp_path / "db")
+    leader = coin(storage=SQLiteStore(path), snapshot_interval=2)
+    addresses = populate(leader, 3)
+    move_nft(leader, addresses[1], addresses[0])
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("UPDATE meta SET value = '2' WHERE key = 'version'")
+        connection.execute("DELETE FROM wallets")
+    connection.close()
+
+    opened = coin(restore=True, storage=SQLiteStore(path))
+    assert served(opened.state, leader.wallet) == expected(leader)
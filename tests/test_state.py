@@ -0,0 +1,129 @@
+import threading
+from datetime import datetime
+
+from app.blockchain.architectures.nft import NFT
+from app.blockchain.architectures.wallet import Wallet
+from app.blockchain.state import CachedLookup, LedgerState, WalletSource
+
+NOW = datetime(2024, 1, 1)
+
+
+def wallet_state(wallet, cache_size=65536):
+    return LedgerState(WalletSource(wallet, threading.RLock()), cache_size)
+
+
+def test_lookup_cached_until_evicted():
+    values = {"a": 1}
+    lookup = CachedLookup(values.get, 10)
+
+    assert lookup.get("a") == 1 and lookup.get("b", 0) == 0
+    values.update(a=2, b=3)
+    # answers are kept, unknown keys too, until they are evicted
+    assert lookup.get("a") == 1 and "b" not in lookup
+    lookup.evict(["a", "b"])
+    assert lookup.get("a") == 2 and lookup.get("b") == 3
+
+
+def test_lookup_cache_is_bounded():
+    lookup = CachedLookup(lambda key: key, 3)
+    for key in range(100):
+        lookup.get(key)
+
+    assert len(lookup.cache) == 3
+    assert list(lookup.cache) == [97, 98, 99]
+
+
+def test_answer_read_during_an_eviction_is_not_cached():
+    values = {"a": 1}
+
+    def lookup(key):
+        value = values[key]
+        # a change published while the value was read
+        values[key] = 2
+        cached.evict([key])
+        return value
+
+    cached = CachedLookup(lookup, 10)
+
+    assert cached.get("a") == 1
+    assert "a" not in cached.cache
+
+
+def test_state_serves_the_wallet():
+    wallet = Wallet()
+    address = wallet.create_wallet()["address"]
+    wallet.credit_wallet(address["pbc"], 5)
+    state = wallet_state(wallet)
+
+    assert state.accounts.get(address["pbc"]) == (address["pve"], 5.0)
+    assert state.keys.get(address["pve"]) == address["pbc"]
+    assert dict(state.accounts.items()) == {address["pbc"]: (address["pve"], 5.0)}
+
+
+def test_apply_evicts_what_changed():
+    wallet = Wallet()
+    first = wallet.create_wallet()["address"]
+    state = wallet_state(wallet).apply(wallet, 0)
+    assert state.accounts.get(first["pbc"]) == (first["pve"], 0.0)
+    assert state.owned_by(first["pbc"]) == []
+    assert state.apply(wallet, 0) is state
+
+    second = wallet.create_wallet()["address"]
+    wallet.credit_wallet(first["pbc"], 7)
+    nft = NFT("name", "description", "url", first["pbc"], NOW, id="0x1")
+    wallet.give_nft(first["pbc"], nft)
+    # cached until the change is published
+    assert state.accounts.get(first["pbc"]) == (first["pve"], 0.0)
+    new = state.apply(wallet, 1)
+
+    assert new.height == 1 and state.height == 0
+    assert new.accounts.get(first["pbc"]) == (first["pve"], 7.0)
+    assert new.keys.get(second["pve"]) == second["pbc"]
+    assert new.owned_by(first["pbc"]) == [nft.to_dict()]
+    assert new.nfts.get("0x1") == nft.to_dict()
+    assert not wallet.changed and not wallet.nfts.changed
+
+
+def test_new_address_looked_up_before_it_was_created():
+    wallet = Wallet()
+    state = wallet_state(wallet)
+    address = wallet.create_wallet()["address"]
+    # the lookup ran before the change was published
+    state.keys.cache[address["pve"]] = None
+    state.accounts.cache[address["pbc"]] = None
+
+    state = state.apply(wallet, 0)
+    assert state.keys.get(address["pve"]) == address["pbc"]
+    assert address["pbc"] in state.accounts
+
+
+def test_owned_by_pages():
+    wallet = Wallet()
+    owner = wallet.create_wallet()["address"]["pbc"]
+    for i in range(5):
+        wallet.give_nft(owner, NFT("n", "d", "u", owner, NOW, id="0x%d" % i))
+    state = wallet_state(wallet)
+
+    ids = [nft["id"] for nft in state.owned_by(owner, offset=1, limit=2)]
+    assert ids == ["0x1", "0x2"]
+    assert len(state.owned_by(owner)) == 5
+
+
+def test_lookup_waits_for_the_change_in_progress():
+    wallet = Wallet()
+    address = wallet.create_wallet()["address"]
+    lock = threading.RLock()
+    state = LedgerState(WalletSource(wallet, lock))
+    answers = []
+
+    with lock:
+        reader = threading.Thread(
+            target=lambda: answers.append(state.accounts.get(address["pbc"]))
+        )
+        reader.start()
+        wallet.credit_wallet(address["pbc"], 3)
+        reader.join(0.05)
+        assert answers == []
+    reader.join()
+
+    assert answers == [(address["pve"], 3.0)]
@@ -0,0 +1,100 @@
+import copy
+
+import pytest
+
+
+def test_restore(storage, coin, populate, summarize):
+    leader = coin(storage=storage())
+    addresses = populate(leader, 3)
+    leader.sync()
+
+    restored = coin(restore=True, storage=storage()).restore()
+
+    assert summarize(restored, addresses) == summarize(leader, addresses)
+    assert restored.validate_chain()
+    transaction = leader.coin.chain[2].transactions[1]
+    assert restored.coin.position(transaction.hash) == (2, 1)
+    assert restored.get_status(transaction.hash)["status"] == "confirmed"
+    # senders are listed and named by their public key
+    history = restored.get_history(addresses[0]["pbc"], limit=1000)["transactions"]
+    senders = [entry["transaction"]["input"]["data"].get("from") for entry in history]
+    assert senders.count(addresses[0]["pbc"]) == 3
+
+
+def test_restore_after_compaction(storage, coin, populate, summarize):
+    leader = coin(storage=storage(), snapshot_interval=2)
+    addresses = populate(leader, 5)
+    leader.sync()
+    leader.compact()
+
+    restored = coin(restore=True, storage=storage()).restore()
+
+    assert summarize(restored, addresses) == summarize(leader, addresses)
+
+
+def test_prune(storage, coin, populate):
+    leader = coin(storage=storage(), pruning=True, keep_blocks=2)
+    addresses = populate(leader, 4)
+    leader.sync()
+    forgotten = leader.coin.chain[1].transactions[0].hash
+
+    assert leader.prune() == 3
+    restored = coin(restore=True, storage=storage()).restore()
+
+    chain = restored.coin.chain
+    assert chain.pruned == 3 and len(chain) == 5
+    assert [chain.header(height).hash for height in range(len(chain))] == [
+        leader.coin.chain.header(height).hash for height in range(5)
+    ]
+    assert restored.get_block(1, body=True)["pruned"]
+    assert len(restored.get_block(4, body=True)["transactions"]) == 4
+    assert [restored.get_balance(a["pve"], a["pbc"]) for a in addresses] == [
+        leader.get_balance(a["pve"], a["pbc"]) for a in addresses
+    ]
+    # the headers of pruned blocks are kept, their transactions are forgotten
+    pruned = leader.coin.chain.header(1).hash
+    assert restored.get_block_by_hash(pruned)["hash"] == pruned
+    assert restored.coin.position(forgotten) is None
+    assert restored.coin.position(leader.coin.chain[4].transactions[0].hash) == (4, 0)
+
+
+def test_state_at(storage, coin, populate):
+    leader = coin(storage=storage(), snapshot_interval=2)
+    addresses = populate(leader, 0)
+    wallets = []
+    for _ in range(4):
+        populate(leader, 1, addresses)
+        wallets.append(copy.deepcopy(leader.wallet.to_dict()))
+
+    for height, wallet in enumerate(wallets, 1):
+        assert leader.state_at(height).to_dict() == wallet
+
+
+def test_state_at_pruned_height(storage, coin, populate):
+    leader = coin(storage=storage(), pruning=True, keep_blocks=1)
+    populate(leader, 3, 2)
+    leader.sync()
+    leader.prune()
+
+    with pytest.raises(ValueError):
+        leader.state_at(1)
+    assert leader.state_at(3).to_dict() == leader.wallet.to_dict()
+
+
+def test_older_snapshots_dropped(storage, coin, populate, summarize):
+    leader = coin(storage=storage(), snapshot_interval=1, compact_ratio=1.5)
+    addresses = populate(leader, 0)
+    wallets = [copy.deepcopy(leader.wallet.to_dict())]
+    for _ in range(6):
+        populate(leader, 1, addresses)
+        wallets.append(copy.deepcopy(leader.wallet.to_dict()))
+
+    records = [record for _, record in leader.storage.records()]
+    assert sum(record["type"] == "snapshot" for record in records) < 6
+    # the wallet changes are kept, any height can still be rebuilt
+    for height, wallet in enumerate(wallets):
+        assert leader.state_at(height).to_dict() == wallet
+    restored = coin(restore=True, storage=storage()).restore()
+    assert summarize(restored, addresses) == summarize(leader, addresses)
+    assert restored.validate_chain()
+    assert restored.get_block(3, body=True)["hash"] == leader.coin.chain[3].hash
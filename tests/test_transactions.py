@@ -0,0 +1,51 @@
+def positions(coin) -> dict:
+    # where every transaction is, found by scanning the blocks
+    chain = coin.coin.chain
+    return {
+        transaction.hash: (height, i)
+        for height in range(1, len(chain))
+        for i, transaction in enumerate(chain[height].transactions)
+    }
+
+
+def test_index_built_on_restore(storage, coin, populate):
+    leader = coin(storage=storage())
+    populate(leader, 3)
+    leader.sync()
+    restored = coin(restore=True, storage=storage()).restore()
+
+    expected = positions(leader)
+    assert len(expected) == 12
+    for node in (leader, restored):
+        assert {tx: node.coin.position(tx) for tx in expected} == expected
+    assert restored.coin.position("unknown") is None
+
+
+def test_transaction_route(api, client):
+    sender = client.post("/api/bc/").json()["address"]
+    receiver = client.post("/api/bc/").json()["address"]
+    client.post(
+        "/api/bc/credit",
+        params={"public_key": sender["pbc"], "amount": 5, "key": "secret"},
+    )
+    submitted = client.post(
+        "/api/bc/transfer",
+        params={"from_": sender["pve"], "to": receiver["pbc"], "amount": 2},
+    ).json()
+    assert client.get("/api/bc/tx/" + submitted["hash"]).json()["status"] == "pending"
+    api.blockchain.mine_pending()
+
+    found = client.get("/api/bc/tx/" + submitted["hash"]).json()
+    height, index = api.blockchain.coin.position(submitted["hash"])
+    assert (found["status"], found["block"], found["index"]) == (
+        "confirmed",
+        height,
+        index,
+    )
+    # the sender is named by its public key, the private key is not served
+    assert found["transaction"]["input"]["data"] == {
+        "from": sender["pbc"],
+        "to": receiver["pbc"],
+        "amount": 2.0,
+    }
+    assert client.get("/api/bc/tx/0x0").json() == {"hash": "0x0", "status": "unknown"}
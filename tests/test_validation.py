@@ -0,0 +1,77 @@
+import sqlite3
+
+import pytest
+
+from app.blockchain import validation
+from app.blockchain.storage.log import BlockLog
+
+
+@pytest.fixture
+def chunks(monkeypatch):
+    # blocks are checked by the workers two at a time
+    monkeypatch.setattr(validation, "CHUNK_SIZE", 2)
+
+
+def tamper(storage, offset):
+    # change the amount of a transfer without moving the other records
+    if isinstance(storage, BlockLog):
+        with open(storage.path, "r+b") as file:
+            file.seek(offset)
+            line = file.readline()
+            file.seek(offset)
+            file.write(line.replace(b'"amount":1.0', b'"amount":7.0', 1))
+        return
+    connection = sqlite3.connect(storage.path)
+    with connection:
+        connection.execute(
+            "UPDATE records SET body = replace(body, '\"amount\":1.0', '\"amount\":7.0')"
+            " WHERE id = ?",
+            (offset,),
+        )
+    connection.close()
+
+
+def test_parallel_validation(storage, coin, populate, chunks):
+    leader = coin(storage=storage())
+    populate(leader, 5)
+    leader.sync()
+    restored = coin(restore=True, storage=storage()).restore()
+
+    assert restored.validate_chain(workers=2)
+
+
+def test_parallel_validation_reads_the_storage(storage, coin, populate, chunks):
+    leader = coin(storage=storage())
+    populate(leader, 5)
+    leader.sync()
+    tamper(leader.storage, leader.coin.chain.header(3).offset)
+    restored = coin(restore=True, storage=storage()).restore()
+
+    assert not restored.validate_chain(workers=2)
+    chain = restored.coin.chain
+    offsets = [chain.header(height).offset for height in range(1, 6)]
+    hashes = [chain.header(height).hash for height in range(1, 6)]
+    assert (
+        validation.check_stored(type(storage()), storage().path, offsets, hashes) == 2
+    )
+
+
+def test_verify_from_the_checkpoint(storage, coin, populate):
+    leader = coin(storage=storage())
+    addresses = populate(leader, 3)
+    leader.sync()
+    assert leader.verify()
+    assert leader.storage.read_checkpoint() == {
+        "height": 3,
+        "hash": leader.coin.chain.header(3).hash,
+    }
+
+    # blocks before the checkpoint are not checked again
+    tamper(leader.storage, leader.coin.chain.header(2).offset)
+    assert coin(restore=True, storage=storage()).restore().verify()
+
+    populate(leader, 2, addresses)
+    leader.sync()
+    tamper(leader.storage, leader.coin.chain.header(5).offset)
+    assert not coin(restore=True, storage=storage()).restore().verify()
+    assert leader.storage.read_checkpoint()["height"] == 3